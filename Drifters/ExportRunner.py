@@ -0,0 +1 @@
+../ExportRunner/ExportRunner.py
\ No newline at end of file
@@ -0,0 +1 @@
+../MakeTables/MakeTables.py
\ No newline at end of file
@@ -0,0 +1 @@
+../TailReader/TailReader.py
\ No newline at end of file
@@ -0,0 +1,115 @@
+#! /usr/bin/env python3
+#
+# Compare fetcher's sharded parallel backfill with a single full fetch,
+# then check that an interrupted backfill resumes with only the missing shards.
+#
+# The backfill uses a connection per shard, so this needs a scratch database,
+# which is created if need be and whose drifter tables are emptied.
+#
+#  benchBackfill.py --db=drifterScratch --days=60 --latency=1 --rate=50000 --workers=4
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+import atexit
+import benchFetch
+import datetime
+import fakeDrifter
+import fetcher
+from httpFetch import HTTPFetch
+import logging
+import MakeTables as mktbl
+import os
+import psycopg
+import socket
+import subprocess
+import sys
+import time
+
+parser = ArgumentParser()
+fakeDrifter.addArgs(parser)
+HTTPFetch.addArgs(parser)
+parser.add_argument("--db", type=str, default="drifterScratch",
+                    help="Scratch Postgresql DB to use, NOT the live one")
+parser.add_argument("--sql", type=str, default="drifter.sql", help="SQL defining the tables")
+parser.add_argument("--days", type=int, default=60, help="Days of history")
+parser.add_argument("--shardDays", type=int, default=7, help="Days per backfill shard")
+parser.add_argument("--workers", type=int, default=4, help="Number of shards fetched at once")
+parser.add_argument("--blockSize", type=int, default=100000, help="Records per parsed block")
+parser.add_argument("--verbose", action="store_true", help="Log what fetcher does")
+args = parser.parse_args()
+args.now = datetime.datetime.now(tz=datetime.timezone.utc)
+
+logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                    format="%(asctime)s %(threadName)s %(levelname)s: %(message)s")
+
+# Serve the feed from another process, so it does not compete with the fetcher for the GIL
+with socket.socket() as s: # Find a free port
+    s.bind((args.host, 0))
+    args.port = s.getsockname()[1]
+cmd = [sys.executable, "fakeDrifter.py", f"--host={args.host}", f"--port={args.port}",
+       f"--nDrifters={args.nDrifters}", f"--dt={args.dt}", f"--now={args.now.isoformat()}",
+       f"--latency={args.latency}", f"--rate={args.rate}", f"--drop={args.drop}"]
+server = subprocess.Popen(cmd, cwd=os.path.dirname(os.path.abspath(__file__)))
+atexit.register(server.terminate)
+for i in range(100):
+    try:
+        socket.create_connection((args.host, args.port)).close()
+        break
+    except ConnectionRefusedError:
+        time.sleep(0.1)
+args.url = f"http://{args.host}:{args.port}/drifter.py"
+args.startDate = (args.now - datetime.timedelta(days=args.days)).strftime("%Y-%m-%d")
+args.endParam = "end_date"
+args.refetch = True
+args.nofetch = False
+args.overlap = 300
+args.spool = None
+
+with psycopg.connect("dbname=postgres", autocommit=True) as db:
+    cur = db.cursor()
+    cur.execute("SELECT 1 FROM pg_database WHERE datname=%s;", (args.db,))
+    if not cur.fetchone(): cur.execute(f'CREATE DATABASE "{args.db}";')
+
+def reset(db) -> None:
+    db.execute("TRUNCATE drifter, fetchState, fetchShard;")
+    db.commit()
+
+with psycopg.connect(f"dbname={args.db}") as db:
+    with open(args.sql, "r") as fp: db.execute(fp.read())
+    mktbl.mkWeekPartitions(db.cursor())
+    mktbl.mkLatestPosition(db.cursor())
+    db.commit()
+
+    reset(db)
+    stime = time.time()
+    http = HTTPFetch(args)
+    fetcher.fetchData(db, args, http)
+    http.close()
+    dtSerial = time.time() - stime
+    serial = benchFetch.contents(db)
+    print(f"Single fetch {len(serial)} records {dtSerial:.2f} seconds")
+
+    reset(db)
+    stime = time.time()
+    fetcher.backfill(db, args, None)
+    dtBackfill = time.time() - stime
+    sharded = benchFetch.contents(db)
+    print(f"Backfill {len(sharded)} records {dtBackfill:.2f} seconds,",
+          f"{dtSerial / dtBackfill:.1f}x,", "identical" if serial == sharded else "MISMATCH")
+
+    # Pretend the backfill was interrupted after the first half of the shards
+    cur = db.cursor()
+    cur.execute("SELECT t0 FROM fetchShard ORDER BY t0;")
+    shards = [row[0] for row in cur.fetchall()]
+    tCut = shards[len(shards) // 2]
+    cur.execute("DELETE FROM drifter WHERE t>=%s;", (tCut,))
+    cur.execute("DELETE FROM fetchShard WHERE t0>=%s;", (tCut,))
+    db.commit()
+    args.refetch = False
+    stime = time.time()
+    fetcher.backfill(db, args, None)
+    resumed = benchFetch.contents(db)
+    print(f"Resumed {len(shards) - shards.index(tCut)} of {len(shards)} completed shards",
+          f"in {time.time() - stime:.2f} seconds,",
+          "identical" if serial == resumed else "MISMATCH")
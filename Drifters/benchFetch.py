@@ -0,0 +1,117 @@
+#! /usr/bin/env python3
+#
+# Benchmark fetcher's COPY and merge load against the old row at a time upsert
+#
+# A fakeDrifter feed is served locally and loaded into temporary drifter and fetchState
+# tables, which shadow any real ones, so this is safe to run against the live database.
+#
+#  benchFetch.py --db=arcterx --nDrifters=200 --days=30
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+from threading import Thread
+import datetime
+import fakeDrifter
+import fetcher
+from httpFetch import HTTPFetch
+import logging
+import MakeTables as mktbl
+import psycopg
+import requests
+import time
+
+def mkTable(db) -> None:
+    db.execute("DROP TABLE IF EXISTS pg_temp.drifter;")
+    db.execute("DROP TABLE IF EXISTS pg_temp.fetchState;")
+    db.execute("CREATE TEMPORARY TABLE fetchState (url TEXT PRIMARY KEY,"
+               + " t TIMESTAMP WITH TIME ZONE, request TEXT, etag TEXT, lastModified TEXT,"
+               + " digest TEXT, fetched TIMESTAMP WITH TIME ZONE);")
+    db.execute("CREATE TEMPORARY TABLE drifter ("
+               + "id VARCHAR(20), t TIMESTAMP WITH TIME ZONE,"
+               + " lat DOUBLE PRECISION, lon DOUBLE PRECISION,"
+               + " SST DOUBLE PRECISION, SLP DOUBLE PRECISION,"
+               + " battery DOUBLE PRECISION, drogueCounts INTEGER,"
+               + " qCSV BOOLEAN DEFAULT FALSE, seq BIGSERIAL, PRIMARY KEY(t, id));")
+    mktbl.mkWeekPartitions(db.cursor())
+    db.commit()
+
+def rowByRow(db, url:str) -> int:
+    """ What fetchData used to do """
+    with requests.get(url) as r:
+        sql = "INSERT INTO drifter (id,t,lat,lon,SST,SLP,battery,drogueCounts)"
+        sql+= " VALUES(%s,%s,%s,%s,%s,%s,%s,%s)"
+        sql+= " ON CONFLICT (t,id) DO UPDATE SET"
+        sql+= ",".join(f" {name}=excluded.{name}" for name in fetcher.columns[2:])
+        sql+= ";"
+        cur = db.cursor()
+        cur.execute("BEGIN TRANSACTION;")
+        cnt = 0
+        for line in r.text.split("\n"):
+            if line.startswith("Platform-ID"): continue
+            fields = [x.strip() for x in line.split(",")]
+            if len(fields) < 8: continue
+            fields[1] = datetime.datetime.strptime(fields[1], "%Y-%m-%d %H:%M:%S") \
+                    .replace(tzinfo=datetime.timezone.utc)
+            if abs(float(fields[2])) >= 90: fields[2] = None
+            if abs(float(fields[3])) >= 180: fields[3] = None
+            if float(fields[4]) == -5: fields[4] = None
+            if float(fields[5]) == 850: fields[5] = None
+            cur.execute(sql, fields[0:8])
+            cnt += 1
+        db.commit()
+        return cnt
+
+def contents(db) -> list:
+    cur = db.cursor()
+    cur.execute("SELECT " + ",".join(fetcher.columns) + " FROM drifter ORDER BY t,id;")
+    return cur.fetchall()
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    fakeDrifter.addArgs(parser)
+    parser.add_argument("--db", type=str, default="arcterx", help="Postgresql DB to use")
+    parser.add_argument("--days", type=float, default=7, help="Days of records to fetch")
+    parser.add_argument("--blockSize", type=int, default=100000, help="Records per parsed block")
+    HTTPFetch.addArgs(parser)
+    args = parser.parse_args()
+    args.port = 0 # Any free port
+    if args.now is None: args.now = datetime.datetime.now(tz=datetime.timezone.utc)
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s: %(message)s")
+
+    server = fakeDrifter.mkServer(args)
+    Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://{server.server_address[0]}:{server.server_address[1]}/drifter.py"
+    t0 = args.now - datetime.timedelta(days=args.days)
+    url = base + "?start_date=" + t0.strftime("%Y-%m-%d")
+
+    # fetchData's options for a full refetch
+    args.url = base
+    args.startDate = t0.strftime("%Y-%m-%d")
+    args.refetch = True
+    args.nofetch = False
+    args.overlap = 300
+    args.spool = None
+
+    requests.get(url).raise_for_status() # Generate the feed before timing anything
+
+    with psycopg.connect(f"dbname={args.db}") as db:
+        results = {}
+        for (name, func) in (("row", lambda: rowByRow(db, url)),
+                             ("copy", lambda: fetcher.fetchData(db, args, HTTPFetch(args)))):
+            mkTable(db)
+            stime = time.time()
+            func()
+            dt = time.time() - stime
+            stime = time.time()
+            func() # Again, now every record is an update
+            dtUpdate = time.time() - stime
+            results[name] = contents(db)
+            n = len(results[name])
+            print(f"{name:4s} {n} records insert {dt:.2f}s ({n/dt:.0f}/s)",
+                  f"update {dtUpdate:.2f}s ({n/dtUpdate:.0f}/s)")
+
+        print("Identical" if results["row"] == results["copy"] else "MISMATCH")
+
+    server.shutdown()
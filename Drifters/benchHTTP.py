@@ -0,0 +1,106 @@
+#! /usr/bin/env python3
+#
+# Exercise fetcher's HTTP layer against a local fakeDrifter feed
+#
+# A sequence of hourly runs is simulated by moving the feed's latest record forward,
+# comparing the bytes transferred and records merged by fetchData against the old
+# scheme of an uncompressed GET of the whole window since max(t) plus 300 seconds.
+# Temporary drifter and fetchState tables are used, so this is safe to run against
+# the live database. --drop cuts off a fraction of the responses part way through.
+#
+#  benchHTTP.py --db=arcterx --nDrifters=100 --runs=6 --drop=0.3
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+from threading import Thread
+import benchFetch
+import datetime
+import fakeDrifter
+import fetcher
+from httpFetch import HTTPFetch
+import logging
+import psycopg
+import time
+
+parser = ArgumentParser()
+fakeDrifter.addArgs(parser)
+HTTPFetch.addArgs(parser)
+parser.add_argument("--db", type=str, default="arcterx", help="Postgresql DB to use")
+parser.add_argument("--days", type=float, default=3, help="Days of records in the first fetch")
+parser.add_argument("--runs", type=int, default=6, help="Number of incremental runs")
+parser.add_argument("--interval", type=float, default=3600, help="Seconds between runs")
+parser.add_argument("--blockSize", type=int, default=100000, help="Records per parsed block")
+parser.add_argument("--verbose", action="store_true", help="Log what fetchData does")
+args = parser.parse_args()
+args.port = 0 # Any free port
+args.backoff = min(args.backoff, 0.1) # Nobody is being overloaded
+# The feed ends at now after the last run
+args.now = datetime.datetime.now(tz=datetime.timezone.utc) \
+        - datetime.timedelta(seconds=args.runs * args.interval)
+
+logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                    format="%(asctime)s %(levelname)s: %(message)s")
+
+server = fakeDrifter.mkServer(args)
+Thread(target=server.serve_forever, daemon=True).start()
+args.url = f"http://{server.server_address[0]}:{server.server_address[1]}/drifter.py"
+args.startDate = (args.now - datetime.timedelta(days=args.days)).strftime("%Y-%m-%d")
+args.refetch = False
+args.nofetch = False
+args.overlap = 300
+args.spool = None
+
+class Counter:
+    """ Count the body bytes which HTTPFetch transfers """
+    def __init__(self, http:HTTPFetch) -> None:
+        self.nBytes = 0
+        self.__get = http.get
+        http.get = self.get
+
+    def get(self, *args, **kwargs) -> dict:
+        info = self.__get(*args, **kwargs)
+        if info: self.nBytes += info["nBytes"]
+        return info
+
+def oldScheme(db) -> int:
+    """ Bytes the previous fetchData would have transferred for this run """
+    t = fetcher.lastTime(db)
+    if t is None:
+        t0 = datetime.datetime.strptime(args.startDate, "%Y-%m-%d")
+        t0 = t0.replace(tzinfo=datetime.timezone.utc)
+    else:
+        t0 = t - datetime.timedelta(seconds=300)
+    return sum(len(line) for line in fakeDrifter.mkFeed(server.args, t0, server.args.now))
+
+def count(db) -> int:
+    cur = db.cursor()
+    cur.execute("SELECT count(*) FROM drifter;")
+    return cur.fetchone()[0]
+
+with psycopg.connect(f"dbname={args.db}") as db:
+    benchFetch.mkTable(db)
+    http = HTTPFetch(args)
+    counter = Counter(http)
+    (totOld, totNew) = (0, 0)
+    for run in range(args.runs + 3):
+        if run > 2: server.args.now += datetime.timedelta(seconds=args.interval)
+        server.cache.clear()
+        nOld = oldScheme(db)
+        nBytes = counter.nBytes
+        n = count(db)
+        stime = time.time()
+        fetcher.fetchData(db, args, http)
+        dt = time.time() - stime
+        nNew = counter.nBytes - nBytes
+        if run: # The first one is the initial fill
+            totOld += nOld
+            totNew += nNew
+        print(f"Run {run} {'fill' if run == 0 else 'repeat' if run < 3 else 'delta'}",
+              f"old {nOld} bytes new {nNew} bytes, {count(db) - n} new records",
+              f"{dt:.2f} seconds")
+    print(f"Incremental runs old {totOld} bytes new {totNew} bytes,",
+          f"{totNew / max(1, totOld) * 100:.1f}%")
+    http.close()
+
+server.shutdown()
@@ -2,12 +2,16 @@
 #
 # Increamentally read a growing CSV file and store the results into a PostgreSQL database
 #
+# Events are coalesced per file until it has been quiet for --delay seconds, then the
+# new lines are COPYed into a staging table and merged into drifter in one statement.
+#
 # March-2022, Pat Welch, pat@mousebrains.com
 
 from TPWUtils import Logger
 from TPWUtils import INotify
 from TPWUtils.Thread import Thread
-from TPWUtils.loadAndExecuteSQL import loadAndExecuteSQL
+from TailReader import TailReader
+import MakeTables as mktbl
 from argparse import ArgumentParser
 import logging
 import pyinotify
@@ -18,36 +22,58 @@ import re
 import glob
 import os.path
 
+columns = ("id", "t", "lat", "lon", "sst", "slp", "battery", "droguecounts")
+
 class Reader(Thread):
     def __init__(self, args:ArgumentParser, q:queue.Queue) -> None:
         Thread.__init__(self, "RDR", args)
         self.__queue = q
 
     def runIt(self) -> None:
-        dbOpt = f"dbname={self.args.db}"
-        dt = self.args.delay
+        args = self.args
+        dbOpt = f"dbname={args.db}"
         exp = re.compile(r"drifter[.][0-9]+[.]csv")
         logging.info("exp %s", exp)
         q = self.__queue
+        pending = {} # filename -> (first, last) event times not yet loaded
+        db = None
 
-        with psycopg.connect(dbOpt) as db: 
-            for fn in glob.glob(os.path.join(args.csv, "drifter.*.csv")):
-                if not exp.fullmatch(os.path.basename(fn)): continue
-                self.__loadFile(db, fn)
-
+        files = sorted(glob.glob(os.path.join(args.csv, "drifter.*.csv"))) # Catch up
         while True:
-            (t0, fn) = q.get()
-            q.task_done()
-            if not exp.fullmatch(os.path.basename(fn)): continue
-            time.sleep(dt)
-            logging.info("Woke up")
-            with psycopg.connect(dbOpt) as db: self.__loadFile(db, fn)
+            try:
+                if db is None or db.closed: db = psycopg.connect(dbOpt)
+                for fn in files:
+                    if exp.fullmatch(os.path.basename(fn)): self.__loadFile(db, fn)
+            except psycopg.OperationalError:
+                logging.exception("Lost the database connection, retrying in %s", args.delay)
+                for fn in files: pending.setdefault(fn, (time.time(), time.time()))
+                if db is not None: db.close()
+                db = None
+
+            # Wait until a file has been quiet for delay seconds, or for at most maxDelay
+            files = []
+            while not files:
+                now = time.time()
+                due = {fn: min(pending[fn][1] + args.delay, pending[fn][0] + args.maxDelay)
+                       for fn in pending}
+                files = sorted(fn for fn in due if due[fn] <= now)
+                if files: break
+                try:
+                    (t0, fn) = q.get(timeout=(min(due.values()) - now) if due else None)
+                    q.task_done()
+                    if not exp.fullmatch(os.path.basename(fn)): continue
+                    now = time.time()
+                    pending[fn] = (pending[fn][0] if fn in pending else now, now)
+                except queue.Empty:
+                    pass
+            for fn in files: del pending[fn]
+            logging.info("Woke up for %s files", len(files))
 
     @staticmethod
     def __loadFile(db, fn:str) -> bool:
-        sql0 = "INSERT INTO drifter (id,t,lat,lon,sst,slp,battery,droguecounts)"
-        sql0+= " VALUES(%s,%s,%s,%s,%s,%s,%s,%s)"
-        sql0+= " ON CONFLICT DO NOTHING;"
+        sql0 = "CREATE TEMPORARY TABLE IF NOT EXISTS csvStage (n BIGSERIAL,"
+        sql0+= ",".join(f"{name} TEXT" for name in columns)
+        sql0+= ") ON COMMIT DELETE ROWS;"
 
         sql1 = "SELECT position FROM filePosition WHERE filename=%s;"
 
@@ -60,30 +86,88 @@ class Reader(Thread):
             pos = row[0]
             break
         cur.execute("BEGIN TRANSACTION;")
-        cnt = 0;
-        with open(fn, "r") as fp:
-            if pos:
-                fp.seek(pos)
-            for line in fp:
+        mktbl.lockShared(cur, "drifter") # For exporters
+        cur.execute(sql0)
+        rdr = TailReader(fn, pos)
+        sql3 = "COPY csvStage (" + ",".join(columns) + ") FROM STDIN (FORMAT csv, NULL 'None')"
+        try:
+            with db.transaction(): # Savepoint, so a bad value only costs the fast path
+                cnt = 0
+                with cur.copy(sql3) as copy:
+                    for block in rdr.lines():
+                        block = Reader.__goodLines(block)
+                        if not block: continue
+                        copy.write("\n".join(block) + "\n")
+                        cnt += len(block)
+                nMerged = Reader.__merge(cur) if cnt else 0
+            position = rdr.position
+        except psycopg.errors.DataError:
+            logging.exception("Loading %s, falling back to one line at a time", fn)
+            (cnt, nMerged, position) = Reader.__rowByRow(cur, fn, pos)
+        if cnt:
+            cur.execute(sql2, (fn, position))
+            logging.info("Loaded %s cnt %s merged %s pos %s -> %s", fn, cnt, nMerged, pos, position)
+            db.commit();
+        else:
+            logging.info("Nothing from %s pos %s", fn, pos)
+            db.rollback();
+
+    @staticmethod
+    def __goodLines(lines:list) -> list:
+        """ Skip the header and anything which does not have all the fields """
+        return [line for line in lines if line.count(",") == 7 and line[:3] != "id,"]
+
+    @staticmethod
+    def __merge(cur) -> int:
+        cur.execute("SELECT min(t::TIMESTAMP WITH TIME ZONE),max(t::TIMESTAMP WITH TIME ZONE)"
+                    + " FROM csvStage;")
+        mktbl.ensurePartitions(cur, "drifter", *cur.fetchone())
+        names = ",".join(columns)
+        sql = "INSERT INTO drifter AS d (" + names + ")"
+        sql+= " SELECT DISTINCT ON (t,id) " + names + " FROM ("
+        sql+= "SELECT n,id,t::TIMESTAMP WITH TIME ZONE AS t"
+        sql+= "".join(f",{name}::DOUBLE PRECISION AS {name}" for name in columns[2:-1])
+        sql+= ",droguecounts::DOUBLE PRECISION::INTEGER AS droguecounts"
+        sql+= " FROM csvStage WHERE id IS NOT NULL AND t IS NOT NULL"
+        sql+= ") AS stage ORDER BY t,id,n DESC" # Later lines win, as in fetcher's mergeStage
+        sql+= " ON CONFLICT (t,id) DO UPDATE SET"
+        sql+= ",".join(f" {name}=excluded.{name}" for name in columns[2:])
+        sql+= ",seq=DEFAULT"
+        sql+= " WHERE (" + ",".join(f"d.{name}" for name in columns[2:]) + ")"
+        sql+= " IS DISTINCT FROM (" + ",".join(f"excluded.{name}" for name in columns[2:]) + ")"
+        sql+= ";"
+        cur.execute(sql)
+        return cur.rowcount
+
+    @staticmethod
+    def __rowByRow(cur, fn:str, pos:int) -> tuple:
+        """ Insert the lines in fn after pos one at a time, skipping the ones which fail
+
+        Returns (lines, inserted, position)
+        """
+        sql = "INSERT INTO drifter (" + ",".join(columns) + ")"
+        sql+= " VALUES(%s,%s,%s,%s,%s,%s,%s,%s)"
+        sql+= " ON CONFLICT (t,id) DO UPDATE SET"
+        sql+= ",".join(f" {name}=excluded.{name}" for name in columns[2:])
+        sql+= ",seq=DEFAULT;"
+        rdr = TailReader(fn, pos)
+        (cnt, nMerged) = (0, 0)
+        for block in rdr.lines():
+            for line in Reader.__goodLines(block):
+                cnt += 1
                 fields = line.strip().split(",")
-                if len(fields) < 8: continue # Truncated line so ignore
                 try:
                     for i in range(2,8):
                         fields[i] = float(fields[i]) if fields[i] != "None" else None
-                    cur.execute(sql0, fields[:8]);
-                    cnt += 1
-                except:
-                    continue
-            if cnt:
-                ipos = pos
-                pos = fp.tell()
-                cur.execute(sql2, (fn, pos))
-                logging.info("Loaded %s cnt %s pos %s -> %s", fn, cnt, ipos, pos)
-                db.commit();
-            else:
-                logging.info("Nothing from %s pos %s", fn, pos)
-                db.rollback();
-        
+                    with cur.connection.transaction(): # Savepoint
+                        # The savepoint of the fast path took its partitions with it
+                        mktbl.ensurePartitions(cur, "drifter", fields[1], fields[1])
+                        cur.execute(sql, fields[:8]);
+                    nMerged += 1
+                except (psycopg.DataError, ValueError) as e:
+                    logging.warning("Skipping %s in %s, %s", line, fn, e)
+        return (cnt, nMerged, rdr.position)
+
 parser = ArgumentParser()
 Logger.addArgs(parser)
 parser.add_argument("--sql", type=str, default="drifter.sql",
@@ -91,8 +175,10 @@ parser.add_argument("--sql", type=str, default="drifter.sql",
 parser.add_argument("--csv", type=str, default="~/Sync.ARCTERX/Shore/Drifter",
         help="Input directory to monitor for changes")
 parser.add_argument("--db", type=str, default="arcterx", help="Which Postgresql DB to use")
-parser.add_argument("--delay", type=float, default=10,
-        help="Number of seconds after an update until loading the changes")
+parser.add_argument("--delay", type=float, default=2,
+        help="Seconds a file must be quiet before loading the changes")
+parser.add_argument("--maxDelay", type=float, default=30,
+        help="Maximum seconds to wait to load a file which keeps changing")
 args = parser.parse_args()
 
 Logger.mkLogger(args, fmt="%(asctime)s %(levelname)s: %(message)s")
@@ -104,7 +190,9 @@ if not os.path.isdir(args.csv):
     sys.exit(1)
 
 with psycopg.connect(f"dbname={args.db}") as db:
-    loadAndExecuteSQL(db, args.sql, "drifter")
+    mktbl.mkWeekPartitions(db.cursor())
+    mktbl.mkDrifter(db.cursor(), args.sql)
+    db.commit()
 
 flags = pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO
 
@@ -1,3 +1,8 @@
+-- See drifterWeekly.sql for drifter partitioned by week
+--
+-- Run by MakeTables' mkDrifter every time csv2DB or fetcher starts, on new and deployed
+-- databases alike, so every statement here must be idempotent.
+
 CREATE TABLE IF NOT EXISTS drifter ( -- Luca/SIO drifter information
   id VARCHAR(20) COMPRESSION lz4,
   t TIMESTAMP WITH TIME ZONE,
@@ -7,10 +12,16 @@ CREATE TABLE IF NOT EXISTS drifter ( -- Luca/SIO drifter information
   SLP DOUBLE PRECISION,
   battery DOUBLE PRECISION,
   drogueCounts INTEGER,
-  qCSV BOOLEAN DEFAULT FALSE,
+  qCSV BOOLEAN DEFAULT FALSE, -- No longer used, see MakeTables' exportcursor
+  seq BIGSERIAL, -- Bumped on every insert or update, for exporting changes
   PRIMARY KEY(t, id)
 );
 
+ALTER TABLE drifter ADD COLUMN IF NOT EXISTS seq BIGSERIAL;
+
+-- Rows changed since an exporter's last seq
+CREATE INDEX IF NOT EXISTS drifter_seq ON drifter (seq);
+
 -- Fast lookup with id
 CREATE INDEX IF NOT EXISTS drifter_ident ON drifter (id);
 
@@ -30,6 +41,32 @@ CREATE OR REPLACE TRIGGER drifter_updated AFTER INSERT OR UPDATE
   FOR EACH STATEMENT
     EXECUTE PROCEDURE drifter_updated_func();
 
+-- Keep latest_position up to date, see MakeTables' mkLatestPosition
+CREATE OR REPLACE FUNCTION drifter_latest_func()
+  RETURNS TRIGGER AS $psql$
+BEGIN
+  PERFORM latest_position_merge('drifter', array_agg(id), array_agg(t),
+                                array_agg(lat), array_agg(lon), 10)
+    FROM (SELECT id, t, lat, lon, row_number() OVER (PARTITION BY id ORDER BY t DESC) AS k
+            FROM newrows WHERE lat IS NOT NULL AND lon IS NOT NULL) AS a
+    WHERE k <= 10 HAVING count(*) > 0;
+  RETURN NULL;
+end;
+$psql$
+LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER drifter_latest_insert AFTER INSERT
+  ON drifter
+  REFERENCING NEW TABLE AS newrows
+  FOR EACH STATEMENT
+    EXECUTE PROCEDURE drifter_latest_func();
+
+CREATE OR REPLACE TRIGGER drifter_latest_update AFTER UPDATE
+  ON drifter
+  REFERENCING NEW TABLE AS newrows
+  FOR EACH STATEMENT
+    EXECUTE PROCEDURE drifter_latest_func();
+
 --------
 
 CREATE TABLE IF NOT EXISTS filePosition ( -- Position to start reading records from
@@ -37,3 +74,22 @@ CREATE TABLE IF NOT EXISTS filePosition ( -- Position to start reading records f
   position BIGINT
 ); -- filePosition
 
+
+CREATE TABLE IF NOT EXISTS fetchState ( -- What was last fetched from each URL
+  url TEXT COMPRESSION lz4 PRIMARY KEY,
+  t TIMESTAMP WITH TIME ZONE, -- Watermark, latest record time seen from this url
+  request TEXT COMPRESSION lz4, -- Full URL of the last request, for etag/lastModified
+  etag TEXT,
+  lastModified TEXT,
+  digest TEXT, -- sha256 of the last decoded payload
+  fetched TIMESTAMP WITH TIME ZONE -- When the last request was made
+); -- fetchState
+
+CREATE TABLE IF NOT EXISTS fetchShard ( -- Backfill shards which have been loaded
+  url TEXT COMPRESSION lz4,
+  t0 DATE, -- Inclusive
+  t1 DATE, -- Exclusive
+  nRecords INTEGER,
+  fetched TIMESTAMP WITH TIME ZONE,
+  PRIMARY KEY(url, t0, t1)
+); -- fetchShard
@@ -0,0 +1,76 @@
+-- drifter partitioned by week, instead of the single table in drifter.sql
+--
+-- Each week is its own table, so time range scans only touch the weeks involved,
+-- and a small BRIN index replaces scanning a B-tree for time ranges.
+-- The index names match drifter.sql's, so loading it afterwards changes nothing.
+--
+-- Created, or an existing drifter table migrated, with
+--  ../MakeTables/MakeTables.py --drifter=drifterWeekly.sql
+-- which also creates week_partitions, used by the writers to add weeks as needed.
+
+CREATE TABLE IF NOT EXISTS drifter ( -- Luca/SIO drifter information
+  id VARCHAR(20) COMPRESSION lz4,
+  t TIMESTAMP WITH TIME ZONE,
+  lat DOUBLE PRECISION, -- May be null, but other data should not be
+  lon DOUBLE PRECISION,
+  SST DOUBLE PRECISION,
+  SLP DOUBLE PRECISION,
+  battery DOUBLE PRECISION,
+  drogueCounts INTEGER,
+  qCSV BOOLEAN DEFAULT FALSE, -- No longer used, see MakeTables' exportcursor
+  seq BIGSERIAL, -- Bumped on every insert or update, for exporting changes
+  PRIMARY KEY(t, id)
+) PARTITION BY RANGE (t);
+
+-- Records for a week without a partition, moved out by week_partitions
+CREATE TABLE IF NOT EXISTS drifter_default PARTITION OF drifter DEFAULT;
+
+CREATE INDEX IF NOT EXISTS drifter_time ON drifter USING BRIN (t);
+
+-- Rows changed since an exporter's last seq
+CREATE INDEX IF NOT EXISTS drifter_seq ON drifter (seq);
+
+-- Fast lookup with id, and of the latest record for an id
+CREATE INDEX IF NOT EXISTS drifter_ident ON drifter (id, t);
+
+-- Function sends a notification whenever drifter is updated
+CREATE OR REPLACE FUNCTION drifter_updated_func() 
+  RETURNS  TRIGGER AS $psql$
+BEGIN
+  PERFORM pg_notify('drifter_updated', 'drifter');
+  RETURN NEW;
+end;
+$psql$ 
+LANGUAGE plpgsql;
+
+-- When drifter is updated or inserted into, call the nofiication function
+CREATE OR REPLACE TRIGGER drifter_updated AFTER INSERT OR UPDATE 
+  ON drifter
+  FOR EACH STATEMENT
+    EXECUTE PROCEDURE drifter_updated_func();
+
+-- Keep latest_position up to date, see MakeTables' mkLatestPosition
+CREATE OR REPLACE FUNCTION drifter_latest_func()
+  RETURNS TRIGGER AS $psql$
+BEGIN
+  PERFORM latest_position_merge('drifter', array_agg(id), array_agg(t),
+                                array_agg(lat), array_agg(lon), 10)
+    FROM (SELECT id, t, lat, lon, row_number() OVER (PARTITION BY id ORDER BY t DESC) AS k
+            FROM newrows WHERE lat IS NOT NULL AND lon IS NOT NULL) AS a
+    WHERE k <= 10 HAVING count(*) > 0;
+  RETURN NULL;
+end;
+$psql$
+LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER drifter_latest_insert AFTER INSERT
+  ON drifter
+  REFERENCING NEW TABLE AS newrows
+  FOR EACH STATEMENT
+    EXECUTE PROCEDURE drifter_latest_func();
+
+CREATE OR REPLACE TRIGGER drifter_latest_update AFTER UPDATE
+  ON drifter
+  REFERENCING NEW TABLE AS newrows
+  FOR EACH STATEMENT
+    EXECUTE PROCEDURE drifter_latest_func();
@@ -0,0 +1,54 @@
+#! /usr/bin/env python3
+#
+# Append new drifter records to the weekly CSV files shortly after they are stored
+#
+# drifter's statement trigger notifies drifter_updated, so the export runs within
+# --exportDelay seconds of new data rather than on the fetch timer, and makes no
+# queries while the drifters are quiet. fetcher.py's export uses the same cursor,
+# so only one of them writes any given rows.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+from TPWUtils import Logger
+from TPWUtils.Thread import Thread
+from ExportRunner import ExportRunner
+import MakeTables as mktbl
+import fetcher
+import logging
+import psycopg
+import sys
+import os.path
+
+parser = ArgumentParser()
+Logger.addArgs(parser)
+parser.add_argument("--csv", type=str, default="~/Sync/Shore/Drifter",
+                    help="Directory to write the weekly CSV files into")
+parser.add_argument("--cursor", type=str, default="drifterCSV",
+                    help="Export cursor name, one per CSV directory")
+parser.add_argument("--db", type=str, default="arcterx", help="Which Postgresql DB to use")
+ExportRunner.addArgs(parser)
+args = parser.parse_args()
+
+Logger.mkLogger(args, fmt="%(asctime)s %(levelname)s: %(message)s")
+
+args.csv = os.path.abspath(os.path.expanduser(args.csv))
+
+if not os.path.isdir(args.csv):
+    logging.error("%s is not a directory", args.csv)
+    sys.exit(1)
+
+dbArg = f"dbname={args.db}"
+
+with psycopg.connect(dbArg) as db:
+    mktbl.mkExportCursor(db.cursor())
+    db.commit()
+
+exporter = ExportRunner(args, dbArg)
+exporter.register("drifter_updated", lambda db: fetcher.updateCSV(db, args.csv, False, args.cursor))
+exporter.start()
+
+try:
+    Thread.waitForException()
+except:
+    logging.exception("Unexpected exception")
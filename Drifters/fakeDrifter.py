@@ -0,0 +1,181 @@
+#! /usr/bin/env python3
+#
+# A stand-in for SIO's drifter.py endpoint which serves a synthetic feed
+#
+# Records are generated on the fly for --nDrifters drifters every --dt seconds,
+# in the same layout as the real feed, including the sentinel values.
+# start_date=YYYY-MM-DD, days_ago=fractional-days, and end_date=YYYY-MM-DD, exclusive,
+# are understood.
+#
+# Like a well behaved server, it gzips when asked to, sends an ETag and honours
+# If-None-Match and Range/If-Range. --drop cuts off that fraction of the
+# responses part way through, to exercise retrying and resuming. --latency and --rate
+# make each connection behave like one over a satellite link.
+#
+#  fakeDrifter.py --port=8123 &
+#  fetcher.py --url=http://localhost:8123/drifter.py --refetch
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Lock
+from urllib.parse import urlparse, parse_qs
+import datetime
+import gzip
+import hashlib
+import logging
+import math
+import re
+import time
+
+header = "Platform-ID, Timestamp(UTC), Latitude, Longitude, SST, SLP, Battery, Drogue-Counts"
+
+def mkRecord(ident:int, t:datetime.datetime) -> str:
+    """ A deterministic record, so repeated fetches return the same values """
+    seconds = t.timestamp()
+    n = int(seconds) // 60 + ident
+    lat = 18 + ident / 10 + 0.01 * math.sin(seconds / 86400)
+    lon = 134 + ident / 10 + 0.01 * math.cos(seconds / 86400)
+    sst = 28 + math.sin(seconds / 3600)
+    slp = 1010 + math.cos(seconds / 7200)
+    if n % 97 == 0: lat = lon = 99999 # Bad fix
+    if n % 89 == 0: sst = -5 # Sentinels
+    if n % 83 == 0: slp = 850
+    return f"{300234060000000 + ident}, {t:%Y-%m-%d %H:%M:%S}, {lat:.5f}, {lon:.5f}," \
+           f" {sst:.2f}, {slp:.1f}, {13.5 - (n % 100) / 100:.2f}, {n % 50}\n"
+
+def mkFeed(args:ArgumentParser, t0:datetime.datetime, t1:datetime.datetime):
+    """ Yield the lines of the feed between t0 and t1 """
+    yield header + "\n"
+    dt = datetime.timedelta(seconds=args.dt)
+    t0 = datetime.datetime.fromtimestamp(math.ceil(t0.timestamp() / args.dt) * args.dt,
+                                         tz=datetime.timezone.utc)
+    while t0 <= t1:
+        for ident in range(args.nDrifters):
+            yield mkRecord(ident, t0)
+        t0 += dt
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt:str, *args) -> None:
+        logging.info("%s %s", self.address_string(), fmt % args)
+
+    def window(self) -> tuple:
+        opts = parse_qs(urlparse(self.path).query)
+        now = datetime.datetime.now(tz=datetime.timezone.utc) # days_ago is from the clock
+        t1 = now if self.server.args.now is None else self.server.args.now
+        if "start_date" in opts:
+            t0 = datetime.datetime.strptime(opts["start_date"][0], "%Y-%m-%d")
+            t0 = t0.replace(tzinfo=datetime.timezone.utc)
+        elif "days_ago" in opts:
+            t0 = now - datetime.timedelta(days=float(opts["days_ago"][0]))
+        else:
+            t0 = now - datetime.timedelta(days=1)
+        if "end_date" in opts: # Exclusive
+            t2 = datetime.datetime.strptime(opts["end_date"][0], "%Y-%m-%d")
+            t1 = min(t1, t2.replace(tzinfo=datetime.timezone.utc) - datetime.timedelta(seconds=1))
+        return (t0, t1)
+
+    def body(self) -> bytes:
+        cache = self.server.cache # Only used with a fixed --now
+        if self.path in cache: return cache[self.path]
+        (t0, t1) = self.window()
+        body = "".join(mkFeed(self.server.args, t0, t1)).encode("utf-8")
+        if self.server.args.now is not None: cache[self.path] = body
+        return body
+
+    def send(self, data:bytes) -> None:
+        rate = self.server.args.rate # Bytes/second for each connection, like a long thin link
+        if not rate:
+            self.wfile.write(data)
+            return
+        n = max(1, int(rate / 10))
+        for offset in range(0, len(data), n):
+            self.wfile.write(data[offset:offset+n])
+            time.sleep(len(data[offset:offset+n]) / rate)
+
+    def do_GET(self) -> None:
+        if self.server.args.latency: time.sleep(self.server.args.latency)
+        try:
+            body = self.body()
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+
+        qGzip = "gzip" in self.headers.get("Accept-Encoding", "")
+        if qGzip: body = gzip.compress(body, mtime=0)
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        status = 200
+        offset = 0
+        matches = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        if matches and self.headers.get("If-Range", etag) == etag \
+                and int(matches[1]) < len(body):
+            status = 206
+            offset = int(matches[1])
+
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        if qGzip: self.send_header("Content-Encoding", "gzip")
+        self.send_header("ETag", etag)
+        self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {offset}-{len(body)-1}/{len(body)}")
+        self.send_header("Content-Length", str(len(body) - offset))
+        self.end_headers()
+
+        server = self.server
+        with server.lock:
+            server.nRequests += 1
+            qDrop = server.nRequests * server.args.drop >= server.nDropped + 1
+            if qDrop: server.nDropped += 1
+        if qDrop and len(body) - offset > 1: # Send half then hang up
+            self.send(body[offset:offset + (len(body) - offset) // 2])
+            self.close_connection = True
+            return
+        self.send(body[offset:])
+
+def mkServer(args:ArgumentParser, handler=Handler) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.args = args
+    server.cache = {}
+    server.lock = Lock()
+    server.nRequests = 0
+    server.nDropped = 0
+    return server
+
+def addArgs(parser:ArgumentParser) -> None:
+    grp = parser.add_argument_group(description="Fake drifter feed options")
+    grp.add_argument("--host", type=str, default="localhost", help="Address to listen on")
+    grp.add_argument("--port", type=int, default=8123, help="Port to listen on")
+    grp.add_argument("--nDrifters", type=int, default=50, help="Number of drifters")
+    grp.add_argument("--dt", type=float, default=600, help="Seconds between records")
+    grp.add_argument("--now", type=datetime.datetime.fromisoformat,
+                     help="Latest record in the feed, ISO format with a timezone")
+    grp.add_argument("--latency", type=float, default=0,
+                     help="Seconds to wait before answering a request")
+    grp.add_argument("--rate", type=float, default=0,
+                     help="Bytes/second to send at on each connection, 0 is unlimited")
+    grp.add_argument("--drop", type=float, default=0,
+                     help="Fraction of responses to cut off part way through")
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    addArgs(parser)
+    parser.add_argument("--verbose", action="store_true", help="Log each request")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(levelname)s: %(message)s")
+
+    with mkServer(args) as server:
+        logging.warning("Serving on http://%s:%s/drifter.py", args.host, args.port)
+        server.serve_forever()
@@ -6,64 +6,84 @@
 # then generate a CSV file of the records that have not been written to a CSV file.
 # Also adapt the fetch data into the past, based on the last time stamps in the database.
 #
+# The watermark, the latest record time seen, and the validators of the last response
+# are kept in fetchState, so only the records since the day of the watermark, less
+# --overlap, are asked for, the server can answer 304 Not Modified until that day
+# changes, and an unchanged payload is skipped without being parsed.
+#
+# --backfill splits the history from --startDate into --shardDays shards which are
+# fetched by --workers in parallel. Completed shards are recorded in fetchShard,
+# so rerunning an interrupted backfill only fetches the rest. Shards end on the weekly
+# partition boundaries. Should the server ignore --endParam, the backfill falls back
+# to a single fetch from --startDate.
+#
 # March-2022, Pat Welch, pat@mousebrains.com
 # Jan-2025, Pat Welch, pat@mousebrains.com # Modified for IOP-2025
 
 from TPWUtils import Logger
-from TPWUtils.loadAndExecuteSQL import loadAndExecuteSQL
 import logging
 from argparse import ArgumentParser
 from TPWUtils.Credentials import getCredentials
-import math
+from TimeDecoder import decodeYMD
+import MakeTables as mktbl
 import datetime
-import re
+import copy
 import psycopg
 import os
 import sys
-import requests
-from requests.auth import HTTPDigestAuth
+import time
+import tempfile
+from httpFetch import HTTPFetch
 
-def updateCSV(db, dirname:str, qForce:bool) -> None:
-    sql0 = "CREATE TEMPORARY TABLE tpwDrifter (LIKE drifter);"
-    sql1 = "WITH updated AS ("
-    sql1+= "UPDATE drifter SET qCSV=TRUE"
-    if not args.force: sql1+= " WHERE NOT qCSV"
-    sql1+= " RETURNING id,t,lat,lon,SST,SLP,battery,drogueCounts"
-    sql1+= ")"
-    sql1+= "INSERT INTO tpwDrifter SELECT * FROM updated;"
+# Python's %Y%W, the week of the year with weeks starting on Monday, of drifter's t
+weekSQL = "to_char(t,'YYYY')"
+weekSQL+= "||lpad(((EXTRACT(DOY FROM t)+7-EXTRACT(ISODOW FROM t))::INTEGER/7)::TEXT,2,'0')"
 
-    sql2 = "SELECT id,t,lat,lon,SST,SLP,battery,drogueCounts"
-    sql2+= " FROM tpwDrifter ORDER BY t;"
+def updateCSV(db, dirname:str, qForce:bool, name:str="drifterCSV") -> None:
+    """ Append rows changed since the last export to the weekly CSV files
 
+    Each week is streamed with COPY straight into its file, ordered by time
+    """
     cur = db.cursor()
-    cur.execute(sql0)
-    cur.execute(sql1)
+    (after, upto, where) = mktbl.exportRange(cur, name, "drifter", "qCSV")
+    if qForce: (after, where) = (0, "")
+    if upto is None or upto <= after:
+        logging.info("No new CSV records")
+        db.rollback()
+        return
+
+    sqlSel = " FROM drifter WHERE seq>%s AND seq<=%s" + where
+
+    cur.execute("SELECT " + weekSQL + ",min(t),max(t)" + sqlSel + " GROUP BY 1 ORDER BY 1;",
+                (after, upto))
+    weeks = cur.fetchall()
 
     nCreated = 0
     nOpened = 0
-    cnt = 0
-    yyyymmdd = None
-    fp = None
-    for row in cur.execute(sql2):
-        base = row[1].strftime("%Y%W")
-        if base != yyyymmdd:
-            yyyymmdd = base
-            if fp: fp.close()
-            fn = os.path.join(dirname, f"drifter.{base}.csv")
-            if args.force or not os.path.exists(fn):
-                logging.info("Creating %s", fn)
-                nCreated += 1
-                fp = open(fn, "w")
-                fp.write("id,t,lat,lon,sst,slp,battery,drogue\n")
-            else:
-                logging.info("Opening %s", fn)
-                nOpened += 1
-                fp = open(fn, "a")
-        fp.write(",".join(map(str, row)) + "\n")
-        cnt += 1
-
-    if fp: fp.close()
-    logging.info("Fetched %s CSV records created %s opened %s", cnt, nCreated, nOpened)
+    nBytes = 0
+    sql = "COPY (SELECT id,t,lat,lon,SST,SLP,battery,drogueCounts" + sqlSel
+    sql+= " AND t>=%s AND t<=%s ORDER BY t)" # Weeks are contiguous, so min/max is enough
+    sql+= " TO STDOUT (FORMAT csv, NULL 'None')" # csv2DB expects None for NULL
+    for (week, t0, t1) in weeks:
+        fn = os.path.join(dirname, f"drifter.{week}.csv")
+        if qForce or not os.path.exists(fn):
+            logging.info("Creating %s", fn)
+            nCreated += 1
+            fp = open(fn, "wb", buffering=1024*1024)
+            fp.write(b"id,t,lat,lon,sst,slp,battery,drogue\n")
+        else:
+            logging.info("Opening %s", fn)
+            nOpened += 1
+            fp = open(fn, "ab", buffering=1024*1024)
+        with fp, cur.copy(sql, (after, upto, t0, t1)) as copy:
+            for data in copy:
+                fp.write(data)
+                nBytes += len(data)
+
+    mktbl.setCursor(cur, name, upto)
+    db.commit()
+    logging.info("Wrote %s CSV bytes for seq %s to %s created %s opened %s",
+                 nBytes, after, upto, nCreated, nOpened)
 
 def lastTime(db) -> None:
     cur = db.cursor()
@@ -71,86 +91,334 @@ def lastTime(db) -> None:
         return row[0]
     return None
 
-def fetchData(db, args:ArgumentParser) -> None:
+columns = ("id", "t", "lat", "lon", "SST", "SLP", "battery", "drogueCounts")
+
+def parseBlock(df:"pd.DataFrame") -> "pd.DataFrame":
+    """ Clean up a block of raw drifter records, all columns are str """
+    import numpy as np
+    import pandas as pd
+
+    df = df[df.t.notna() & df.id.notna()]
+    t = df.t.str.strip()
+    q = t.str.fullmatch(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}") # Drops the header line too
+    df = df[q]
+    if df.empty: return None
+
+    out = pd.DataFrame({"id": df.id.str.strip()})
+    # ISO strings with an explicit UTC offset are much faster to write out than datetimes
+    out["t"] = np.char.add(np.datetime_as_string(decodeYMD.bulk(t[q].to_numpy())), "+00")
+    values = {name: pd.to_numeric(df[name], errors="coerce") for name in columns[2:]}
+    # Sentinel and out of range values
+    values["lat"] = values["lat"].mask(values["lat"].abs() >= 90)
+    values["lon"] = values["lon"].mask(values["lon"].abs() >= 180)
+    values["SST"] = values["SST"].mask(values["SST"] == -5)
+    values["SLP"] = values["SLP"].mask(values["SLP"] == 850)
+    for name in columns[2:-1]:
+        # Pass the original text through, it is much faster to write than a float
+        out[name] = df[name].where(values[name].notna())
+    out["drogueCounts"] = values["drogueCounts"].round().astype("Int64")
+    return out
+
+def copyBlocks(cur, blocks) -> int:
+    """ COPY blocks of parsed records into the staging table, returns the number of rows """
+    cur.execute("CREATE TEMPORARY TABLE IF NOT EXISTS drifterStage ("
+                + "n BIGINT, id TEXT, t TIMESTAMP WITH TIME ZONE,"
+                + " lat DOUBLE PRECISION, lon DOUBLE PRECISION,"
+                + " SST DOUBLE PRECISION, SLP DOUBLE PRECISION,"
+                + " battery DOUBLE PRECISION, drogueCounts INTEGER"
+                + ") ON COMMIT DELETE ROWS;")
+    cnt = 0
+    sql = "COPY drifterStage (n," + ",".join(columns) + ") FROM STDIN (FORMAT csv)"
+    with cur.copy(sql) as copy:
+        for df in blocks:
+            if df is None or df.empty: continue
+            df.insert(0, "n", range(cnt, cnt + df.shape[0])) # Later records win in the merge
+            copy.write(df.to_csv(header=False, index=False))
+            cnt += df.shape[0]
+    return cnt
+
+def mergeStage(cur, tLimits:tuple=None) -> int:
+    """ Upsert the staging table, records in [tLimits), into drifter
+
+    returns the number of rows changed
+    """
+    names = ",".join(columns)
+    sql = "INSERT INTO drifter AS d (" + names + ")"
+    sql+= " SELECT DISTINCT ON (t,id) " + names + " FROM drifterStage"
+    sql+= " WHERE t IS NOT NULL AND id IS NOT NULL"
+    if tLimits: sql+= " AND t>=%s AND t<%s"
+    sql+= " ORDER BY t,id,n DESC"
+    sql+= " ON CONFLICT (t,id) DO UPDATE SET"
+    sql+= ",".join(f" {name}=excluded.{name}" for name in columns[2:])
+    sql+= ",seq=DEFAULT" # So exporters pick up the change
+    # Records in the overlap with the last fetch are usually unchanged, so leave them be
+    sql+= " WHERE (" + ",".join(f"d.{name}" for name in columns[2:]) + ")"
+    sql+= " IS DISTINCT FROM (" + ",".join(f"excluded.{name}" for name in columns[2:]) + ")"
+    sql+= ";"
+    cur.execute("SELECT min(t),max(t) FROM drifterStage;")
+    mktbl.ensurePartitions(cur, "drifter", *cur.fetchone())
+    mktbl.lockShared(cur, "drifter") # For exporters
+    cur.execute(sql, tLimits)
+    return cur.rowcount
+
+def loadPayload(cur, fp, info:dict, blockSize:int, tLimits:tuple=None) -> tuple:
+    """ Parse, COPY and merge a fetched payload
+
+    returns (number of records, number merged, latest record time)
+    """
+    import pandas as pd
+
+    reader = pd.read_csv(HTTPFetch.open(fp, info), header=None, names=columns,
+                         usecols=range(len(columns)), dtype=str,
+                         skipinitialspace=True, on_bad_lines="skip",
+                         chunksize=blockSize)
+    cnt = copyBlocks(cur, map(parseBlock, reader))
+    if not cnt: return (0, 0, None)
+    nMerged = mergeStage(cur, tLimits)
+    cur.execute("SELECT max(t) FROM drifterStage;")
+    return (cnt, nMerged, cur.fetchone()[0])
+
+def getState(db, url:str) -> dict:
+    sql = "SELECT t,request,etag,lastModified,digest FROM fetchState WHERE url=%s;"
+    cur = db.cursor()
+    for row in cur.execute(sql, (url,)):
+        return dict(zip(("t", "request", "etag", "lastModified", "digest"), row))
+    return {}
+
+def putState(cur, url:str, state:dict) -> None:
+    names = ("t", "request", "etag", "lastModified", "digest")
+    sql = "INSERT INTO fetchState (url,fetched," + ",".join(names) + ")"
+    sql+= " VALUES(%s,CURRENT_TIMESTAMP" + ",%s" * len(names) + ")"
+    sql+= " ON CONFLICT (url) DO UPDATE SET fetched=excluded.fetched,"
+    sql+= ",".join(f"{name}=excluded.{name}" for name in names)
+    sql+= ";"
+    cur.execute(sql, [url] + [state.get(name) for name in names])
+
+def mkURL(db, args:ArgumentParser, state:dict) -> str:
+    # The watermark is the latest record seen from this url, falling back to the table
+    t = None if args.refetch else (state.get("t") or lastTime(db))
+    if t is None: return args.url + "?start_date=" + args.startDate
+    # A date, rather than days_ago from now, so the request, and with it the validators,
+    # stays the same until the watermark, less the overlap, moves into a new day.
+    # The extra records are mostly unchanged, so the digest or merge skips them.
+    t = t.astimezone(datetime.timezone.utc) - datetime.timedelta(seconds=args.overlap)
+    return args.url + f"?start_date={t:%Y-%m-%d}"
+
+def fetchData(db, args:ArgumentParser, fetcher:HTTPFetch) -> None:
     if args.nofetch: return # Nothing to do
 
-    t = None if args.refetch else lastTime(db)
-    if t is None:
-        url = args.url + "?start_date=" + args.startDate
-    else:
-        now = datetime.datetime.now(tz=datetime.timezone.utc)
-        dt = max(0, (now - t).total_seconds()) # seconds since last update
-        dt += 300 # Add 5 minute to the fetch interval
-        dt /= 86400 # Days ago
-        dt = math.ceil(dt * 10000) / 10000 # round up to the longer 8.64 second interval
-        url = args.url + f"?days_ago={dt}"
+    state = {} if args.refetch else getState(db, args.url)
+    url = mkURL(db, args, state)
     logging.info("url %s", url)
-    with requests.get(url, auth=(username, codigo)) as r:
-        sql = "INSERT INTO drifter"
-        sql+= "(id,t,lat,lon,SST,SLP,battery,drogueCounts)"
-        sql+= " VALUES(%s,%s,%s,%s,%s,%s,%s,%s)"
-        sql+= " ON CONFLICT (t,id) DO UPDATE SET"
-        sql +=" lat=excluded.lat"
-        sql +=",lon=excluded.lon"
-        sql +=",SST=excluded.SST"
-        sql +=",SLP=excluded.SLP"
-        sql +=",battery=excluded.battery"
-        sql +=",drogueCounts=excluded.drogueCounts"
-        sql+= ";"
+    stime = time.time()
+    qSame = state.get("request") == url # Only then do the validators apply
+    with tempfile.TemporaryFile(dir=args.spool) as fp:
+        info = fetcher.get(url, fp,
+                           state.get("etag") if qSame else None,
+                           state.get("lastModified") if qSame else None)
         cur = db.cursor()
         cur.execute("BEGIN TRANSACTION;")
-        cnt = 0
-        for line in r.text.split("\n"):
-            if re.match(r"^Platform-ID", line): continue
-            fields = line.split(",")
-            if len(fields) < 8: continue;
-            for i in range(len(fields)):
-                fields[i] = fields[i].strip() # Strip off leanding/trailing whitespace
-            fields[1] = datetime.datetime.strptime(fields[1], "%Y-%m-%d %H:%M:%S")
-            fields[1] = fields[1].replace(tzinfo=datetime.timezone.utc)
-            if abs(float(fields[2])) >= 90: fields[2] = None
-            if abs(float(fields[3])) >= 180: fields[3] = None
-            if float(fields[4]) == -5: fields[4] = None
-            if float(fields[5]) == 850: fields[5] = None
-            cur.execute(sql, fields[0:8])
-            cnt += 1
+        if info is None:
+            logging.info("Not modified, %s", url)
+            putState(cur, args.url, state | {"request": url})
+            db.commit()
+            return
+        logging.info("Transferred %s bytes for %s bytes in %.2f seconds",
+                     info["nBytes"], info["size"], time.time() - stime)
+        newState = {"t": state.get("t"), "request": url, "etag": info["etag"],
+                    "lastModified": info["lastModified"], "digest": info["digest"]}
+        if info["digest"] == state.get("digest"):
+            logging.info("Payload unchanged, %s", info["digest"])
+            putState(cur, args.url, newState)
+            db.commit()
+            return
+
+        (cnt, nMerged, tMax) = loadPayload(cur, fp, info, args.blockSize)
+        if tMax is not None and (newState["t"] is None or tMax > newState["t"]):
+            newState["t"] = tMax
+        putState(cur, args.url, newState)
+        db.commit()
+        logging.info("Fetched %d records, merged %d, in %.2f seconds",
+                     cnt, nMerged, time.time() - stime)
+
+def mkShards(args:ArgumentParser) -> list:
+    """ Split startDate through today into shards, [t0, t1)
+
+    Shards end on Mondays, every shardDays rounded up to whole weeks, so no two shards
+    write into the same weekly partition, see week_partitions in MakeTables.
+    """
+    t0 = datetime.datetime.strptime(args.startDate, "%Y-%m-%d").date()
+    tEnd = datetime.datetime.now(tz=datetime.timezone.utc).date() + datetime.timedelta(days=1)
+    dt = datetime.timedelta(weeks=max(1, -(-args.shardDays // 7)))
+    t1 = t0 - datetime.timedelta(days=t0.weekday()) + dt # Monday on or before t0 plus dt
+    shards = []
+    while t0 < tEnd:
+        shards.append((t0, min(t1, tEnd)))
+        (t0, t1) = (t1, t1 + dt)
+    return shards
+
+class EndIgnored(Exception):
+    """ The server returned records past a shard's end """
+    pass
+
+def loadShard(args:ArgumentParser, auth:tuple, t0:datetime.date, t1:datetime.date) -> int:
+    """ Fetch, load, and commit one shard on its own connection, returns records merged """
+    url = args.url + f"?start_date={t0:%Y-%m-%d}&{args.endParam}={t1:%Y-%m-%d}"
+    tLimits = tuple(datetime.datetime.combine(x, datetime.time(), tzinfo=datetime.timezone.utc)
+                    for x in (t0, t1)) # In case the server ignores the end
+    qOpen = tLimits[1] > datetime.datetime.now(tz=datetime.timezone.utc) # Still filling
+    stime = time.time()
+    fetcher = HTTPFetch(args, auth)
+    try:
+        with psycopg.connect(f"dbname={args.db}") as db, \
+                tempfile.TemporaryFile(dir=args.spool) as fp:
+            info = fetcher.get(url, fp)
+            cur = db.cursor()
+            cur.execute("BEGIN TRANSACTION;")
+            (cnt, nMerged, tMax) = loadPayload(cur, fp, info, args.blockSize, tLimits)
+            if tMax is not None and tMax >= tLimits[1]:
+                db.rollback()
+                raise EndIgnored(f"{args.endParam} ignored, {tMax} for a shard ending {t1}")
+            if not qOpen:
+                sql = "INSERT INTO fetchShard (url,t0,t1,nRecords,fetched)"
+                sql+= " VALUES(%s,%s,%s,%s,CURRENT_TIMESTAMP)"
+                sql+= " ON CONFLICT (url,t0,t1) DO UPDATE SET"
+                sql+= " nRecords=excluded.nRecords,fetched=excluded.fetched;"
+                cur.execute(sql, (args.url, t0, t1, cnt))
+            db.commit()
+    finally:
+        fetcher.close()
+    logging.info("Shard %s to %s, %s bytes, %s records, merged %s, in %.2f seconds",
+                 t0, t1, info["nBytes"], cnt, nMerged, time.time() - stime)
+    return nMerged
+
+def backfill(db, args:ArgumentParser, auth:tuple) -> None:
+    """ Fetch from startDate in date shards with a pool of workers
+
+    Each shard is committed as it completes and recorded in fetchShard,
+    so an interrupted backfill picks up with the shards which are not done.
+    The shard containing today is never marked as done.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    cur = db.cursor()
+    if args.refetch: cur.execute("DELETE FROM fetchShard WHERE url=%s;", (args.url,))
+    cur.execute("SELECT t0,t1 FROM fetchShard WHERE url=%s;", (args.url,))
+    done = set(cur.fetchall())
+    db.commit()
+
+    shards = [x for x in mkShards(args) if x not in done]
+    logging.info("Backfilling %s shards of %s days, %s already done, with %s workers",
+                 len(shards), args.shardDays, len(done), args.workers)
+    if not shards: return
+
+    # Create the partitions up front, otherwise the shards serialize on the creation lock
+    tLimits = [datetime.datetime.combine(x, datetime.time(), tzinfo=datetime.timezone.utc)
+               for x in (min(shards)[0], max(shards)[1])]
+    cur.execute("BEGIN TRANSACTION;")
+    n = mktbl.ensurePartitions(cur, "drifter", tLimits[0], tLimits[1])
+    db.commit()
+    logging.info("Created %s partitions from %s to %s", n, *tLimits)
+
+    stime = time.time()
+    nMerged = 0
+    failed = []
+    qIgnored = False
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(loadShard, args, auth, t0, t1): (t0, t1) for (t0, t1) in shards}
+        for future in as_completed(futures):
+            try:
+                nMerged += future.result()
+            except EndIgnored as e:
+                logging.error("Shard %s to %s, %s", *futures[future], e)
+                qIgnored = True
+                pool.shutdown(wait=False, cancel_futures=True)
+                break
+            except:
+                logging.exception("Shard %s to %s", *futures[future])
+                failed.append(futures[future])
+
+    if qIgnored: # Each shard would be a full fetch, so do one instead
+        logging.warning("Falling back to a single fetch from %s", args.startDate)
+        args = copy.copy(args)
+        args.refetch = True # From startDate, without validators
+        fetcher = HTTPFetch(args, auth)
+        try:
+            fetchData(db, args, fetcher)
+        finally:
+            fetcher.close()
+        return
+
+    logging.info("Backfilled %s shards, merged %s, in %.2f seconds",
+                 len(shards) - len(failed), nMerged, time.time() - stime)
+    if failed: raise Exception(f"{len(failed)} shards failed, rerun to retry them")
+
+    # Carry on incrementally from here
+    cur.execute("BEGIN TRANSACTION;")
+    putState(cur, args.url, {"t": lastTime(db)})
+    db.commit()
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    Logger.addArgs(parser)
+    parser.add_argument("--credentials", type=str, default="~/.config/Drifters/.drifters",
+            help="Location of credentials file")
+    parser.add_argument("--startDate", type=str, default="2025-01-01",
+            help="When to start fetching data from")
+    parser.add_argument("--url", type=str,
+            default="https://gdp.ucsd.edu/cgi-bin/projects/arcterx/drifter.py",
+            help="URL to fetch")
+    parser.add_argument("--sql", type=str, default="drifter.sql",
+            help="SQL defining tables and triggers")
+    parser.add_argument("--csv", type=str, default="~/Sync/Shore/Drifter",
+            help="Where to store CSV files")
+    parser.add_argument("--db", type=str, default="arcterx", help="Which Postgresql DB to use")
+    parser.add_argument("--force", action="store_true", help="Rebuild the CSV file from scratch")
+    parser.add_argument("--noCSV", action="store_true",
+                        help="Do not update the CSV files, exporter.py is doing it")
+    parser.add_argument("--blockSize", type=int, default=100000,
+            help="Number of records to parse at a time")
+    parser.add_argument("--overlap", type=float, default=300,
+            help="Seconds before the watermark to refetch, for late records")
+    parser.add_argument("--spool", type=str, help="Directory to spool the download into")
+    HTTPFetch.addArgs(parser)
+    grp = parser.add_argument_group(description="Backfill options")
+    grp.add_argument("--backfill", action="store_true",
+            help="Fetch from startDate in date shards, in parallel, resuming where it left off")
+    grp.add_argument("--shardDays", type=int, default=7,
+            help="Days per backfill shard, rounded up to whole weeks")
+    grp.add_argument("--workers", type=int, default=4, help="Number of shards fetched at once")
+    grp.add_argument("--endParam", type=str, default="end_date",
+            help="URL parameter for the exclusive end date of a shard")
+    grp = parser.add_mutually_exclusive_group()
+    grp.add_argument("--refetch", action="store_true",
+            help="Rebuild the DB from a full fetch, or restart a backfill")
+    grp.add_argument("--nofetch", action="store_true", help="Do not actually fetch fresh data")
+    args = parser.parse_args()
+
+    if args.logfile: args.logfile = os.path.abspath(os.path.expanduser(args.logfile))
+
+    Logger.mkLogger(args, fmt="%(asctime)s %(levelname)s: %(message)s")
+
+    args.csv = os.path.abspath(os.path.expanduser(args.csv))
+    args.credentials = os.path.abspath(os.path.expanduser(args.credentials))
+    if args.spool: args.spool = os.path.abspath(os.path.expanduser(args.spool))
+
+    if not os.path.isdir(args.csv):
+        logging.info("Creating %s", args.csv)
+        os.makedirs(args.csv, mode=0o755, exist_ok=True)
+
+    (username, codigo) = getCredentials(args.credentials) # login credentials for ucsd
+
+    with psycopg.connect(f"dbname={args.db}") as db: # Get the last time stored in the database
+        mktbl.mkDrifter(db.cursor(), args.sql)
+        mktbl.mkExportCursor(db.cursor())
+        mktbl.mkWeekPartitions(db.cursor())
         db.commit()
-        logging.info("Fetched %d bytes which is %d records", len(r.text), cnt)
-
-parser = ArgumentParser()
-Logger.addArgs(parser)
-parser.add_argument("--credentials", type=str, default="~/.config/Drifters/.drifters",
-        help="Location of credentials file")
-parser.add_argument("--startDate", type=str, default="2025-01-01",
-        help="When to start fetching data from")
-parser.add_argument("--url", type=str,
-        default="https://gdp.ucsd.edu/cgi-bin/projects/arcterx/drifter.py",
-        help="URL to fetch")
-parser.add_argument("--sql", type=str, default="drifter.sql",
-        help="SQL defining tables and triggers")
-parser.add_argument("--csv", type=str, default="~/Sync/Shore/Drifter",
-        help="Where to store CSV files")
-parser.add_argument("--db", type=str, default="arcterx", help="Which Postgresql DB to use")
-parser.add_argument("--force", action="store_true", help="Rebuild the CSV file from scratch")
-grp = parser.add_mutually_exclusive_group()
-grp.add_argument("--refetch", action="store_true", help="Rebuild the DB from a full fetch")
-grp.add_argument("--nofetch", action="store_true", help="Do not actually fetch fresh data")
-args = parser.parse_args()
-
-if args.logfile: args.logfile = os.path.abspath(os.path.expanduser(args.logfile))
-
-Logger.mkLogger(args, fmt="%(asctime)s %(levelname)s: %(message)s")
-
-args.csv = os.path.abspath(os.path.expanduser(args.csv))
-args.credentials = os.path.abspath(os.path.expanduser(args.credentials))
-
-if not os.path.isdir(args.csv):
-    logging.info("Creating %s", args.csv)
-    os.makedirs(args.csv, mode=0o755, exist_ok=True)
-
-(username, codigo) = getCredentials(args.credentials) # login credentials for ucsd
-
-with psycopg.connect(f"dbname={args.db}") as db: # Get the last time stored in the database
-    loadAndExecuteSQL(db, args.sql, "drifter")
-    fetchData(db, args)
-    updateCSV(db, args.csv, args.force)
+        if args.backfill and not args.nofetch:
+            backfill(db, args, (username, codigo))
+        else:
+            fetcher = HTTPFetch(args, (username, codigo))
+            fetchData(db, args, fetcher)
+            fetcher.close()
+        if not args.noCSV: updateCSV(db, args.csv, args.force)
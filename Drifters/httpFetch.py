@@ -0,0 +1,131 @@
+#
+# HTTP GETs for a slow and lossy link
+#
+# One session is kept for the life of the object, so the connection is reused.
+# gzip is asked for, connection failures and 429/5xx responses are retried with
+# an exponential backoff, and a transfer which dies part way through is resumed
+# with a Range request when the server allows it. The body is spooled, still
+# encoded, to a file and the digest of the decoded content is returned, so the
+# caller can skip a payload it has already seen before parsing it.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+import gzip
+import hashlib
+import logging
+import requests
+import time
+import urllib3
+from urllib3.util.retry import Retry
+
+class HTTPFetch:
+    def __init__(self, args:ArgumentParser, auth:tuple=None) -> None:
+        self.args = args
+        retry = Retry(total=args.retries, backoff_factor=args.backoff,
+                      status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=("GET",), respect_retry_after_header=True)
+        adapter = requests.adapters.HTTPAdapter(max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.auth = auth
+        self.session.headers["Accept-Encoding"] = "gzip"
+
+    @staticmethod
+    def addArgs(parser:ArgumentParser) -> None:
+        grp = parser.add_argument_group(description="HTTP fetch options")
+        grp.add_argument("--retries", type=int, default=5,
+                         help="Number of times to retry a request or resume a transfer")
+        grp.add_argument("--backoff", type=float, default=2,
+                         help="Exponential backoff factor in seconds between retries")
+        grp.add_argument("--timeout", type=float, default=60,
+                         help="Seconds to wait for a connection or the next bytes")
+        grp.add_argument("--chunkSize", type=int, default=65536,
+                         help="Bytes to read at a time")
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __validator(self, r:requests.Response) -> str:
+        return r.headers.get("ETag") or r.headers.get("Last-Modified")
+
+    def get(self, url:str, fp, etag:str=None, lastModified:str=None) -> dict:
+        """ GET url into the binary file fp
+
+        etag and lastModified are from an earlier fetch of the same url,
+        if the server says it has not changed since then, None is returned.
+        Otherwise a dict with the response's headers of interest, the number of
+        bytes transferred, if the body is gzipped, and the sha256 of the decoded body.
+        """
+        args = self.args
+        conditional = {}
+        if etag: conditional["If-None-Match"] = etag
+        if lastModified: conditional["If-Modified-Since"] = lastModified
+        headers = conditional
+
+        fp.seek(0)
+        fp.truncate()
+        info = None
+        nBytes = 0 # Bytes transferred, including any restarts
+        for attempt in range(args.retries + 1):
+            if attempt: time.sleep(args.backoff * 2 ** (attempt - 1))
+            qBody = False
+            try:
+                with self.session.get(url, headers=headers, stream=True,
+                                      timeout=args.timeout) as r:
+                    if r.status_code == 304: return None
+                    r.raise_for_status()
+                    if r.status_code == 206:
+                        logging.info("Resuming %s at %s bytes", url, fp.tell())
+                    else: # A full response, so start over
+                        fp.seek(0)
+                        fp.truncate()
+                        info = {
+                                "etag": r.headers.get("ETag"),
+                                "lastModified": r.headers.get("Last-Modified"),
+                                "gzip": r.headers.get("Content-Encoding", "").lower() == "gzip",
+                                "qRange": r.headers.get("Accept-Ranges", "").lower() == "bytes",
+                                "validator": self.__validator(r),
+                                }
+                    qBody = True
+                    for chunk in r.raw.stream(args.chunkSize, decode_content=False):
+                        fp.write(chunk)
+                        nBytes += len(chunk)
+                    break
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.Timeout,
+                    urllib3.exceptions.HTTPError) as e: # Raised by r.raw part way through
+                # The session has already retried failures before the body
+                if not qBody or attempt == args.retries: raise
+                logging.warning("Fetching %s after %s bytes, %s", url, fp.tell(), e)
+                headers = conditional
+                if info and info["qRange"] and info["validator"] and fp.tell():
+                    headers = {"Range": f"bytes={fp.tell()}-", "If-Range": info["validator"]}
+                else:
+                    info = None
+
+        fp.flush()
+        info["nBytes"] = nBytes
+        info["size"] = fp.tell()
+        info["digest"] = self.digest(fp, info["gzip"])
+        return info
+
+    def digest(self, fp, qGzip:bool) -> str:
+        """ sha256 of the decoded contents of fp """
+        h = hashlib.sha256()
+        fp.seek(0)
+        src = gzip.GzipFile(fileobj=fp, mode="rb") if qGzip else fp
+        while True:
+            chunk = src.read(self.args.chunkSize)
+            if not chunk: break
+            h.update(chunk)
+        fp.seek(0)
+        return h.hexdigest()
+
+    @staticmethod
+    def open(fp, info:dict):
+        """ A binary file like object of the decoded contents of fp """
+        fp.seek(0)
+        return gzip.GzipFile(fileobj=fp, mode="rb") if info["gzip"] else fp
@@ -0,0 +1,112 @@
+#
+# Run exporters when Postgresql says their tables have changed
+#
+# The tables' statement triggers pg_notify a channel, i.e. pos_updated, whenever they
+# are written to. This LISTENs on the registered exporters' channels and, once the
+# notifications have stopped for --exportDelay seconds, or --exportMaxDelay seconds
+# after the first one, calls the exporters of the channels which were notified.
+# While idle it waits on the connection's socket, so no queries are made.
+# Every exporter is run when (re)connecting, to catch up with anything missed.
+# An exporter which holds something back, i.e. a bucket which is still filling, returns
+# when it wants to run again, and its channel is exported then even without a
+# notification. Otherwise, unless --exportIdle is set, nothing is queried while idle.
+# An exporter which fails is logged and rolled back, and is retried on its next notification.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+from TPWUtils.Thread import Thread
+import logging
+import psycopg
+import time
+
+class ExportRunner(Thread):
+    def __init__(self, args:ArgumentParser, dbArg:str) -> None:
+        Thread.__init__(self, "EXPORT", args)
+        self.__dbArg = dbArg
+        self.__exporters = {} # channel -> [func(db)]
+        self.__due = {} # channel -> when an exporter asked to run again
+
+    @staticmethod
+    def addArgs(parser:ArgumentParser) -> None:
+        grp = parser.add_argument_group(description="Export runner options")
+        grp.add_argument("--exportDelay", type=float, default=2,
+                         help="Seconds without notifications before exporting")
+        grp.add_argument("--exportMaxDelay", type=float, default=30,
+                         help="Maximum seconds from the first notification to exporting")
+        grp.add_argument("--exportRetry", type=float, default=60,
+                         help="Seconds to wait before reconnecting to the database")
+        grp.add_argument("--exportIdle", type=float, default=0,
+                         help="Seconds without notifications before running every exporter,"
+                         + " 0 is never")
+
+    def register(self, channel:str, func) -> None:
+        """ Call func(db) after channel is notified, db is a connection not in autocommit
+
+        func may return when, in seconds since 1970, to call channel's exporters again
+        even if it has not been notified, or None.
+        """
+        self.__exporters.setdefault(channel, []).append(func)
+
+    def __wait(self, listener:psycopg.Connection) -> set:
+        """ Block until notified, then gather notifications until they stop """
+        args = self.args
+        now = time.time()
+        tDue = min(self.__due.values(), default=None)
+        tIdle = now + args.exportIdle if args.exportIdle else None
+        tWake = min((t for t in (tDue, tIdle) if t is not None), default=None)
+        channels = set()
+        for notify in listener.notifies(timeout=None if tWake is None else max(tWake - now, 0),
+                                        stop_after=1):
+            channels.add(notify.channel)
+        if not channels: # Timed out
+            if tDue is not None and tDue == tWake:
+                return {channel for (channel, t) in self.__due.items() if t <= tDue}
+            return set(self.__exporters) # Idle
+        t0 = time.time()
+        while True:
+            dt = min(args.exportDelay, t0 + args.exportMaxDelay - time.time())
+            if dt <= 0: break
+            qQuiet = True
+            for notify in listener.notifies(timeout=dt, stop_after=1):
+                channels.add(notify.channel)
+                qQuiet = False
+            if qQuiet: break
+        now = time.time()
+        return channels | {channel for (channel, t) in self.__due.items() if t <= now}
+
+    @staticmethod
+    def __export(db:psycopg.Connection, func) -> float:
+        """ Call func(db), an error only costs this export, except losing the connection """
+        try:
+            return func(db)
+        except psycopg.OperationalError:
+            raise
+        except Exception:
+            logging.exception("Exporting with %s", getattr(func, "__name__", func))
+            db.rollback() # Leave the connection usable for the other exporters
+            return None
+
+    def runIt(self) -> None:
+        args = self.args
+        while True:
+            try:
+                with psycopg.connect(self.__dbArg, autocommit=True) as listener, \
+                        psycopg.connect(self.__dbArg) as db:
+                    for channel in self.__exporters:
+                        listener.execute(f"LISTEN {channel};")
+                    channels = set(self.__exporters) # Catch up
+                    self.__due = {}
+                    while True:
+                        for channel in sorted(channels):
+                            logging.debug("Exporting for %s", channel)
+                            self.__due.pop(channel, None)
+                            for func in self.__exporters[channel]:
+                                t = self.__export(db, func)
+                                if t is not None:
+                                    self.__due[channel] = min(t, self.__due.get(channel, t))
+                        channels = self.__wait(listener)
+            except psycopg.OperationalError:
+                logging.exception("Lost the database connection, retrying in %s",
+                                  args.exportRetry)
+                time.sleep(args.exportRetry)
@@ -6,6 +6,7 @@
 
 import psycopg
 import logging
+from datetime import datetime, timezone, timedelta
 
 def beginTransaction(cur:psycopg.Cursor) -> None:
     cur.execute("BEGIN TRANSACTION;")
@@ -22,28 +23,72 @@ def qTableExists(cur:psycopg.Cursor, tbl:str, schema="public") -> bool:
     result = cur.fetchone()
     return result[0] if result else False
 
-def mkPosition(cur:psycopg.Cursor) -> str:
-    tbl = "position" # Two places, here and in the sql
-    sql = """
--------- 
-
--- single table for all the positions
+# The position table, either as a single table or partitioned by week
+#
+# Coordinates are fixed width floats, rather than NUMERIC, see compact for older tables.
 
+positionTable = """
 CREATE TABLE IF NOT EXISTS position (
   time TIMESTAMP WITH TIME ZONE NOT NULL,
   name TEXT NOT NULL,
   class TEXT NOT NULL,
-  latitude NUMERIC, CHECK(latitude >= -90 AND latitude <= 90),
-  longitude NUMERIC, CHECK(longitude >= -180 AND longitude <= 180),
-  qCSV boolean DEFAULT False,
-  qNC boolean DEFAULT False,
+  latitude DOUBLE PRECISION, CHECK(latitude >= -90 AND latitude <= 90),
+  longitude DOUBLE PRECISION, CHECK(longitude >= -180 AND longitude <= 180),
+  seq BIGSERIAL, -- Bumped on every insert or update, for exporting changes
   PRIMARY KEY(time, name, class)
 );
 
+ALTER TABLE position ADD COLUMN IF NOT EXISTS seq BIGSERIAL;
+
 CREATE INDEX IF NOT EXISTS  pos_class_name ON position (class, name);
 CREATE INDEX IF NOT EXISTS  pos_name ON position (name);
-CREATE INDEX IF NOT EXISTS  pos_qCSV ON position (qCSV);
-CREATE INDEX IF NOT EXISTS  pos_qNC ON position (qNC);
+CREATE INDEX IF NOT EXISTS  pos_seq ON position (seq);
+"""
+
+# Each week is its own table, so time range scans only touch the weeks involved,
+# and a small BRIN index replaces scanning a B-tree for time ranges.
+# Partitions are created by week_partitions, see mkWeekPartitions.
+# The name index includes time, so the latest fix of each name is an index lookup.
+
+positionWeekly = """
+CREATE TABLE IF NOT EXISTS position (
+  time TIMESTAMP WITH TIME ZONE NOT NULL,
+  name TEXT NOT NULL,
+  class TEXT NOT NULL,
+  latitude DOUBLE PRECISION, CHECK(latitude >= -90 AND latitude <= 90),
+  longitude DOUBLE PRECISION, CHECK(longitude >= -180 AND longitude <= 180),
+  seq BIGSERIAL, -- Bumped on every insert or update, for exporting changes
+  PRIMARY KEY(time, name, class)
+) PARTITION BY RANGE (time);
+
+-- Rows for a week without a partition, moved out by week_partitions
+CREATE TABLE IF NOT EXISTS position_default PARTITION OF position DEFAULT;
+
+CREATE INDEX IF NOT EXISTS  pos_time ON position USING BRIN (time);
+CREATE INDEX IF NOT EXISTS  pos_class_name ON position (class, name);
+CREATE INDEX IF NOT EXISTS  pos_name ON position (name, time);
+CREATE INDEX IF NOT EXISTS  pos_seq ON position (seq);
+"""
+
+positionTriggers = """
+DROP INDEX IF EXISTS pos_qCSV;
+DROP INDEX IF EXISTS pos_qNC;
+
+-- An updated row gets a new seq, so exporters pick up the change
+
+CREATE OR REPLACE FUNCTION pos_seq_func()
+  RETURNS TRIGGER AS $psql$
+BEGIN
+  NEW.seq := nextval(pg_get_serial_sequence('position', 'seq'));
+  RETURN NEW;
+end;
+$psql$
+LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER pos_seq BEFORE UPDATE
+  ON position
+  FOR EACH ROW
+    EXECUTE PROCEDURE pos_seq_func();
 
 -- Function sends a notification whenever position is updated
 
@@ -63,13 +108,79 @@ CREATE OR REPLACE TRIGGER pos_updated AFTER INSERT OR UPDATE
   FOR EACH STATEMENT
     EXECUTE PROCEDURE pos_updated_func();
 
+-- Keep latest_position up to date, see mkLatestPosition
+
+CREATE OR REPLACE FUNCTION pos_latest_func()
+  RETURNS TRIGGER AS $psql$
+BEGIN
+  PERFORM latest_position_merge(class, array_agg(name), array_agg(time),
+                                array_agg(latitude::DOUBLE PRECISION),
+                                array_agg(longitude::DOUBLE PRECISION), 10)
+    FROM (SELECT class, name, time, latitude, longitude,
+                 row_number() OVER (PARTITION BY class, name ORDER BY time DESC) AS k
+            FROM newrows WHERE latitude IS NOT NULL AND longitude IS NOT NULL) AS a
+    WHERE k <= 10 GROUP BY class;
+  RETURN NULL;
+end;
+$psql$
+LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER pos_latest_insert AFTER INSERT
+  ON position
+  REFERENCING NEW TABLE AS newrows
+  FOR EACH STATEMENT
+    EXECUTE PROCEDURE pos_latest_func();
+
+CREATE OR REPLACE TRIGGER pos_latest_update AFTER UPDATE
+  ON position
+  REFERENCING NEW TABLE AS newrows
+  FOR EACH STATEMENT
+    EXECUTE PROCEDURE pos_latest_func();
+
 --------
-    """
+"""
+
+def mkPosition(cur:psycopg.Cursor, qWeekly:bool=False) -> str:
+    tbl = "position" # Two places, here and in the sql
+    sql = (positionWeekly if qWeekly else positionTable) + positionTriggers
 
     cur.execute(sql)
 
     return tbl if cur.statusmessage == "CREATE TABLE" else None
 
+def qColumnExists(cur:psycopg.Cursor, tbl:str, column:str) -> bool:
+    sql = "SELECT EXISTS (SELECT FROM pg_attribute"
+    sql+= " WHERE attrelid=to_regclass(%s) AND attname=%s AND NOT attisdropped);"
+    cur.execute(sql, (tbl, column.lower()))
+    return cur.fetchone()[0]
+
+def compact(cur:psycopg.Cursor, tbl:str="position") -> bool:
+    """ Convert an older tbl's NUMERIC coordinates to DOUBLE PRECISION in place
+
+    The unused qCSV and qNC flags are dropped too, so run this after every exporter
+    has run at least once, and has its exportcursor row.
+    tbl, partitions and all, is rewritten, and writers and exporters wait for it.
+    Returns True if anything was changed.
+    """
+    sql = "SELECT attname FROM pg_attribute"
+    sql+= " WHERE attrelid=to_regclass(%s) AND NOT attisdropped"
+    sql+= " AND ((attname IN ('latitude','longitude') AND atttypid='NUMERIC'::REGTYPE)"
+    sql+= "  OR attname IN ('qcsv','qnc'));"
+    beginTransaction(cur)
+    cur.execute(sql, (tbl,))
+    names = [row[0] for row in cur.fetchall()]
+    if not names:
+        cur.connection.commit()
+        return False
+    logging.info("Compacting %s in %s", names, tbl)
+    sql = f"ALTER TABLE {tbl}"
+    sql+= ",".join(f" DROP COLUMN {name}" if name.startswith("q")
+                   else f" ALTER COLUMN {name} TYPE DOUBLE PRECISION" for name in names)
+    cur.execute(sql + ";")
+    cur.connection.commit()
+    cur.execute(f"ANALYZE {tbl};")
+    return True
+
 def mkFilePosition(cur:psycopg.Cursor) -> str:
     tbl = "fileposition" # Two places, here and the SQL
     sql = """
@@ -83,13 +194,304 @@ CREATE TABLE IF NOT EXISTS fileposition (
 
     return tbl if cur.statusmessage == "CREATE TABLE" else None
 
-def mkAll(db:str, user:str) -> None:
+def mkExportCursor(cur:psycopg.Cursor) -> str:
+    tbl = "exportcursor" # Two places, here and the SQL
+    sql = """
+CREATE TABLE IF NOT EXISTS exportcursor ( -- How far each exporter has gotten
+	name TEXT PRIMARY KEY,
+	seq BIGINT, -- Last seq exported
+	t TIMESTAMP WITH TIME ZONE -- When it was exported
+);
+    """
+
+    cur.execute(sql)
+
+    return tbl if cur.statusmessage == "CREATE TABLE" else None
+
+# The latest fixes of every asset, for maps
+#
+# Rather than DISTINCT ON over all of drifter and position, the statement triggers on
+# them merge the fixes each statement writes into latest_position, which keeps the last
+# few fixes of each asset, newest first, and the speed and heading between the last two.
+# A notification is sent on latest_position, with the class as the payload, when it changes.
+
+def mkLatestPosition(cur:psycopg.Cursor) -> str:
+    tbl = "latest_position" # Two places, here and the SQL
+    qCreated = not qTableExists(cur, tbl) # statusmessage is CREATE TABLE even if it exists
+    sql = """
+CREATE TABLE IF NOT EXISTS latest_position ( -- Latest fixes of each asset
+  class TEXT NOT NULL, -- position's class, or drifter
+  name TEXT NOT NULL, -- position's name, or drifter's id
+  time TIMESTAMP WITH TIME ZONE NOT NULL, -- Latest fix
+  latitude DOUBLE PRECISION NOT NULL,
+  longitude DOUBLE PRECISION NOT NULL,
+  speed DOUBLE PRECISION, -- m/s from the previous fix
+  heading DOUBLE PRECISION, -- degrees true from the previous fix
+  times TIMESTAMP WITH TIME ZONE[], -- Recent fixes, newest first, including the latest
+  lats DOUBLE PRECISION[],
+  lons DOUBLE PRECISION[],
+  updated TIMESTAMP WITH TIME ZONE,
+  PRIMARY KEY(class, name)
+);
+    """
+
+    cur.execute(sql)
+
+    sql = """
+-- Merge fixes, the aName[i] at aTime[i] was at aLat[i] aLon[i], keeping depth of them
+
+CREATE OR REPLACE FUNCTION latest_position_merge(cls TEXT, aName TEXT[],
+    aTime TIMESTAMP WITH TIME ZONE[], aLat DOUBLE PRECISION[], aLon DOUBLE PRECISION[],
+    depth INTEGER)
+  RETURNS INTEGER AS $psql$
+DECLARE
+  n INTEGER;
+BEGIN
+  -- Concurrent writers would each merge into a history without the other's fixes
+  PERFORM pg_advisory_xact_lock(hashtext('latest_position ' || cls));
+  WITH fix AS (
+    SELECT * FROM unnest(aName, aTime, aLat, aLon) AS f(name, time, lat, lon)
+  ), history AS ( -- A new fix replaces an old one at the same time
+    SELECT DISTINCT ON (name, time) name, time, lat, lon FROM (
+      SELECT name, time, lat, lon, 0 AS pri FROM fix
+      UNION ALL
+      SELECT l.name, h.time, h.lat, h.lon, 1 FROM latest_position AS l
+        CROSS JOIN LATERAL unnest(l.times, l.lats, l.lons) AS h(time, lat, lon)
+        WHERE l.class=cls AND l.name IN (SELECT name FROM fix)
+    ) AS a ORDER BY name, time, pri
+  ), recent AS (
+    SELECT name, array_agg(time ORDER BY time DESC) AS times,
+           array_agg(lat ORDER BY time DESC) AS lats,
+           array_agg(lon ORDER BY time DESC) AS lons
+      FROM (SELECT *, row_number() OVER (PARTITION BY name ORDER BY time DESC) AS k
+              FROM history) AS b
+      WHERE k <= depth GROUP BY name
+  ), legs AS ( -- Great circle distance and initial bearing from the previous fix
+    SELECT recent.*,
+           2 * 6371008.8 * asin(sqrt(sin((p1 - p0) / 2)^2
+                                     + cos(p0) * cos(p1) * sin((l1 - l0) / 2)^2)) AS dist,
+           degrees(atan2(sin(l1 - l0) * cos(p1),
+                         cos(p0) * sin(p1) - sin(p0) * cos(p1) * cos(l1 - l0))) AS bearing
+      FROM recent CROSS JOIN LATERAL (
+        SELECT radians(lats[2]) AS p0, radians(lons[2]) AS l0,
+               radians(lats[1]) AS p1, radians(lons[1]) AS l1) AS r
+  )
+  INSERT INTO latest_position AS l
+    (class,name,time,latitude,longitude,speed,heading,times,lats,lons,updated)
+    SELECT cls, name, times[1], lats[1], lons[1],
+           dist / extract(epoch FROM times[1] - times[2]),
+           CASE WHEN dist > 0 THEN bearing + CASE WHEN bearing < 0 THEN 360 ELSE 0 END END,
+           times, lats, lons, CURRENT_TIMESTAMP
+      FROM legs
+  ON CONFLICT (class, name) DO UPDATE SET
+    time=excluded.time, latitude=excluded.latitude, longitude=excluded.longitude,
+    speed=excluded.speed, heading=excluded.heading,
+    times=excluded.times, lats=excluded.lats, lons=excluded.lons, updated=excluded.updated
+    WHERE (l.times, l.lats, l.lons) IS DISTINCT FROM (excluded.times, excluded.lats, excluded.lons);
+  GET DIAGNOSTICS n = ROW_COUNT;
+  IF n > 0 THEN
+    PERFORM pg_notify('latest_position', cls);
+  END IF;
+  RETURN n;
+end;
+$psql$
+LANGUAGE plpgsql;
+    """
+
+    cur.execute(sql)
+
+    if qCreated: # Fill it from what is already there
+        sources = {
+                "position": "SELECT class, name, time, latitude::DOUBLE PRECISION,"
+                    + " longitude::DOUBLE PRECISION FROM position",
+                "drifter": "SELECT 'drifter', id, t, lat, lon FROM drifter",
+                }
+        for (src, query) in sources.items():
+            if not qTableExists(cur, src): continue
+            sql = "SELECT latest_position_merge(class, array_agg(name), array_agg(time),"
+            sql+= " array_agg(lat), array_agg(lon), 10)"
+            sql+= " FROM (SELECT *,"
+            sql+= "  row_number() OVER (PARTITION BY class, name ORDER BY time DESC) AS k"
+            sql+=f"  FROM ({query}) AS s(class, name, time, lat, lon)"
+            sql+= "  WHERE lat IS NOT NULL AND lon IS NOT NULL) AS a"
+            sql+= " WHERE k <= 10 GROUP BY class;"
+            cur.execute(sql)
+            logging.info("Filled latest_position from %s", src)
+
+    return tbl if qCreated else None
+
+# Exporting rows by seq
+#
+# A table being exported has a seq BIGSERIAL column, which gets a new value whenever
+# a row is inserted or updated, and each exporter keeps the last seq it has exported
+# in exportcursor. Sequence values are handed out before the transaction commits,
+# so writers hold a shared advisory lock on the table while writing, and an exporter
+# briefly takes it exclusively to find a maximum seq with nothing below it in flight.
+
+def lockShared(cur:psycopg.Cursor, tbl:str) -> None:
+    """ Call inside a writer's transaction before inserting into or updating tbl """
+    cur.execute("SELECT pg_advisory_xact_lock_shared(hashtext(%s));", (tbl,))
+
+def exportRange(cur:psycopg.Cursor, name:str, tbl:str, flag:str=None) -> tuple:
+    """ (after, upto, where) for exporter name of tbl
+
+    Rows with after < seq <= upto are to be exported. where is "" or, the first time
+    name is used, " AND NOT flag" to carry on from the old boolean row flag, if tbl
+    still has it.
+    Call outside of any other transaction. The export's transaction is left open with
+    name's cursor locked, so another exporter of name waits for it, and is ended by
+    the caller, with setCursor and a commit, or with a rollback.
+    """
+    beginTransaction(cur)
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (tbl,))
+    cur.execute(f"SELECT max(seq) FROM {tbl};")
+    upto = cur.fetchone()[0]
+    cur.connection.commit()
+    beginTransaction(cur)
+    cur.execute("INSERT INTO exportcursor (name) VALUES (%s) ON CONFLICT DO NOTHING;", (name,))
+    cur.execute("SELECT seq FROM exportcursor WHERE name=%s FOR UPDATE;", (name,))
+    seq = cur.fetchone()[0]
+    if seq is None:
+        qFlag = flag and qColumnExists(cur, tbl, flag) # compact drops them
+        return (0, upto, f" AND NOT {flag}" if qFlag else "")
+    return (seq, upto, "")
+
+def setCursor(cur:psycopg.Cursor, name:str, seq:int) -> None:
+    """ Advance exporter name's cursor to seq, in the caller's transaction """
+    sql = "INSERT INTO exportcursor (name,seq,t) VALUES(%s,%s,CURRENT_TIMESTAMP)"
+    sql+= " ON CONFLICT (name) DO UPDATE SET seq=excluded.seq,t=excluded.t;"
+    cur.execute(sql, (name, seq))
+
+# Weekly partitions
+#
+# Postgresql does not create partitions by itself, so writers call ensurePartitions
+# with the time range they are about to write, which is cheap once the weeks exist.
+# Anything written to a week without a partition goes into tbl_default, and is moved
+# into the week's partition when it is created.
+
+def mkWeekPartitions(cur:psycopg.Cursor) -> None:
+    sql = """
+CREATE OR REPLACE FUNCTION week_partitions(parent TEXT, t0 TIMESTAMPTZ, t1 TIMESTAMPTZ)
+  RETURNS INTEGER AS $psql$
+DECLARE
+  key TEXT;
+  wk TIMESTAMPTZ;
+  part TEXT;
+  n INTEGER := 0;
+BEGIN
+  SELECT a.attname INTO key FROM pg_partitioned_table AS p
+    JOIN pg_attribute AS a ON a.attrelid=p.partrelid AND a.attnum=p.partattrs[0]
+    WHERE p.partrelid=to_regclass(parent);
+  IF key IS NULL THEN RETURN 0; END IF; -- Not partitioned
+  wk := date_trunc('week', t0 AT TIME ZONE 'UTC') AT TIME ZONE 'UTC';
+  WHILE wk <= t1 LOOP
+    part := parent || '_' || to_char(wk AT TIME ZONE 'UTC', 'YYYYMMDD');
+    IF to_regclass(part) IS NULL THEN
+      PERFORM pg_advisory_xact_lock(hashtext('partition ' || parent)); -- One creator at a time
+      IF to_regclass(part) IS NULL THEN
+        EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                       part, parent);
+        IF to_regclass(parent || '_default') IS NOT NULL THEN
+          EXECUTE format('WITH moved AS (DELETE FROM %I WHERE %I>=$1 AND %I<$2 RETURNING *)'
+                         ' INSERT INTO %I SELECT * FROM moved',
+                         parent || '_default', key, key, part)
+            USING wk, wk + INTERVAL '1 week';
+        END IF;
+        EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                       parent, part, wk, wk + INTERVAL '1 week');
+        n := n + 1;
+      END IF;
+    END IF;
+    wk := wk + INTERVAL '1 week';
+  END LOOP;
+  RETURN n;
+END;
+$psql$
+LANGUAGE plpgsql;
+    """
+    cur.execute(sql)
+
+def ensurePartitions(cur:psycopg.Cursor, tbl:str, t0:datetime, t1:datetime) -> int:
+    """ Create tbl's missing weekly partitions for [t0, t1], does nothing if not partitioned
+
+    Returns the number of partitions created.
+    """
+    cur.execute("SELECT week_partitions(%s,%s,%s);", (tbl, t0, t1))
+    return cur.fetchone()[0]
+
+def qPartitioned(cur:psycopg.Cursor, tbl:str) -> bool:
+    sql = "SELECT EXISTS (SELECT FROM pg_partitioned_table WHERE partrelid=to_regclass(%s));"
+    cur.execute(sql, (tbl,))
+    return cur.fetchone()[0]
+
+def partition(cur:psycopg.Cursor, tbl:str, sql:str, key:str, weeksAhead:int=4) -> None:
+    """ Make tbl partitioned by week on key using sql, migrating an unpartitioned tbl
+
+    The old table and its indices are renamed with an _unpartitioned suffix, and left
+    for the caller to drop. Rows keep their seq, so export cursors stay valid.
+    Writers and exporters wait while the rows are copied.
+    """
+    old = tbl + "_unpartitioned"
+    beginTransaction(cur)
+    mkWeekPartitions(cur)
+    qMigrate = qTableExists(cur, tbl) and not qPartitioned(cur, tbl)
+    if qMigrate:
+        logging.info("Migrating %s to %s", tbl, old)
+        cur.execute(f"LOCK TABLE {tbl} IN ACCESS EXCLUSIVE MODE;")
+        cur.execute("SELECT pg_get_serial_sequence(%s,'seq');", (tbl,))
+        seqName = cur.fetchone()[0]
+        cur.execute(f"ALTER TABLE {tbl} RENAME TO {old};")
+        cur.execute("SELECT indexname FROM pg_indexes WHERE tablename=%s;", (old,))
+        for (name,) in cur.fetchall():
+            cur.execute(f"ALTER INDEX {name} RENAME TO {name}_unpartitioned;")
+        if seqName: cur.execute(f"ALTER SEQUENCE {seqName} RENAME TO {old}_seq_seq;")
+
+    cur.execute(sql)
+
+    if qMigrate:
+        sql = "SELECT attname FROM pg_attribute"
+        sql+= " WHERE attrelid=to_regclass(%s) AND attnum>0 AND NOT attisdropped"
+        sql+= " AND attname IN (SELECT attname FROM pg_attribute"
+        sql+= "  WHERE attrelid=to_regclass(%s) AND attnum>0 AND NOT attisdropped)"
+        sql+= " ORDER BY attnum;"
+        cur.execute(sql, (old, tbl))
+        names = ",".join(row[0] for row in cur.fetchall())
+        cur.execute(f"SELECT min({key}),max({key}) FROM {old};")
+        n = ensurePartitions(cur, tbl, *cur.fetchone())
+        cur.execute(f"INSERT INTO {tbl} ({names}) SELECT {names} FROM {old};")
+        logging.info("Copied %s rows into %s partitions of %s", cur.rowcount, n, tbl)
+        cur.execute(f"SELECT setval(pg_get_serial_sequence(%s,'seq'), max(seq)) FROM {old}"
+                    + " HAVING max(seq) IS NOT NULL;", (tbl,))
+
+    now = datetime.now(tz=timezone.utc)
+    ensurePartitions(cur, tbl, now - timedelta(weeks=1), now + timedelta(weeks=weeksAhead))
+    cur.connection.commit()
+    if qMigrate: cur.execute(f"ANALYZE {tbl};")
+
+def mkDrifter(cur:psycopg.Cursor, fn:str) -> None:
+    """ Create drifter and its tables with the SQL in fn, or bring existing ones up to date
+
+    Every statement in fn is idempotent, so this is run each time a drifter writer starts,
+    unlike loadAndExecuteSQL, which does nothing once its table exists, and so would
+    never add seq, its index, or the triggers to a deployed drifter.
+    The caller commits.
+    """
+    mkLatestPosition(cur) # latest_position_merge for the triggers
+    with open(fn, "r") as fp: sql = fp.read()
+    cur.execute(sql)
+
+def mkAll(db:str, user:str, qWeekly:bool=False, weeksAhead:int=4) -> None:
     dbArg = f"dbname={db} user={user}"
 
     with psycopg.connect(dbArg, autocommit=True) as conn:
         with conn.cursor() as cur:
+            mkWeekPartitions(cur)
+            mkLatestPosition(cur)
+            if qWeekly: partition(cur, "position", positionWeekly + positionTriggers, "time",
+                                weeksAhead)
             mkPosition(cur)
             mkFilePosition(cur)
+            mkExportCursor(cur)
 
 if __name__ == "__main__":
     from argparse import ArgumentParser
@@ -97,7 +499,22 @@ if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("--db", type=str, default="arcterx", help="Database to work with")
     parser.add_argument("--user", type=str, default="pat", help="Database user to work with")
+    parser.add_argument("--weekly", action="store_true",
+                        help="Partition position by week, migrating an existing table")
+    parser.add_argument("--drifter", type=str,
+                        help="Partition drifter by week with this SQL, i.e. drifterWeekly.sql")
+    parser.add_argument("--weeksAhead", type=int, default=4,
+                        help="Number of weeks of partitions to create ahead of now")
+    parser.add_argument("--compact", action="store_true",
+                        help="Convert position's NUMERIC coordinates, rewriting the table")
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.DEBUG)
-    mkAll(args.db, args.user)
+    mkAll(args.db, args.user, args.weekly, args.weeksAhead)
+    if args.compact:
+        with psycopg.connect(f"dbname={args.db} user={args.user}", autocommit=True) as conn:
+            compact(conn.cursor())
+    if args.drifter:
+        with open(args.drifter, "r") as fp: sql = fp.read()
+        with psycopg.connect(f"dbname={args.db} user={args.user}", autocommit=True) as conn:
+            partition(conn.cursor(), "drifter", sql, "t", args.weeksAhead)
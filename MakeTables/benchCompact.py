@@ -0,0 +1,120 @@
+#! /usr/bin/env python3
+#
+# Benchmark position with DOUBLE PRECISION coordinates against the older NUMERIC ones
+#
+# position is filled with --names assets reporting every --dt seconds for --days,
+# first with the older NUMERIC definition, whose exports are timed before and after
+# compact converts it in place, then again from scratch with the current definition.
+# This drops and creates position in --db, so use a scratch database, which is
+# created if need be.
+#
+#  benchCompact.py --db=compactScratch --names=40 --dt=10 --days=42
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+import MakeTables as mktbl
+import logging
+import psycopg
+import statistics
+import time
+
+# What mkPosition used to create
+positionNumeric = mktbl.positionTable \
+        .replace("latitude DOUBLE PRECISION,", "latitude NUMERIC,") \
+        .replace("longitude DOUBLE PRECISION,", "longitude NUMERIC,") \
+        .replace("  seq BIGSERIAL,", "  qCSV boolean DEFAULT False,\n  qNC boolean DEFAULT False,\n"
+                 + "  seq BIGSERIAL,")
+
+queries = { # What the exporters run, for everything in the table
+        "csv minute": "SELECT date_trunc('minute', time) AS t,avg(latitude),avg(longitude)"
+            + " FROM position WHERE name='asset1' AND seq>0 GROUP BY t ORDER BY t;",
+        "nc second": "COPY (SELECT extract(epoch FROM date_trunc('second', time)) AS t,"
+            + " avg(latitude)::DOUBLE PRECISION,avg(longitude)::DOUBLE PRECISION"
+            + " FROM position WHERE name='asset1' AND seq>0 GROUP BY t ORDER BY t)"
+            + " TO STDOUT (FORMAT binary);",
+        "all hourly": "SELECT name,date_trunc('hour', time) AS t,avg(latitude),avg(longitude)"
+            + " FROM position GROUP BY name,t ORDER BY name,t;",
+        "copy all": "COPY (SELECT time,name,latitude,longitude FROM position ORDER BY seq)"
+            + " TO STDOUT (FORMAT csv);",
+        }
+
+def fill(cur, args:ArgumentParser, sql:str) -> tuple:
+    """ (rows, seconds) to insert the fixes into a new position created with sql """
+    cur.execute("DROP TABLE IF EXISTS position CASCADE;")
+    cur.execute(sql + mktbl.positionTriggers)
+    sql = "INSERT INTO position (time,name,class,latitude,longitude)"
+    sql+= " SELECT t,'asset' || i,'drifter',"
+    sql+= " round((18 + i/10.0 + 0.01*sin(extract(epoch FROM t)/86400))::NUMERIC,6),"
+    sql+= " round((134 + i/10.0 + 0.01*cos(extract(epoch FROM t)/86400))::NUMERIC,6)"
+    sql+= " FROM generate_series(now()-%s*INTERVAL '1 day',now(),%s*INTERVAL '1 second') AS t"
+    sql+= " CROSS JOIN generate_series(1,%s) AS i"
+    sql+= " ORDER BY t,i;" # In the order they would arrive
+    stime = time.time()
+    cur.execute(sql, (args.days, args.dt, args.names))
+    dt = time.time() - stime
+    n = cur.rowcount
+    cur.execute("VACUUM ANALYZE position;")
+    return (n, dt)
+
+def size(cur) -> float:
+    cur.execute("SELECT pg_table_size('position')/2^20;")
+    return cur.fetchone()[0]
+
+def run(cur, args:ArgumentParser) -> dict:
+    """ Median seconds of each query, after a warmup """
+    results = {}
+    for (name, sql) in queries.items():
+        dt = []
+        for i in range(args.repeat + 1):
+            stime = time.time()
+            if sql.startswith("COPY"):
+                with cur.copy(sql) as copy:
+                    for block in copy: pass
+            else:
+                cur.execute(sql)
+                cur.fetchall()
+            dt.append(time.time() - stime)
+        results[name] = statistics.median(dt[1:])
+    return results
+
+parser = ArgumentParser()
+parser.add_argument("--db", type=str, default="compactScratch",
+                    help="Scratch Postgresql DB to use, NOT the live one")
+parser.add_argument("--names", type=int, default=40, help="Number of assets")
+parser.add_argument("--dt", type=float, default=10, help="Seconds between fixes")
+parser.add_argument("--days", type=float, default=42, help="Days of fixes")
+parser.add_argument("--repeat", type=int, default=3, help="Number of times to time each query")
+parser.add_argument("--verbose", action="store_true", help="Log what compact does")
+args = parser.parse_args()
+
+logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                    format="%(asctime)s %(levelname)s: %(message)s")
+
+with psycopg.connect("dbname=postgres", autocommit=True) as db:
+    cur = db.cursor()
+    cur.execute("SELECT 1 FROM pg_database WHERE datname=%s;", (args.db,))
+    if not cur.fetchone(): cur.execute(f'CREATE DATABASE "{args.db}";')
+
+with psycopg.connect(f"dbname={args.db}", autocommit=True) as db:
+    cur = db.cursor()
+    mktbl.mkLatestPosition(cur) # For positionTriggers
+    results = {}
+
+    (n, dt) = fill(cur, args, positionNumeric)
+    print(f"numeric   inserted {n} rows in {dt:.1f}s ({n/dt:.0f}/s), table {size(cur):.0f} MB")
+    results["numeric"] = run(cur, args)
+
+    stime = time.time()
+    mktbl.compact(cur)
+    cur.execute("VACUUM ANALYZE position;")
+    print(f"compacted in {time.time() - stime:.1f}s, table {size(cur):.0f} MB")
+    results["compacted"] = run(cur, args)
+
+    (n, dt) = fill(cur, args, mktbl.positionTable)
+    print(f"double    inserted {n} rows in {dt:.1f}s ({n/dt:.0f}/s), table {size(cur):.0f} MB")
+    results["double"] = run(cur, args)
+
+    print(f"{'query':12s}" + "".join(f" {name:>10s}" for name in results))
+    for query in queries:
+        print(f"{query:12s}" + "".join(f" {results[name][query]:9.3f}s" for name in results))
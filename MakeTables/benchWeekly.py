@@ -0,0 +1,121 @@
+#! /usr/bin/env python3
+#
+# Benchmark the weekly partitioned position table against the single table
+#
+# A single position table is filled with --names assets reporting every --dt seconds
+# for --days, ending now, then queried, migrated with partition, and queried again.
+# This drops and creates position in --db, so use a scratch database, which is
+# created if need be.
+#
+#  benchWeekly.py --db=partScratch --names=40 --dt=10 --days=60
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+import MakeTables as mktbl
+import logging
+import psycopg
+import statistics
+import time
+
+queries = { # Exporter and dashboard style queries
+        "last hour": "SELECT name,count(*),avg(latitude),avg(longitude) FROM position"
+            + " WHERE time>=%(t)s-INTERVAL '1 hour' GROUP BY name ORDER BY name;",
+        "one day": "SELECT name,count(*),avg(latitude),avg(longitude) FROM position"
+            + " WHERE time>=%(t)s-INTERVAL '30 days' AND time<%(t)s-INTERVAL '29 days'"
+            + " GROUP BY name ORDER BY name;",
+        "one name week": "SELECT date_trunc('minute',time) AS t,avg(latitude),avg(longitude)"
+            + " FROM position WHERE name='asset1' AND time>=%(t)s-INTERVAL '14 days'"
+            + " AND time<%(t)s-INTERVAL '7 days' GROUP BY t ORDER BY t;",
+        "latest distinct": "SELECT DISTINCT ON (name) name,time,latitude,longitude"
+            + " FROM position ORDER BY name,time DESC;",
+        "latest day": "SELECT DISTINCT ON (name) name,time,latitude,longitude"
+            + " FROM position WHERE time>=%(t)s-INTERVAL '1 day' ORDER BY name,time DESC;",
+        "latest lateral": "SELECT n.name,p.time,p.latitude,p.longitude"
+            + " FROM (SELECT 'asset' || i AS name FROM generate_series(1,%(n)s) AS i) AS n"
+            + " CROSS JOIN LATERAL (SELECT time,latitude,longitude FROM position"
+            + "  WHERE name=n.name ORDER BY time DESC LIMIT 1) AS p ORDER BY n.name;",
+        }
+
+def fill(cur, args:ArgumentParser) -> int:
+    cur.execute("DROP TABLE IF EXISTS position, position_unpartitioned CASCADE;")
+    cur.execute("DROP SEQUENCE IF EXISTS position_unpartitioned_seq_seq;")
+    mktbl.mkPosition(cur)
+    sql = "INSERT INTO position (time,name,class,latitude,longitude)"
+    sql+= " SELECT t,'asset' || i,'drifter',"
+    sql+= " round((18 + i/10.0 + 0.01*sin(extract(epoch FROM t)/86400))::NUMERIC,5),"
+    sql+= " round((134 + i/10.0 + 0.01*cos(extract(epoch FROM t)/86400))::NUMERIC,5)"
+    sql+= " FROM generate_series(now()-%s*INTERVAL '1 day',now(),%s*INTERVAL '1 second') AS t"
+    sql+= " CROSS JOIN generate_series(1,%s) AS i"
+    sql+= " ORDER BY t,i;" # In the order they would arrive
+    cur.execute(sql, (args.days, args.dt, args.names))
+    n = cur.rowcount
+    cur.execute("VACUUM ANALYZE position;")
+    cur.execute("SELECT max(time) FROM position;")
+    args.tEnd = cur.fetchone()[0] # Queries are relative to this, not the clock
+    return n
+
+def sizes(cur) -> tuple:
+    """ (table MB, index MB) of position and any partitions """
+    sql = "SELECT sum(pg_table_size(relid))/2^20,sum(pg_indexes_size(relid))/2^20"
+    sql+= " FROM (SELECT 'position'::REGCLASS AS relid"
+    sql+= "  UNION SELECT relid FROM pg_partition_tree('position')) AS r;"
+    cur.execute(sql)
+    return cur.fetchone()
+
+def run(cur, args:ArgumentParser) -> dict:
+    """ Median seconds and rows of each query, after a warmup """
+    results = {}
+    for (name, sql) in queries.items():
+        params = {"t": args.tEnd, "n": args.names}
+        cur.execute(sql, params)
+        dt = []
+        for i in range(args.repeat):
+            stime = time.time()
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+            dt.append(time.time() - stime)
+        results[name] = (statistics.median(dt), rows)
+    return results
+
+parser = ArgumentParser()
+parser.add_argument("--db", type=str, default="partScratch",
+                    help="Scratch Postgresql DB to use, NOT the live one")
+parser.add_argument("--names", type=int, default=40, help="Number of assets")
+parser.add_argument("--dt", type=float, default=10, help="Seconds between fixes")
+parser.add_argument("--days", type=float, default=60, help="Days of fixes")
+parser.add_argument("--repeat", type=int, default=5, help="Number of times to time each query")
+parser.add_argument("--verbose", action="store_true", help="Log what partition does")
+args = parser.parse_args()
+
+logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                    format="%(asctime)s %(levelname)s: %(message)s")
+
+with psycopg.connect("dbname=postgres", autocommit=True) as db:
+    cur = db.cursor()
+    cur.execute("SELECT 1 FROM pg_database WHERE datname=%s;", (args.db,))
+    if not cur.fetchone(): cur.execute(f'CREATE DATABASE "{args.db}";')
+
+with psycopg.connect(f"dbname={args.db}", autocommit=True) as db:
+    cur = db.cursor()
+    stime = time.time()
+    n = fill(cur, args)
+    print(f"Filled {n} rows in {time.time() - stime:.1f} seconds,",
+          "table {:.0f} MB indices {:.0f} MB".format(*sizes(cur)))
+    single = run(cur, args)
+
+    stime = time.time()
+    mktbl.partition(cur, "position", mktbl.positionWeekly + mktbl.positionTriggers, "time")
+    cur.execute("DROP TABLE position_unpartitioned;") # So both are timed with the same memory
+    cur.execute("VACUUM ANALYZE position;")
+    print(f"Migrated in {time.time() - stime:.1f} seconds,",
+          "table {:.0f} MB indices {:.0f} MB".format(*sizes(cur)))
+    weekly = run(cur, args)
+
+    print(f"{'query':16s} {'rows':>6s} {'single':>9s} {'weekly':>9s}")
+    for name in queries:
+        (dtSingle, rowsSingle) = single[name]
+        (dtWeekly, rowsWeekly) = weekly[name]
+        print(f"{name:16s} {len(rowsSingle):6d} {dtSingle:8.4f}s {dtWeekly:8.4f}s",
+              f"{dtSingle / max(dtWeekly, 1e-6):6.1f}x",
+              "" if rowsSingle == rowsWeekly else "MISMATCH")
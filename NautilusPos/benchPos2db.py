@@ -0,0 +1,100 @@
+#! /usr/bin/env python3
+#
+# Benchmark processFile's COPY and merge load against the old json.loads and row at a time
+#
+# A day of 1 Hz SPAFRM lines is written to --spafrm and loaded into temporary position and
+# fileposition tables, which shadow any real ones, so this is safe to run against the
+# live database.
+#
+#  benchPos2db.py --db=arcterx --hours=24
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from TailReader import TailReader
+import MakeTables as mktbl
+import json
+import logging
+import math
+import pos2db
+import psycopg
+import time
+
+def mkFile(fn:str, hours:float, dt:float) -> int:
+    t0 = time.time() - hours * 3600
+    n = int(hours * 3600 / dt)
+    with open(fn, "w") as fp:
+        for i in range(n):
+            t = t0 + i * dt
+            info = {"time": t,
+                    "latitude": round(18 + 0.1 * math.sin(i / 3600), 7),
+                    "longitude": round(134 + 0.1 * math.cos(i / 3600), 7),
+                    "altitude": 12.3, "heading": 271.4, "speed": 5.1,
+                    "fix": 4, "satellites": 17, "hdop": 0.7}
+            stamp = datetime.fromtimestamp(t, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+            fp.write(f"{stamp}\tSPAFRM\t{i}\t{json.dumps(info)}\n")
+    return n
+
+def mkTable(db) -> None:
+    db.execute("DROP TABLE IF EXISTS pg_temp.position;")
+    db.execute("DROP TABLE IF EXISTS pg_temp.fileposition;")
+    db.execute("CREATE TEMPORARY TABLE fileposition (filename TEXT PRIMARY KEY,"
+               + " position BIGINT NOT NULL);")
+    db.execute("CREATE TEMPORARY TABLE position (time TIMESTAMP WITH TIME ZONE NOT NULL,"
+               + " name TEXT NOT NULL, class TEXT NOT NULL,"
+               + " latitude DOUBLE PRECISION, CHECK(latitude >= -90 AND latitude <= 90),"
+               + " longitude DOUBLE PRECISION, CHECK(longitude >= -180 AND longitude <= 180),"
+               + " seq BIGSERIAL, PRIMARY KEY(time, name, class));")
+    mktbl.mkWeekPartitions(db.cursor())
+    db.commit()
+
+def rowByRow(fn:str, cur) -> bool:
+    """ What processFile used to do """
+    sql = "INSERT INTO position (time,name,class,latitude,longitude) VALUES (%s,%s,%s,%s,%s)"
+    sql+= " ON CONFLICT DO NOTHING;"
+    sql1 = "INSERT INTO fileposition (filename,position)"
+    sql1+= " VALUES (%s,%s)"
+    sql1+= " ON CONFLICT (filename) DO UPDATE SET position=EXCLUDED.position;"
+    mktbl.beginTransaction(cur)
+    rdr = TailReader(fn)
+    for lines in rdr.lines():
+        for line in lines:
+            fields = line.split("\t")
+            if len(fields) < 4: continue
+            info = json.loads(fields[3])
+            t = datetime.fromtimestamp(info["time"], tz=timezone.utc)
+            cur.execute(sql, (t, "nautilus", "ship", info["latitude"], info["longitude"]))
+    cur.execute(sql1, (fn, rdr.position))
+    cur.connection.commit()
+    return True
+
+def contents(db) -> list:
+    cur = db.cursor()
+    cur.execute("SELECT time,name,class,latitude,longitude FROM position ORDER BY time;")
+    return cur.fetchall()
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--db", type=str, default="arcterx", help="Postgresql DB to use")
+    parser.add_argument("--spafrm", type=str, default="/tmp/bench.SPAFRM",
+                        help="SPAFRM file to generate")
+    parser.add_argument("--hours", type=float, default=24, help="Hours of fixes")
+    parser.add_argument("--dt", type=float, default=1, help="Seconds between fixes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s: %(message)s")
+
+    n = mkFile(args.spafrm, args.hours, args.dt)
+
+    with psycopg.connect(f"dbname={args.db}") as db:
+        results = {}
+        for (name, func) in (("row", rowByRow), ("copy", pos2db.processFile)):
+            mkTable(db)
+            stime = time.time()
+            func(args.spafrm, db.cursor())
+            dt = time.time() - stime
+            results[name] = contents(db)
+            print(f"{name:4s} {n} lines {len(results[name])} rows {dt:.2f}s ({n/dt:.0f}/s)")
+
+        print("Identical" if results["row"] == results["copy"] else "MISMATCH")
@@ -2,58 +2,249 @@
 #
 # Extract the Nautilus' position information
 #
+# The SPAFRM files are tailed using inotify, while the CSV and NetCDF exports are run
+# by an ExportRunner shortly after position's pos_updated notification.
+#
 # Nov-2024, Pat Welch, pat@mousebrains.com
 
 from argparse import ArgumentParser
 import MakeTables as mktbl
+from TailReader import TailReader
+from ExportRunner import ExportRunner
 from TPWUtils import Logger
+from TPWUtils.Thread import Thread
 import logging
 import glob
-import os
+import fnmatch
 import json
+import math
+import os
+import re
 import psycopg
+import queue
 import time
 import numpy as np
 from netCDF4 import Dataset
 from cftime import date2num
 from datetime import datetime, timezone, timedelta
 
-def processFile(fn:str, cur) -> bool:
-    sql = "SELECT position FROM fileposition WHERE filename=%s;"
-    cur.execute(sql, (fn,))
-    prevPos = cur.fetchone()
-    if prevPos is not None and os.path.getsize(fn) == prevPos[0]: 
-        logging.info("No need to do anything for %s", fn)
-        return False
+# Only the top level time, latitude, and longitude are wanted from the JSON in the fourth
+# column, so they are picked out of the raw bytes rather than parsing the whole object.
+# Each must be a whole member, following { or , and followed by , or }, and objects
+# with nested objects, which may have keys of their own with the same names, are parsed.
+reFields = re.compile(rb'[{,]\s*"(time|latitude|longitude)"\s*:\s*'
+                      + rb'(null|-?[0-9.]+(?:[eE][-+]?[0-9]+)?)\s*(?=[,}])')
+fixKeys = (b"time", b"latitude", b"longitude")
+
+def parseFix(obj:bytes) -> tuple:
+    """ (time, latitude, longitude) from a JSON object with json, see extractFix """
+    try:
+        info = json.loads(obj)
+    except ValueError:
+        return None
+    if not isinstance(info, dict): return None
+    fix = []
+    for key in fixKeys:
+        val = info.get(str(key, "utf-8"))
+        if val is None or (isinstance(val, float) and not math.isfinite(val)):
+            fix.append(b"null")
+        elif isinstance(val, (int, float)) and not isinstance(val, bool):
+            fix.append(repr(float(val)).encode())
+        else:
+            return None
+    return tuple(fix)
+
+def extractFix(line:bytes) -> tuple:
+    """ (time, latitude, longitude) of a SPAFRM line as bytes, null if missing, or None """
+    fields = line.split(b"\t", 4)
+    if len(fields) < 4: return None
+    obj = fields[3]
+    matches = reFields.findall(obj) if obj.count(b"{") == 1 else []
+    info = dict(matches)
+    fix = tuple(info[key] for key in fixKeys) if len(matches) == 3 and len(info) == 3 \
+            else parseFix(obj)
+    return None if fix is None or fix[0] == b"null" else fix
+
+def extractFixes(block:bytes) -> bytes:
+    """ COPY lines, time\tlatitude\tlongitude, for the fixes in a block of SPAFRM lines """
+    rows = []
+    for line in block.splitlines():
+        fix = extractFix(line)
+        if fix is not None: rows.append(b"\t".join(fix))
+    return b"\n".join(rows) + b"\n" if rows else b""
 
-    logging.info("Processing %s prev %s %s", fn, prevPos, os.path.getsize(fn))
-    sql = "INSERT INTO position (time,name,latitude,longitude) VALUES (%s,%s,%s,%s)"
+def mergeByLine(cur, fn:str, pos:int, name:str, cls:str) -> tuple:
+    """ Insert the fixes in fn after pos one at a time, skipping the lines which fail
+
+    For when a bad value fails processFile's COPY and merge.
+    Returns (fixes, inserted, position)
+    """
+    sql = "INSERT INTO position (time,name,class,latitude,longitude)"
+    sql+= " VALUES (to_timestamp(%s),%s,%s,%s,%s)"
     sql+= " ON CONFLICT DO NOTHING;"
+    rdr = TailReader(fn, pos)
+    (cnt, nMerged) = (0, 0)
+    for block in rdr.blocks():
+        offset = rdr.position - len(block)
+        for line in block.splitlines(keepends=True):
+            start = offset
+            offset += len(line)
+            fix = extractFix(line)
+            if fix is None: continue
+            try:
+                (t, lat, lon) = (None if x == b"null" else float(x) for x in fix)
+                if (lat is not None and abs(lat) > 90) or (lon is not None and abs(lon) > 180):
+                    continue
+                cnt += 1
+                with cur.connection.transaction(): # Savepoint
+                    tFix = datetime.fromtimestamp(t, tz=timezone.utc)
+                    mktbl.ensurePartitions(cur, "position", tFix, tFix)
+                    cur.execute(sql, (t, name, cls, lat, lon))
+                    nMerged += cur.rowcount
+            except (psycopg.DataError, ValueError, OverflowError, OSError) as e:
+                logging.warning("Skipping the line at %s in %s, %s, %s", start, fn, line, e)
+    return (cnt, nMerged, rdr.position)
+
+def processFile(fn:str, cur, name:str="nautilus", cls:str="ship", pos:int=None) -> int:
+    """ COPY fixes appended to fn since the last pass into a staging table and merge them
+
+    The existing fix wins for a time, as does the first one in the file.
+    The file's offset is stored in the same transaction as the fixes.
+    pos is where the last pass stopped, if None it is looked up in fileposition.
+    Returns the new position.
+    """
+    if pos is None:
+        sql = "SELECT position FROM fileposition WHERE filename=%s;"
+        cur.execute(sql, (fn,))
+        prevPos = cur.fetchone()
+        pos = prevPos[0] if prevPos is not None else None
+    if pos is not None and os.path.getsize(fn) == pos:
+        logging.debug("No need to do anything for %s", fn)
+        return pos
+
+    logging.debug("Processing %s prev %s %s", fn, pos, os.path.getsize(fn))
+    sql0 = "CREATE TEMPORARY TABLE IF NOT EXISTS posStage ("
+    sql0+= "n BIGSERIAL, t DOUBLE PRECISION, lat DOUBLE PRECISION, lon DOUBLE PRECISION"
+    sql0+= ") ON COMMIT DELETE ROWS;"
     sql1 = "INSERT INTO fileposition (filename,position)"
     sql1+= " VALUES (%s,%s)"
     sql1+= " ON CONFLICT (filename) DO UPDATE SET position=EXCLUDED.position;"
+    sql2 = "INSERT INTO position (time,name,class,latitude,longitude)"
+    sql2+= " SELECT DISTINCT ON (t) to_timestamp(t),%s,%s,lat,lon FROM posStage"
+    sql2+= " WHERE NOT coalesce(abs(lat) > 90 OR abs(lon) > 180, FALSE)" # Not the whole batch
+    sql2+= " ORDER BY t,n"
+    sql2+= " ON CONFLICT DO NOTHING;"
     mktbl.beginTransaction(cur)
-    with open(fn, "r") as fp:
-        if prevPos is not None:
-            fp.seek(prevPos[0]);
-        for line in fp:
-            fields = line.split("\t")
-            if len(fields) < 4: continue
-            info = json.loads(fields[3])
-            t = datetime.fromtimestamp(info["time"], tz=timezone.utc)
-            cur.execute(sql, (t, "nautilus", info["latitude"], info["longitude"]))
-        cur.execute(sql1, (fn, fp.tell()))
+    mktbl.lockShared(cur, "position") # For exporters
+    cur.execute(sql0)
+    rdr = TailReader(fn, pos)
+    try:
+        with cur.connection.transaction(): # Savepoint, so a bad value only costs the fast path
+            with cur.copy("COPY posStage (t,lat,lon) FROM STDIN (NULL 'null')") as copy:
+                for block in rdr.blocks():
+                    copy.write(extractFixes(block))
+            cur.execute("SELECT count(*),to_timestamp(min(t)),to_timestamp(max(t))"
+                        + " FROM posStage;")
+            (cnt, tMin, tMax) = cur.fetchone()
+            nMerged = 0
+            if cnt: # The statement triggers notify the exporters, even for no rows
+                # Moves rows for a new week out of position_default, if partitioned
+                mktbl.ensurePartitions(cur, "position", tMin, tMax)
+                cur.execute(sql2, (name, cls))
+                nMerged = cur.rowcount
+        position = rdr.position
+    except psycopg.DataError:
+        logging.exception("Merging %s from %s, falling back to one line at a time", fn, pos)
+        (cnt, nMerged, position) = mergeByLine(cur, fn, pos, name, cls)
+    cur.execute(sql1, (fn, position))
     cur.connection.commit()
-    return True
+    logging.info("Merged %s of %s fixes from %s", nMerged, cnt, fn)
+    return position
+
+def newRange(cur, consumer:str, flag:str, spacing:str, name:str, tbl:str) -> tuple:
+    """ (sqlSel, params, seq, tNext) selecting the rows of name for consumer's next export
 
-def updateCSV(cur, fn:str, spacing:str="minute", name:str="nautilus", tbl:str="position") -> None:
-    sql = "WITH tpw AS ("
-    sql+=f"UPDATE {tbl} SET qCSV=True WHERE qCSV=False AND name=%s"
-    sql+= " RETURNING time,latitude,longitude)"
-    sql+= "SELECT date_trunc(%s, time) AS t, avg(latitude) AS lat, avg(longitude) AS lon"
-    sql+= " FROM tpw GROUP BY t ORDER BY t;"
+    The newest spacing bucket may still be filling, so it is held back until a later
+    one starts, otherwise frequent exports would write a bucket in pieces. It is
+    released once now() is past it. tNext is when, in seconds since 1970, a held back
+    bucket ends, so an export can be scheduled for then in case no more fixes arrive,
+    and None if nothing is held back.
+    The consumer's cursor should be set to seq, in the transaction left open,
+    once the rows have been saved. seq is None if there is nothing to export.
+    """
+    (after, upto, where) = mktbl.exportRange(cur, consumer, tbl, flag)
+    if upto is None or upto <= after:
+        cur.connection.rollback()
+        return (None, None, None, None)
 
-    cur.execute(sql, (name, spacing))
+    sqlSel = f" FROM {tbl} WHERE name=%s AND seq>%s AND seq<=%s" + where
+    # Seconds, by the database's clock, until the newest bucket ends, if it has not yet
+    sql = "SELECT date_trunc(%s, max(time)),"
+    sql+= " extract(epoch FROM date_trunc(%s, max(time)) - now()"
+    sql+= "  + CASE WHEN %s='quarter' THEN INTERVAL '3 months' ELSE ('1 ' || %s)::INTERVAL END)"
+    sql+= sqlSel
+    sql+= " HAVING date_trunc(%s, max(time))>=date_trunc(%s, now());"
+    cur.execute(sql, (spacing, spacing, spacing, spacing, name, after, upto, spacing, spacing))
+    row = cur.fetchone()
+    tNext = None
+    if row is not None:
+        (tHeld, dt) = row
+        tNext = time.time() + float(dt)
+        cur.execute("SELECT min(seq) - 1" + sqlSel + " AND time>=%s;", (name, after, upto, tHeld))
+        upto = cur.fetchone()[0]
+    if upto <= after:
+        cur.connection.rollback()
+        return (None, None, None, tNext)
+    return (sqlSel, (name, after, upto), upto, tNext)
+
+def newRows(cur, consumer:str, flag:str, spacing:str, name:str, tbl:str) -> tuple:
+    """ Rows of name added since consumer's last export, averaged over spacing
+
+    Returns (rows, seq, tNext), see newRange
+    """
+    (sqlSel, params, seq, tNext) = newRange(cur, consumer, flag, spacing, name, tbl)
+    if seq is None: return ([], None, tNext)
+
+    sql = "SELECT date_trunc(%s, time) AS t, avg(latitude) AS lat, avg(longitude) AS lon"
+    sql+= sqlSel
+    sql+= " AND latitude IS NOT NULL AND longitude IS NOT NULL" # Fixes without a position
+    sql+= " GROUP BY t ORDER BY t;"
+
+    cur.execute(sql, (spacing, *params))
+    return (cur.fetchall(), seq, tNext)
+
+# A binary COPY of three DOUBLE PRECISION columns is fixed width, so numpy can view it
+# directly, big endian, after the 19 byte header and before the 2 byte trailer.
+copyDType = np.dtype([("n", ">i2"),
+                      ("nt", ">i4"), ("t", ">f8"),
+                      ("nlat", ">i4"), ("lat", ">f8"),
+                      ("nlon", ">i4"), ("lon", ">f8")])
+
+def newArrays(cur, consumer:str, flag:str, spacing:str, name:str, tbl:str) -> tuple:
+    """ As newRows, but (t, lat, lon, seq, tNext), t, lat, and lon as numpy arrays,
+    t in seconds since 1970 """
+    (sqlSel, params, seq, tNext) = newRange(cur, consumer, flag, spacing, name, tbl)
+    if seq is None: return (None, None, None, None, tNext)
+
+    sql = "COPY (SELECT extract(epoch FROM date_trunc(%s, time))::DOUBLE PRECISION AS t,"
+    sql+= " coalesce(avg(latitude)::DOUBLE PRECISION, 'NaN') AS lat,"
+    sql+= " coalesce(avg(longitude)::DOUBLE PRECISION, 'NaN') AS lon"
+    sql+= sqlSel
+    sql+= " GROUP BY t ORDER BY t)"
+    sql+= " TO STDOUT (FORMAT binary)"
+
+    with cur.copy(sql, (spacing, *params)) as copy:
+        data = b"".join(copy)
+    n = (len(data) - 21) // copyDType.itemsize
+    rows = np.frombuffer(data, dtype=copyDType, count=n, offset=19)
+    return (rows["t"].astype(float), rows["lat"].astype(float), rows["lon"].astype(float),
+            seq, tNext)
+
+def updateCSV(cur, fn:str, spacing:str="minute", name:str="nautilus", tbl:str="position") -> float:
+    """ Append the new rows to fn, returns when to export again, see newRange's tNext """
+    consumer = f"csv {name} {fn}"
+    (rows, seq, tNext) = newRows(cur, consumer, "qCSV", spacing, name, tbl)
+    if seq is None: return tNext
 
     if not os.path.isfile(fn):
         dirCSV = os.path.dirname(fn)
@@ -64,29 +255,31 @@ def updateCSV(cur, fn:str, spacing:str="minute", name:str="nautilus", tbl:str="p
         with open(fn, "w") as fp:
             fp.write("time,lat,lon\n");
 
+    # Formatted before opening fn, so a failure does not leave part of the rows behind
+    lines = "".join(f"{t.timestamp():.0f},{lat:.6f},{lon:.6f}\n" for (t, lat, lon) in rows)
     with open(fn, "a") as fp:
-        for rec in cur:
-            (t, lat, lon) = rec
-            t = t.timestamp()
-            fp.write(f"{t:.0f},{lat:.6f},{lon:.6f}\n")
-
-def updateNetCDF(cur, fn:str, spacing:str="second", name="nautilus", tbl="position") -> None:
-    sql = "WITH tpw AS ("
-    sql+=f"UPDATE {tbl} SET qNC=True WHERE qNC=False AND name=%s"
-    sql+= " RETURNING time,latitude,longitude)"
-    sql+= "SELECT date_trunc(%s, time) AS t, avg(latitude) AS lat, avg(longitude) AS lon"
-    sql+= " FROM tpw GROUP BY t ORDER BY t;"
-
-    cur.execute(sql, (name, spacing))
-    rows = cur.fetchall()
-    if not rows: return
+        fp.write(lines)
+
+    mktbl.setCursor(cur, consumer, seq)
+    cur.connection.commit()
+    return tNext
+
+def updateNetCDF(cur, fn:str, spacing:str="second", name="nautilus", tbl="position") -> float:
+    """ Append the new rows to fn, returns when to export again, see newRange's tNext """
+    consumer = f"nc {name} {fn}"
+    (time, lat, lon, seq, tNext) = newArrays(cur, consumer, "qNC", spacing, name, tbl)
+    if seq is None: return tNext
+    if not time.size:
+        mktbl.setCursor(cur, consumer, seq)
+        cur.connection.commit()
+        return tNext
 
     dirNC = os.path.dirname(fn)
     if not os.path.isdir(dirNC):
         logging.info("Creating %s", dirNC)
         os.makedirs(dirNC, 0o755, exist_ok=True)
 
-    with Dataset(fn, "r+", format="NETCDF4") as nc:
+    with Dataset(fn, "r+" if os.path.exists(fn) else "w", format="NETCDF4") as nc:
         if "time" not in nc.dimensions:
             nc.createDimension("time", None)
         if "time" not in nc.variables: 
@@ -104,74 +297,165 @@ def updateNetCDF(cur, fn:str, spacing:str="second", name="nautilus", tbl="positi
             lonVar.units = "degrees_east" ;
             lonVar.standard_name = "longitude" ;
 
-        time = []
-        lat = []
-        lon = []
-        for row in rows:
-            time.append(row[0].timestamp())
-            lat.append(row[1])
-            lon.append(row[2])
+        n = len(nc.dimensions["time"])
+        if n: # Only append after what is there, so time stays monotonic
+            q = time > nc.variables["time"][n-1]
+            if not q.all():
+                logging.warning("Dropping %s rows not after the last time in %s",
+                                time.size - q.sum(), fn)
+                (time, lat, lon) = (time[q], lat[q], lon[q])
 
-        time = np.array(time).astype("datetime64[s]")
-        lat = np.array(lat).astype(float)
-        lon = np.array(lon).astype(float)
+        if time.size:
+            nc.variables["time"][n:n+time.size] = time
+            nc.variables["lat"][n:n+time.size] = lat
+            nc.variables["lon"][n:n+time.size] = lon
+            logging.info("Saved %s rows from %s to %s", time.size,
+                         datetime.fromtimestamp(time[0], tz=timezone.utc),
+                         datetime.fromtimestamp(time[-1], tz=timezone.utc))
 
-        n = len(nc.dimensions["time"])
-        nc.variables["time"][n:] = time
-        nc.variables["lat"][n:] = lat
-        nc.variables["lon"][n:] = lon
-        logging.info("Saved %s rows from %s to %s", time.shape[0], time[0], time[-1])
-
-parser = ArgumentParser()
-Logger.addArgs(parser)
-parser.add_argument("--srcGlob", type=str, default="*.SPAFRM",
-                    help="Glob pattern for position information")
-parser.add_argument("--srcDir", type=str,
-                    default="/nautilus/cruise/raw/datalog",
-                    help="Where Nautilus' position files are kept")
-parser.add_argument("--csv", type=str, default="~/Sync/Ship/ship/nautilus.csv",
-                    help="Where to save monotonically growing CSV files")
-parser.add_argument("--netcdf", type=str, default="~/Sync/Processed/ship/gps.nc",
-                    help="Where to save ship positions to")
-parser.add_argument("--db", type=str, default="arcterx", help="Database to work with")
-parser.add_argument("--user", type=str, default="pat", help="Database user to work with")
-parser.add_argument("--dt", type=float, default=10*60, help="Seconds between checking for new data")
-parser.add_argument("--spacingCSV", type=str, default="minute",
-                    choices=("microseconds", "milliseconds", "second", "minute", "hour",
-                             "day", "week", "month", "quarter", "year", "decade", "century",
-                             "millenium"),
-                    help="Spacing between CSV records")
-parser.add_argument("--spacingNC", type=str, default="second",
-                    choices=("microseconds", "milliseconds", "second", "minute", "hour",
-                             "day", "week", "month", "quarter", "year", "decade", "century",
-                             "millenium"),
-                    help="Spacing between NC records")
-args = parser.parse_args()
-
-args.srcDir = os.path.abspath(os.path.expanduser(args.srcDir))
-args.csv    = os.path.abspath(os.path.expanduser(args.csv))
-args.netcdf = os.path.abspath(os.path.expanduser(args.netcdf))
-
-srcPattern = os.path.join(args.srcDir, args.srcGlob)
-dbArg = f"dbname={args.db} user={args.user}"
-
-Logger.mkLogger(args)
-
-mktbl.mkAll(args.db, args.user)
-
-while True:
-    t0 = time.time()
-    with psycopg.connect(dbArg) as conn, conn.cursor() as cur:
-        for fn in sorted(glob.glob(srcPattern)):
-            processFile(fn, cur)
-        updateCSV(cur, args.csv, args.spacingCSV)
-        updateNetCDF(cur, args.netcdf, args.spacingNC)
-    now = time.time()
-    dt = max(t0 + args.dt - now, 10)
-    logging.info("Sleeping for %s", dt)
-    time.sleep(dt)
-
-try:
-    Thread.waitForException()
-except:
-    logging.exception("Unexpected exception")
+    mktbl.setCursor(cur, consumer, seq)
+    cur.connection.commit()
+    return tNext
+
+class Ingester(Thread):
+    """ Load new fixes from the SPAFRM files as they are written
+
+    inotify says which files changed, and only those are read, with the positions
+    kept in memory. All the files are rescanned every --dt seconds in case
+    something was missed, i.e. srcDir is a network mount.
+    """
+    def __init__(self, args:ArgumentParser, dbArg:str) -> None:
+        Thread.__init__(self, "INGEST", args)
+        self.__dbArg = dbArg
+
+    @staticmethod
+    def addArgs(parser:ArgumentParser) -> None:
+        grp = parser.add_argument_group(description="Ingest options")
+        grp.add_argument("--dt", type=float, default=10*60,
+                         help="Seconds between rescanning all the files")
+        grp.add_argument("--tailDelay", type=float, default=0.5,
+                         help="Seconds to gather inotify events before reading the files")
+        grp.add_argument("--noINotify", action="store_true",
+                         help="Only rescan the files every --dt seconds")
+
+    def __wait(self, q:queue.Queue, tScan:float) -> list:
+        """ Files changed, or None when it is time to rescan all of them """
+        args = self.args
+        dt = tScan + args.dt - time.time()
+        if q is None:
+            if dt > 0:
+                logging.info("Sleeping for %s", dt)
+                time.sleep(dt)
+            return None
+        files = set()
+        try:
+            (t0, fn) = q.get(timeout=max(dt, 0.01))
+            q.task_done()
+            files.add(fn)
+            tEnd = time.time() + args.tailDelay
+            while True:
+                dt = tEnd - time.time()
+                if dt <= 0: break
+                (t0, fn) = q.get(timeout=dt)
+                q.task_done()
+                files.add(fn)
+        except queue.Empty:
+            if not files: return None
+        return sorted(fn for fn in files if fnmatch.fnmatch(os.path.basename(fn), args.srcGlob))
+
+    def runIt(self) -> None:
+        args = self.args
+        srcPattern = os.path.join(args.srcDir, args.srcGlob)
+
+        q = None
+        if not args.noINotify:
+            import pyinotify
+            from TPWUtils.INotify import INotify
+            # The files are kept open and appended to, so IN_MODIFY is needed
+            i = INotify(args,
+                        pyinotify.IN_MODIFY | pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO)
+            i.start()
+            i.addTree(args.srcDir)
+            q = i.queue
+
+        positions = {} # Where the next unread byte is for each file
+        files = None # Rescan all the files
+        tScan = 0
+        db = None
+        while True:
+            try:
+                if db is None: db = psycopg.connect(self.__dbArg)
+                if files is None:
+                    files = sorted(glob.glob(srcPattern))
+                    tScan = time.time()
+                cur = db.cursor()
+                for fn in files:
+                    try:
+                        positions[fn] = processFile(fn, cur, pos=positions.get(fn))
+                    except (FileNotFoundError, psycopg.DataError):
+                        logging.exception("Processing %s from %s", fn, positions.get(fn))
+                        db.rollback()
+                        positions.pop(fn, None) # Reread from fileposition
+            except psycopg.OperationalError:
+                logging.exception("Lost the database connection, retrying in 10 seconds")
+                if db is not None: db.close()
+                db = None
+                positions = {} # Reread from fileposition
+                files = None
+                time.sleep(10)
+                continue
+            files = self.__wait(q, tScan)
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    Logger.addArgs(parser)
+    parser.add_argument("--srcGlob", type=str, default="*.SPAFRM",
+                        help="Glob pattern for position information")
+    parser.add_argument("--srcDir", type=str,
+                        default="/nautilus/cruise/raw/datalog",
+                        help="Where Nautilus' position files are kept")
+    parser.add_argument("--csv", type=str, default="~/Sync/Ship/ship/nautilus.csv",
+                        help="Where to save monotonically growing CSV files")
+    parser.add_argument("--netcdf", type=str, default="~/Sync/Processed/ship/gps.nc",
+                        help="Where to save ship positions to")
+    parser.add_argument("--db", type=str, default="arcterx", help="Database to work with")
+    parser.add_argument("--user", type=str, default="pat", help="Database user to work with")
+    parser.add_argument("--spacingCSV", type=str, default="minute",
+                        choices=("microseconds", "milliseconds", "second", "minute", "hour",
+                                 "day", "week", "month", "quarter", "year", "decade", "century",
+                                 "millenium"),
+                        help="Spacing between CSV records")
+    parser.add_argument("--spacingNC", type=str, default="second",
+                        choices=("microseconds", "milliseconds", "second", "minute", "hour",
+                                 "day", "week", "month", "quarter", "year", "decade", "century",
+                                 "millenium"),
+                        help="Spacing between NC records")
+    Ingester.addArgs(parser)
+    ExportRunner.addArgs(parser)
+    parser.set_defaults(exportDelay=1, exportMaxDelay=5) # Fixes arrive every second
+    args = parser.parse_args()
+
+    args.srcDir = os.path.abspath(os.path.expanduser(args.srcDir))
+    args.csv    = os.path.abspath(os.path.expanduser(args.csv))
+    args.netcdf = os.path.abspath(os.path.expanduser(args.netcdf))
+
+    dbArg = f"dbname={args.db} user={args.user}"
+
+    Logger.mkLogger(args)
+
+    mktbl.mkAll(args.db, args.user)
+
+    exporter = ExportRunner(args, dbArg)
+    exporter.register("pos_updated",
+                      lambda db: updateCSV(db.cursor(), args.csv, args.spacingCSV))
+    exporter.register("pos_updated",
+                      lambda db: updateNetCDF(db.cursor(), args.netcdf, args.spacingNC))
+    ingester = Ingester(args, dbArg)
+
+    exporter.start()
+    ingester.start()
+
+    try:
+        Thread.waitForException()
+    except:
+        logging.exception("Unexpected exception")
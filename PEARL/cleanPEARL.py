@@ -10,60 +10,205 @@ import os.path
 from TPWUtils.Thread import Thread
 from TPWUtils.INotify import INotify
 from TPWUtils import Logger
+from TailReader import TailReader
 import logging
+import hashlib
+import io
 import queue
 import time
 
 class Cleaner(Thread):
+    """ Keep dest a deduplicated and time sorted copy of src
+
+    src's offset, the cleaned rows, and a digest of dest are kept between events,
+    so only the lines appended to src are parsed. New rows which sort after the
+    last one in dest are appended. Otherwise the cleaned rows are resorted and
+    dest rewritten. src is only reread if it shrinks or is replaced.
+    A rewritten dest is replaced atomically, while appends are written in place,
+    and truncated back off if they fail, so an event costs the new rows' I/O.
+    A missing or empty src is treated as nothing to clean until it is written.
+    """
     def __init__(self, args:ArgumentParser, q:queue.Queue) -> None:
         Thread.__init__(self, "Cleaner", args)
         self.__queue = q
+        self.__rdr = None # TailReader for src
+        self.__header = None # src's header line
+        self.__dtypes = None # Column types from reading all of src
+        self.__tbl = None # Cleaned rows, sorted, with the unrounded keys
+        self.__seen = {} # (imei, long, lat) -> row written to dest
+        self.__digest = None # sha256 of dest as written
+        self.__destStat = None # (inode, size, mtime) of dest as written
+
+    @staticmethod
+    def __parse(data:bytes) -> pd.DataFrame:
+        tbl = pd.read_csv(io.BytesIO(data))
+        columns = list(tbl.columns)
+        tbl.rename(columns={columns[-1]: "temperature"}, inplace=True)
+        tbl["_long"] = tbl.long # Duplicates are found before rounding
+        tbl["_lat"] = tbl.lat
+        return tbl
+
+    @staticmethod
+    def __clean(tbl:pd.DataFrame) -> pd.DataFrame:
+        tbl = tbl.drop_duplicates(subset=("imei", "_long", "_lat"), keep="last", ignore_index=True)
+        tbl.lat = round(tbl.lat, 6)
+        tbl.long = round(tbl.long, 6)
+        return tbl.sort_values(["timestamp", "imei"], kind="stable", ignore_index=True)
+
+    @staticmethod
+    def __toCSV(tbl:pd.DataFrame, qHeader:bool=True) -> bytes:
+        return tbl.drop(columns=["_long", "_lat"]).to_csv(index=False, header=qHeader).encode()
+
+    @staticmethod
+    def __keys(tbl:pd.DataFrame) -> list:
+        return list(zip(tbl.imei, tbl._long, tbl._lat))
+
+    @staticmethod
+    def __rows(tbl:pd.DataFrame) -> list:
+        return list(tbl.drop(columns=["_long", "_lat"]).itertuples(index=False, name=None))
+
+    def __remember(self, tbl:pd.DataFrame) -> None:
+        self.__seen.update(zip(self.__keys(tbl), self.__rows(tbl)))
+
+    def __write(self, data:bytes, qAppend:bool=False) -> None:
+        """ Replace dest with data, or append data to dest """
+        dest = self.args.dest
+        if qAppend:
+            size = self.__destStat[1] # What we last wrote
+            fd = os.open(dest, os.O_WRONLY)
+            try:
+                n = os.pwrite(fd, data, size) # The whole block in one write
+                if n != len(data): raise OSError(f"Short write to {dest}, {n} of {len(data)}")
+                os.fsync(fd)
+            except:
+                os.ftruncate(fd, size) # No partial rows left behind
+                raise
+            finally:
+                os.close(fd)
+            self.__digest.update(data) # Only once it is on disk
+        else:
+            tmp = os.path.join(os.path.dirname(dest), "." + os.path.basename(dest) + ".tmp")
+            with open(tmp, "wb") as fp:
+                fp.write(data)
+                fp.flush()
+                os.fsync(fp.fileno())
+            os.replace(tmp, dest)
+            self.__digest = hashlib.sha256(data)
+        st = os.stat(dest)
+        self.__destStat = (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def __qDestChanged(self) -> bool:
+        """ Has something other than us changed dest? """
+        try:
+            st = os.stat(self.args.dest)
+        except FileNotFoundError:
+            return True
+        return self.__destStat != (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def __rewrite(self) -> None:
+        """ Write all the cleaned rows to dest, unless it already has them """
+        data = self.__toCSV(self.__tbl)
+        if self.__digest is None and os.path.isfile(self.args.dest): # Just started
+            self.__digest = hashlib.sha256()
+            with open(self.args.dest, "rb") as fp:
+                for block in iter(lambda: fp.read(1024 * 1024), b""):
+                    self.__digest.update(block)
+            st = os.stat(self.args.dest)
+            self.__destStat = (st.st_ino, st.st_size, st.st_mtime_ns)
+        if not self.__qDestChanged() and self.__digest.digest() == hashlib.sha256(data).digest():
+            logging.info("No need to update %s", self.args.dest)
+            return
+        self.__write(data)
+        logging.info("Wrote %s rows to %s", self.__tbl.shape[0], self.args.dest)
+
+    def __full(self) -> None:
+        """ Read and clean all of src """
+        args = self.args
+        self.__rdr = TailReader(args.src)
+        try:
+            data = b"".join(self.__rdr.blocks())
+        except FileNotFoundError:
+            data = b""
+        if not data: # Nothing to clean until src is written
+            logging.info("%s is missing or empty, waiting for it", args.src)
+            self.__rdr = None # So the next event rereads src
+            return
+        self.__header = data[:data.find(b"\n") + 1]
+        tbl = self.__parse(data)
+        logging.info("Read %s rows from %s", tbl.shape[0], args.src)
+        self.__dtypes = tbl.dtypes
+        self.__tbl = self.__clean(tbl)
+        logging.info("Cleaned to %s rows", self.__tbl.shape[0])
+        self.__seen = {}
+        self.__remember(self.__tbl)
+        self.__rewrite()
+
+    def __update(self) -> None:
+        """ Clean the rows appended to src since the last time """
+        args = self.args
+        rdr = self.__rdr
+        try:
+            st = os.stat(args.src)
+        except FileNotFoundError:
+            logging.warning("%s does not exist", args.src)
+            return
+        if rdr is None or rdr.inode != st.st_ino or rdr.position > st.st_size:
+            return self.__full()
+
+        data = b"".join(rdr.blocks())
+        if not data:
+            logging.info("Nothing new in %s", args.src)
+            return
+        tbl = self.__parse(self.__header + data)
+        logging.info("Read %s new rows from %s", tbl.shape[0], args.src)
+        try:
+            tbl = tbl.astype(self.__dtypes) # As if all of src had been read
+        except (ValueError, TypeError, KeyError):
+            logging.info("Columns changed, rereading %s", args.src)
+            return self.__full()
+
+        tbl = self.__clean(tbl)
+        keys = self.__keys(tbl)
+        rows = self.__rows(tbl)
+        qKeep = [self.__seen.get(key) != row for (key, row) in zip(keys, rows)]
+        qReplaced = any(key in self.__seen for (key, q) in zip(keys, qKeep) if q)
+        tbl = tbl[qKeep]
+        if tbl.empty:
+            logging.info("No new clean rows")
+            return
+
+        last = self.__tbl.iloc[-1] if self.__tbl.shape[0] else None
+        qAppend = not qReplaced and not self.__qDestChanged() \
+                and (last is None or (tbl.timestamp.iloc[0], tbl.imei.iloc[0]) \
+                                     >= (last.timestamp, last.imei))
+        self.__tbl = self.__clean(pd.concat((self.__tbl, tbl), ignore_index=True))
+        self.__remember(tbl)
+        if qAppend:
+            self.__write(self.__toCSV(tbl, False), True)
+            logging.info("Appended %s rows to %s", tbl.shape[0], args.dest)
+        else:
+            logging.info("Late or replaced rows, rewriting %s", args.dest)
+            self.__rewrite()
 
     def runIt(self) -> None:
         args = self.args
         q = self.__queue
         logging.info("Starting %s -> %s", args.src, args.dest)
 
+        self.__full()
+
         while True:
             (t0, fn) = q.get()
+            q.task_done()
 
-            if fn != args.src:
-                q.task_done()
-                continue
+            if fn != args.src: continue
 
             time.sleep(args.delay)
+            while not q.empty(): # Everything which arrived while sleeping
+                q.get()
+                q.task_done()
 
-            tbl = pd.read_csv(args.src)
-            logging.info("Read %s rows from %s", tbl.shape[0], args.src)
-
-            columns = list(tbl.columns)
-            tbl.rename(columns={columns[-1]: "temperature"}, inplace=True)
-            logging.info("tbl %s", tbl)
-
-            tbl.drop_duplicates(subset=("imei", "long", "lat"),
-                                keep="last", 
-                                ignore_index=True, 
-                                inplace=True)
-            logging.info("Cleaned to %s rows", tbl.shape[0])
-
-            tbl.lat = round(tbl.lat, 6)
-            tbl.long = round(tbl.long, 6)
-            tbl.sort_values(["timestamp", "imei"],
-                            kind="stable",
-                            ignore_index=True,
-                            inplace=True);
-
-            if os.path.isfile(args.dest):
-                dest = pd.read_csv(args.dest)
-                if not dest.equals(tbl):
-                    tbl.to_csv(args.dest, index=False)
-                    logging.info("Updated %s", args.dest)
-                else:
-                    logging.info("No need to update %s", args.dest)
-            else:
-                tbl.to_csv(args.dest, index=False)
-                logging.info("Wrote %s", args.dest)
-            q.task_done()
+            self.__update()
 
 parser = ArgumentParser()
 Logger.addArgs(parser)
@@ -86,4 +231,4 @@ i.addTree(os.path.dirname(args.src))
 try:
     Thread.waitForException()
 except:
-    logging.execption("Unexpected exception, %s", args)
+    logging.exception("Unexpected exception, %s", args)
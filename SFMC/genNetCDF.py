@@ -1,6 +1,6 @@
 #! /usr/bin/env python3
 #
-# Clean up the PEARL drifter dataset for some injected points from the future.
+# Rebuild the gliders' NetCDF files as their SFMC files are updated
 #
 # Jan-2025, Pat Welch
 
@@ -10,19 +10,117 @@ from TPWUtils.Thread import Thread
 from TPWUtils.INotify import INotify
 from TPWUtils import Logger
 import logging
+import logging.handlers
 import queue
 import time
+import threading
 import subprocess
+import multiprocessing
+import multiprocessing.forkserver
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import warmBuild
 
 class Builder(Thread):
+    """ Rebuild a glider's NetCDF files --delay seconds after its SFMC files change
+
+    Different gliders are built in parallel, at most --jobs at a time. A glider which
+    is triggered while it is being built is rebuilt once more after it finishes,
+    however many times it was triggered.
+    """
     def __init__(self, args:ArgumentParser, q:queue.Queue) -> None:
         Thread.__init__(self, "GEN", args)
         self.__queue = q
+        self.__lock = threading.Lock()
+        self.__slots = threading.BoundedSemaphore(args.jobs)
+        self.__running = set() # Gliders with a worker
+        self.__pending = set() # Gliders to be rebuilt after the running build
+        self.durations = {} # Seconds the last build of each glider took
+        self.__pools = {} # Warm worker for each glider's Python script, with --inProcess
+        if args.inProcess:
+            # Forking this process, with its build threads, could copy a lock held by
+            # another thread into the worker, i.e. logging's, so the workers are forked
+            # from a forkserver started now, which has already imported the --warm modules.
+            # Their log records are sent back here to be handled.
+            self.__context = multiprocessing.get_context("forkserver")
+            self.__context.set_forkserver_preload(["warmBuild"] + args.warm)
+            self.__logQueue = self.__context.Queue()
+            logging.handlers.QueueListener(self.__logQueue, *logging.getLogger().handlers,
+                                           respect_handler_level=True).start()
+            multiprocessing.forkserver.ensure_running()
+
+    @staticmethod
+    def addArgs(parser:ArgumentParser) -> None:
+        grp = parser.add_argument_group(description="Build scheduling options")
+        grp.add_argument("--delay", type=float, default=60,
+                         help="Delay after src update before loading")
+        grp.add_argument("--jobs", type=int, default=os.cpu_count(),
+                         help="Maximum number of gliders to build at once")
+        grp.add_argument("--inProcess", action="store_true",
+                         help="Run Python mk scripts in a long lived worker for each glider")
+        grp.add_argument("--warm", type=str, action="append",
+                         help="Modules for the workers to import when they start")
+
+    def __build(self, name:str) -> None:
+        cmd = os.path.join(self.args.destination, name)
+        logging.info("Executing %s", cmd)
+        stime = time.time()
+        try:
+            if self.args.inProcess and warmBuild.qPython(cmd):
+                self.__runInProcess(name, cmd)
+                return
+            with subprocess.Popen(cmd, shell=False,
+                                  stdout=subprocess.PIPE, stderr=subprocess.STDOUT) as sp:
+                for line in sp.stdout: # As it is written, rather than when cmd exits
+                    logging.info("%s %s", name, str(line, "utf-8", errors="replace").rstrip())
+            if sp.returncode:
+                logging.info("ReturnCode: %s", sp.returncode)
+        except Exception:
+            logging.exception("Executing %s", cmd)
+        finally:
+            dt = time.time() - stime
+            self.durations[name] = dt
+            logging.info("Built %s in %.1f seconds", name, dt)
+
+    def __runInProcess(self, name:str, cmd:str) -> None:
+        """ Run cmd in name's worker, which is started the first time """
+        if name not in self.__pools:
+            self.__pools[name] = ProcessPoolExecutor(max_workers=1,
+                                                     mp_context=self.__context,
+                                                     initializer=warmBuild.warmWorker,
+                                                     initargs=(self.args.warm, self.__logQueue,
+                                                               logging.getLogger().level))
+        try:
+            rc = self.__pools[name].submit(warmBuild.runScript, cmd).result()
+        except BrokenProcessPool:
+            logging.exception("%s's worker died, starting a new one next time", name)
+            self.__pools.pop(name).shutdown(wait=False)
+            return
+        if rc: logging.info("ReturnCode: %s", rc)
+
+    def __worker(self, name:str) -> None:
+        while True:
+            with self.__slots:
+                self.__build(name)
+            with self.__lock:
+                if name not in self.__pending:
+                    self.__running.discard(name)
+                    return
+                self.__pending.discard(name) # Triggered while building, so once more
+
+    def __schedule(self, name:str) -> None:
+        with self.__lock:
+            if name in self.__running:
+                logging.info("%s is being built, rebuilding it afterwards", name)
+                self.__pending.add(name)
+                return
+            self.__running.add(name)
+        threading.Thread(target=self.__worker, args=(name,), name=name, daemon=True).start()
 
     def runIt(self) -> None:
         args = self.args
         q = self.__queue
-        logging.info("Starting %s -> %s", args.source, args.destination)
+        logging.info("Starting %s -> %s jobs %s", args.source, args.destination, args.jobs)
 
         nameMap = dict(
                 boomer="mkBoomer",
@@ -34,90 +132,55 @@ class Builder(Thread):
                 SFMC=None,
                 )
 
+        due = {} # Command to when it should be started
         while True:
-            (t, fn) = q.get()
-            logging.info("t %s fn %s", t, fn)
+            now = time.time()
+            for name in sorted(due, key=due.get):
+                if due[name] > now: break
+                del due[name]
+                self.__schedule(name)
 
-            commands = set()
+            try:
+                (t, fn) = q.get(timeout=(min(due.values()) - now) if due else None)
+                q.task_done()
+            except queue.Empty:
+                continue
 
+            logging.info("t %s fn %s", t, fn)
             dirname = os.path.basename(os.path.dirname(fn))
-
             if dirname not in nameMap:
                 logging.info("Unsupported %s", dirname)
-                q.task_done()
-                continue
-
-            if nameMap[dirname] is None:
-                q.task_done()
                 continue
-
-            commands.add(nameMap[dirname])
-
-            now = time.time()
-            while True:
-                dt = args.delay - (time.time() - now)
-                if dt <= 0: break
-                logging.info("Sleeping for %s seconds", dt)
-                try:
-                    (t, fn) = q.get(block=True, timeout=dt)
-                    logging.info("t %s fn %s", t, fn)
-                    dirname = os.path.basename(os.path.dirname(fn))
-                    if dirname not in nameMap:
-                        logging.info("Unsupported %s", dirname)
-                        continue
-                    commands.add(nameMap[dirname])
-                except:
-                    pass
-
-            for name in commands:
-                cmd = (os.path.join(args.destination, name))
-                logging.info("Executing %s", cmd)
-                sp = subprocess.run(cmd, shell=False, capture_output=True)
-
-                if sp.returncode:
-                     logging.info("ReturnCode: %s", sp.returncode)
-
-                if sp.stdout:
-                    for line in sp.stdout.split(b"\n"):
-                        try:
-                            line = str(line, "utf-8")
-                        except:
-                            pass
-                        logging.info("STDOUT %s", line)
-
-                if sp.stderr:
-                    for line in sp.stderr.split(b"\n"):
-                        try:
-                            line = str(line, "utf-8")
-                        except:
-                            pass
-                        logging.info("STDERR %s", line)
-
-            q.task_done()
-
-parser = ArgumentParser()
-Logger.addArgs(parser)
-parser.add_argument("--delay", type=float, default=60, help="Delay after src update before loading")
-parser.add_argument("--source", type=str, default="~/Sync/Shore/SFMC",
-                    help="Input SFMC directory root")
-parser.add_argument("--destination", type=str, default="~/Sync/Processed/SFMC",
-                    help="Output directory for generated NetCDF files")
-parser.add_argument("--command", type=str, default="mkAll",
-                    help="Command to execute in destination directory to rebuild NetCDF files")
-args = parser.parse_args()
-
-Logger.mkLogger(args)
-
-args.source = os.path.abspath(os.path.expanduser(args.source))
-args.destination = os.path.abspath(os.path.expanduser(args.destination))
-
-i = INotify(args)
-rdr = Builder(args, i.queue)
-i.start()
-rdr.start()
-i.addTree(args.source)
-
-try:
-    Thread.waitForException()
-except:
-    logging.execption("Unexpected exception, %s", args)
+            if nameMap[dirname] is None: continue
+            due.setdefault(nameMap[dirname], time.time() + args.delay)
+
+if __name__ == "__main__": # The forkserver's workers import this as __mp_main__
+    parser = ArgumentParser()
+    Logger.addArgs(parser)
+    Builder.addArgs(parser)
+    parser.add_argument("--source", type=str, default="~/Sync/Shore/SFMC",
+                        help="Input SFMC directory root")
+    parser.add_argument("--destination", type=str, default="~/Sync/Processed/SFMC",
+                        help="Output directory for generated NetCDF files")
+    parser.add_argument("--command", type=str, default="mkAll",
+                        help="Command to execute in destination directory to rebuild NetCDF"
+                        + " files")
+    args = parser.parse_args()
+
+    Logger.mkLogger(args)
+
+    if args.warm is None: args.warm = ["numpy", "pandas", "xarray", "netCDF4"]
+
+    args.source = os.path.abspath(os.path.expanduser(args.source))
+    args.destination = os.path.abspath(os.path.expanduser(args.destination))
+
+    i = INotify(args)
+    rdr = Builder(args, i.queue)
+    i.start()
+    rdr.start()
+    i.addTree(args.source)
+
+    try:
+        Thread.waitForException()
+    except:
+        logging.exception("Unexpected exception, %s", args)
@@ -0,0 +1,120 @@
+#
+# Run a glider's Python mk script inside a long lived worker process
+#
+# A fresh interpreter for every build spends much of its time importing the scientific
+# stack. A worker imports the --warm modules once, then runs the script as __main__
+# with runpy for each build, so the script's imports are already in sys.modules.
+# The script is given a buildCache dictionary, which lives as long as the worker,
+# where it can keep whatever it has already converted and only convert what is new,
+# i.e. buildCache.get("files", {}) of filename -> (mtime, dataset).
+#
+# The script itself is reread for every build, and its buildCache is emptied when it
+# changes. Modules imported from the script's directory are reimported once their
+# files change. Anything imported from elsewhere, i.e. the --warm modules and the rest
+# of site-packages, is kept until the worker exits, so restart the daemon after
+# upgrading them.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+import contextlib
+import importlib
+import logging
+import logging.handlers
+import os.path
+import runpy
+import sys
+
+buildCaches = {} # Per worker, script to its buildCache
+scriptTimes = {} # Per worker, script to its mtime when its buildCache was started
+moduleTimes = {} # Per worker, module filename to its mtime when it was imported
+
+def qPython(cmd:str) -> bool:
+    """ Is cmd a Python script which can be run in a worker? """
+    if cmd.endswith(".py"): return True
+    try:
+        with open(cmd, "rb") as fp:
+            line = fp.readline(256)
+    except OSError:
+        return False
+    return line.startswith(b"#!") and b"python" in line
+
+def warmWorker(modules:list, logQueue=None, level:int=logging.INFO) -> None:
+    """ Import modules as a worker starts, and send its log records to logQueue """
+    if logQueue is not None:
+        root = logging.getLogger()
+        root.handlers = [logging.handlers.QueueHandler(logQueue)]
+        root.setLevel(level)
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            logging.warning("Unable to import %s", name)
+
+class LogWriter:
+    """ File-like object which logs each complete line written to it """
+    def __init__(self, prefix:str) -> None:
+        self.__prefix = prefix
+        self.__buffer = ""
+
+    def write(self, s:str) -> int:
+        lines = (self.__buffer + s).split("\n")
+        self.__buffer = lines.pop()
+        for line in lines:
+            logging.info("%s %s", self.__prefix, line)
+        return len(s)
+
+    def flush(self) -> None:
+        if self.__buffer:
+            logging.info("%s %s", self.__prefix, self.__buffer)
+            self.__buffer = ""
+
+def mTime(fn:str) -> float:
+    try:
+        return os.path.getmtime(fn)
+    except OSError:
+        return None
+
+def localModules(dirname:str) -> list:
+    """ (name, filename) of the modules imported from dirname """
+    items = []
+    for (name, module) in list(sys.modules.items()):
+        fn = getattr(module, "__file__", None)
+        if name in ("__main__", "__mp_main__"): continue # The worker itself
+        if fn and os.path.dirname(os.path.abspath(fn)) == dirname: items.append((name, fn))
+    return items
+
+def forgetChanged(dirname:str) -> None:
+    """ Drop the modules from dirname whose files have changed, so they are reimported """
+    for (name, fn) in localModules(dirname):
+        if fn in moduleTimes and moduleTimes[fn] != mTime(fn):
+            logging.info("%s changed, reimporting %s", fn, name)
+            del sys.modules[name]
+            del moduleTimes[fn]
+
+def runScript(cmd:str) -> int:
+    """ Run cmd as __main__ in this worker, returning its exit code """
+    name = os.path.basename(cmd)
+    dirname = os.path.dirname(cmd)
+    t = mTime(cmd)
+    if scriptTimes.get(cmd, t) != t:
+        logging.info("%s changed, starting a new buildCache", cmd)
+        buildCaches.pop(cmd, None)
+    scriptTimes[cmd] = t
+    forgetChanged(dirname)
+    cache = buildCaches.setdefault(cmd, {})
+    (argv, path) = (sys.argv, sys.path)
+    writer = LogWriter(name)
+    try:
+        sys.argv = [cmd]
+        sys.path = [dirname] + path # As if it were run from the command line
+        with contextlib.redirect_stdout(writer), contextlib.redirect_stderr(writer):
+            runpy.run_path(cmd, init_globals={"buildCache": cache}, run_name="__main__")
+        return 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int): return e.code or 0
+        logging.info("%s %s", name, e.code)
+        return 1
+    finally:
+        writer.flush()
+        (sys.argv, sys.path) = (argv, path)
+        for (_, fn) in localModules(dirname): moduleTimes.setdefault(fn, mTime(fn))
@@ -4,44 +4,113 @@
 #
 # Optionally update a CSV file to be transfer to/from ship
 #
+# Events are coalesced per file, then the files are loaded in one transaction.
+# Should a malformed line fail the COPY, the file is loaded a line at a time,
+# skipping the bad lines, so its position still advances.
+#
 # Nov-2024, Pat Welch, pat@mousebrains.com
 
 from argparse import ArgumentParser
 import psycopg
+from psycopg import sql
 import MakeTables as mt
+from TailReader import TailReader
 from TPWUtils.INotify import INotify
 from TPWUtils import Logger
 import logging
 import os.path
 import glob
+import queue
 import time
-import pandas as pd
-import numpy as np
-import MakeTables as mt
 
-def file2DB(fn:str, cur, table:str) -> None:
+digits = tuple("0123456789-+.")
+
+def mkInsert(table:str) -> sql.Composed:
+    # table was always unquoted, so it is folded to lower case as Postgresql would
+    return sql.SQL("INSERT INTO {} (time,name,type,latitude,longitude)").format(
+            sql.Identifier(table.lower()))
+
+def file2DB(fn:str, cur, table:str, qAppend:bool=True) -> int:
+    """ COPY the rows appended to fn since the last call into a staging table and merge them
+
+    The byte offset into fn is kept in fileposition, in the caller's transaction, so only
+    new lines are read. If qAppend is False, the whole file is reread every time.
+    The CSV's columns are time, in seconds since 1970, latitude, and longitude.
+    Returns the number of rows added.
+    """
     (name, ext) = os.path.splitext(os.path.basename(fn))
     device = "slocum"
 
-    sql0 = "SELECT EXTRACT(EPOCH FROM MAX(time)) FROM " + table
-    sql0+= " WHERE name=%s AND type=%s;"
-
-    sql1 = "INSERT INTO " + table
-    sql1+= " (time,name,type,latitude,longitude)"
-    sql1+= " VALUES (%s,'" + name + "','" + device + "',%s,%s)"
-    sql1+= " ON CONFLICT DO NOTHING;"
-
-    df = pd.read_csv(fn)
-    cur.execute(sql0, (name, device))
-    tMax = cur.fetchone()[0]
-    if tMax is not None:
-        df = df[df.time > tMax]
-        if df.empty: return
-    df.time = df.time.astype("datetime64[s]")
-    logging.info("Saving %s rows from %s", df.shape[0], fn)
-    for index in range(df.shape[0]):
-        row = df.iloc[index]
-        cur.execute(sql1, list(row))
+    sql0 = "CREATE TEMPORARY TABLE IF NOT EXISTS sfmcStage ("
+    sql0+= "t DOUBLE PRECISION, lat DOUBLE PRECISION, lon DOUBLE PRECISION"
+    sql0+= ") ON COMMIT DELETE ROWS;"
+
+    sql1 = mkInsert(table) + sql.SQL(
+            " SELECT to_timestamp(trunc(t)),%s,%s,lat,lon FROM sfmcStage"
+            + " WHERE t IS NOT NULL"
+            + " ON CONFLICT DO NOTHING;")
+
+    sql2 = "INSERT INTO fileposition (filename,position) VALUES (%s,%s)"
+    sql2+= " ON CONFLICT (filename) DO UPDATE SET position=EXCLUDED.position;"
+
+    pos = None
+    if qAppend:
+        cur.execute("SELECT position FROM fileposition WHERE filename=%s;", (fn,))
+        row = cur.fetchone()
+        pos = row[0] if row else None
+    if pos is not None and os.path.getsize(fn) == pos: return 0 # Nothing new
+    rdr = TailReader(fn, pos)
+
+    cur.execute(sql0)
+    try:
+        with cur.connection.transaction(): # Savepoint, so a bad line only costs the fast path
+            cnt = 0
+            with cur.copy("COPY sfmcStage (t,lat,lon) FROM STDIN (FORMAT csv)") as copy:
+                for lines in rdr.lines():
+                    lines = [line for line in lines if line[:1] in digits] # Not headers
+                    if not lines: continue
+                    copy.write("\n".join(lines) + "\n")
+                    cnt += len(lines)
+            n = 0
+            if cnt:
+                cur.execute(sql1, (name, device))
+                n = cur.rowcount
+        position = rdr.position
+    except psycopg.DataError:
+        logging.exception("Loading %s from %s, falling back to one line at a time", fn, pos)
+        (cnt, n, position) = loadByLine(fn, cur, table, pos, name, device)
+    cur.execute(sql2, (fn, position))
+    logging.info("Saved %s of %s rows from %s, %s -> %s", n, cnt, fn, pos, position)
+    return n
+
+def loadByLine(fn:str, cur, table:str, pos:int, name:str, device:str) -> tuple:
+    """ Insert the rows in fn after pos one at a time, skipping the lines which fail
+
+    For when a bad value fails file2DB's COPY and merge.
+    Returns (rows, inserted, position)
+    """
+    sql0 = mkInsert(table) + sql.SQL(
+            " VALUES (to_timestamp(trunc(%s)),%s,%s,%s,%s)"
+            + " ON CONFLICT DO NOTHING;")
+    rdr = TailReader(fn, pos)
+    (cnt, n) = (0, 0)
+    for block in rdr.blocks():
+        offset = rdr.position - len(block)
+        for line in block.split(b"\n")[:-1]: # block ends with a newline
+            start = offset
+            offset += len(line) + 1
+            line = str(line, "utf-8", errors="replace").rstrip("\r")
+            if line[:1] not in digits: continue # Not a header
+            try:
+                (t, lat, lon) = (float(x) if x.strip() else None for x in line.split(","))
+                if t is None: continue
+                cnt += 1
+                with cur.connection.transaction(): # Savepoint
+                    cur.execute(sql0, (t, name, device, lat, lon))
+                    n += cur.rowcount
+            except (psycopg.DataError, ValueError) as e:
+                logging.warning("Skipping the line at %s in %s, %s, %s", start, fn, line, e)
+    return (cnt, n, rdr.position)
 
 parser = ArgumentParser()
 Logger.addArgs(parser)
@@ -53,6 +122,10 @@ grp.add_argument("--table", type=str, default="SFMC", help="Table to store data
 grp = parser.add_argument_group(description="CSV reader related options")
 grp.add_argument("--noappend", action="store_true",
                  help="Is the CSV input not file strictly growing?")
+grp.add_argument("--delay", type=float, default=5,
+                 help="Seconds a file must be quiet before loading the changes")
+grp.add_argument("--maxDelay", type=float, default=60,
+                 help="Maximum seconds to wait to load a file which keeps changing")
 args = parser.parse_args()
 
 Logger.mkLogger(args)
@@ -60,25 +133,59 @@ Logger.mkLogger(args)
 dbArg = f"dbname={args.DB} user={args.user}"
 mt.mkAll(args.DB, args.user)
 
+def loadBatch(db, files:list, args:ArgumentParser) -> None:
+    """ Load files in one transaction """
+    stime = time.time()
+    cur = db.cursor()
+    mt.beginTransaction(cur)
+    n = 0
+    for fn in files:
+        try:
+            with db.transaction(): # Savepoint, so a bad file does not cost the others
+                n += file2DB(fn, cur, args.table, not args.noappend)
+        except (FileNotFoundError, psycopg.DataError):
+            logging.exception("Loading %s", fn)
+    db.commit()
+    logging.info("Saved %s rows from %s files in %.3f seconds", n, len(files), time.time() - stime)
+
 i = INotify(args)
 i.start()
 
+files = []
+for name in args.dirs:
+    name = os.path.abspath(os.path.expanduser(name))
+    i.addTree(name)
+    files.extend(glob.glob(os.path.join(name, "*.csv"))) # Catch up
 
-with psycopg.connect(dbArg) as conn, conn.cursor() as cur:
-    mt.beginTransaction(cur)
-    for name in args.dirs:
-        name = os.path.abspath(os.path.expanduser(name))
-        i.addTree(name)
-        for fn in glob.glob(os.path.join(name, "*.csv")):
-            file2DB(fn, cur, args.table)
-    conn.commit()
-
+# A harvester sync rewrites several gliders' files at once, so the events for each file
+# are gathered until it has been quiet for --delay seconds, or for at most --maxDelay,
+# and the files which are due are loaded together over one long lived connection.
 q = i.queue
+pending = {} # filename -> (first, last) event times not yet loaded
+db = None
 while True:
-    (t0, fn) = q.get()
-    logging.info("t0 %s fn %s", t0, fn)
-    with psycopg.connect(dbArg) as conn, conn.cursor() as cur:
-        mt.beginTransaction(cur)
-        file2DB(fn, cur, args.table)
-        conn.commit()
-    q.task_done()
+    try:
+        if db is None or db.closed: db = psycopg.connect(dbArg)
+        if files: loadBatch(db, sorted(files), args)
+    except psycopg.OperationalError:
+        logging.exception("Lost the database connection, retrying in %s", args.maxDelay)
+        for fn in files: pending.setdefault(fn, (time.time(), time.time()))
+        if db is not None: db.close()
+        db = None
+
+    files = []
+    while not files:
+        now = time.time()
+        due = {fn: min(pending[fn][1] + args.delay, pending[fn][0] + args.maxDelay)
+               for fn in pending}
+        files = [fn for fn in due if due[fn] <= now]
+        if files: break
+        try:
+            (t0, fn) = q.get(timeout=(min(due.values()) - now) if due else None)
+            q.task_done()
+            if not fn.endswith(".csv"): continue
+            now = time.time()
+            pending[fn] = (pending[fn][0] if fn in pending else now, now)
+        except queue.Empty:
+            pass
+    for fn in files: del pending[fn]
@@ -0,0 +1,86 @@
+#
+# Incrementally read complete lines from a growing file
+#
+# Only whole lines, ones terminated by a newline, are returned, so a partially
+# written last line is left for the next pass. The position is always the byte
+# just after the last complete line, so it can be stored and used to restart.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+import logging
+import mmap
+import os
+
+def completeLines(buffer, start:int=0, end:int=None) -> tuple:
+    """ Find the complete lines in buffer[start:end]
+
+    buffer can be anything supporting rfind and slicing, i.e. bytes or mmap
+
+    returns (block, offset) where block is the bytes up to and including the last
+    newline and offset is the index into buffer just after that newline.
+    """
+    if end is None: end = len(buffer)
+    index = buffer.rfind(b"\n", start, end)
+    if index < 0: return (b"", start)
+    return (buffer[start:index+1], index+1)
+
+class TailReader:
+    def __init__(self, fn:str, pos:int=None, inode:int=None, blockSize:int=4*1024*1024) -> None:
+        self.filename = fn
+        self.position = pos if pos else 0
+        self.inode = inode
+        self.blockSize = blockSize
+
+    def __repr__(self) -> str:
+        return f"TailReader({self.filename}, {self.position}, {self.inode})"
+
+    def __checkRotation(self, st:os.stat_result) -> None:
+        if self.inode is not None and self.inode != st.st_ino:
+            logging.warning("%s inode changed %s -> %s, rereading from the start",
+                            self.filename, self.inode, st.st_ino)
+            self.position = 0
+        elif st.st_size < self.position:
+            logging.warning("%s truncated %s -> %s, rereading from the start",
+                            self.filename, self.position, st.st_size)
+            self.position = 0
+        self.inode = st.st_ino
+
+    def qChanged(self) -> bool:
+        """ Is there possibly something new to read? """
+        try:
+            st = os.stat(self.filename)
+        except FileNotFoundError:
+            return False
+        return st.st_ino != self.inode or st.st_size != self.position
+
+    def blocks(self):
+        """ Yield blocks of complete lines as bytes
+
+        self.position is advanced past each block as it is yielded
+        """
+        with open(self.filename, "rb") as fp:
+            st = os.fstat(fp.fileno())
+            self.__checkRotation(st)
+            size = st.st_size
+            if size <= self.position: return
+            with mmap.mmap(fp.fileno(), size, access=mmap.ACCESS_READ) as mm:
+                while self.position < size:
+                    end = min(size, self.position + self.blockSize)
+                    (block, offset) = completeLines(mm, self.position, end)
+                    if not block:
+                        if end == size: return # Only a partial line left
+                        # A line longer than blockSize, so look further
+                        (block, offset) = completeLines(mm, self.position, size)
+                        if not block: return
+                    self.position = offset
+                    yield block
+
+    def lines(self, encoding:str="utf-8"):
+        """ Yield lists of complete lines, without their line terminators, as str
+
+        Lines are split on newlines only, as completeLines does, dropping a trailing
+        carriage return. str.splitlines would also split on form feeds, \\x1c, \\u2028, ...
+        """
+        for block in self.blocks():
+            yield [str(line, encoding, errors="replace").removesuffix("\r")
+                   for line in block.split(b"\n")[:-1]] # block ends with a newline
@@ -0,0 +1 @@
+../TimeDecoder/TimeDecoder.py
\ No newline at end of file
@@ -0,0 +1,66 @@
+#! /usr/bin/env python3
+#
+# Regression check on the startup cost of the Thompson processing scripts
+#
+# Each script is run with -X importtime and --help, which is the same import path
+# as a run which finds nothing to do. Fail if any of the heavy scientific packages
+# are imported at startup or the total import time is too large.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+import os.path
+import re
+import subprocess
+import sys
+
+def importTimes(script:str, python:str) -> tuple:
+    cmd = [python, "-X", "importtime", script, "--help"]
+    sp = subprocess.run(cmd, shell=False, capture_output=True,
+                        cwd=os.path.dirname(script))
+    expr = re.compile(r"^import time:\s+(\d+)\s+[|]\s+(\d+)\s+[|]( *)(\S+)\s*$")
+    total = 0 # Top level cumulative microseconds
+    modules = {}
+    for line in str(sp.stderr, "utf-8", errors="replace").splitlines():
+        matches = expr.match(line)
+        if not matches: continue
+        cumulative = int(matches[2])
+        modules[matches[4]] = cumulative
+        if len(matches[3]) <= 1: total += cumulative
+    return (sp.returncode, total / 1e6, modules)
+
+parser = ArgumentParser()
+parser.add_argument("script", type=str, nargs="*",
+                    default=("scs2NC.py", "harperMonitor.py", "mkNC.py"),
+                    help="Scripts to check")
+parser.add_argument("--python", type=str, default=sys.executable, help="Python to run")
+parser.add_argument("--maxTime", type=float, default=0.5, help="Maximum import seconds")
+parser.add_argument("--forbidden", type=str, action="append",
+                    help="Packages which should not be imported at startup")
+parser.add_argument("--top", type=int, default=5, help="Number of slowest imports to show")
+args = parser.parse_args()
+
+forbidden = args.forbidden if args.forbidden else ("numpy", "pandas", "netCDF4", "cftime", "yaml")
+
+myDir = os.path.dirname(os.path.abspath(__file__))
+qFailed = False
+
+for script in args.script:
+    script = os.path.abspath(os.path.join(myDir, script))
+    (rc, total, modules) = importTimes(script, args.python)
+    heavy = sorted(filter(lambda x: x in modules, forbidden))
+    slowest = sorted(modules, key=lambda x: modules[x], reverse=True)[:args.top]
+    print(f"{os.path.basename(script)} returncode {rc} import time {total:.3f} seconds")
+    for name in slowest:
+        print(f"  {name} {modules[name]/1e6:.3f}")
+    if rc:
+        print("  FAILED to run")
+        qFailed = True
+    if heavy:
+        print("  FAILED imported", ", ".join(heavy))
+        qFailed = True
+    if total > args.maxTime:
+        print(f"  FAILED import time exceeds {args.maxTime} seconds")
+        qFailed = True
+
+sys.exit(1 if qFailed else 0)
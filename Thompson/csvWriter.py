@@ -4,7 +4,6 @@
 # Jan-2025, Pat Welch, pat@mousebrains.com
 
 from argparse import ArgumentParser
-import numpy as np
 from TPWUtils.Thread import Thread
 import logging
 import queue
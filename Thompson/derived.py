@@ -0,0 +1,93 @@
+#
+# Derived variables computed by ncWriter on each batch of records
+#
+# A variable is derived if its YAML definition has a derived section, i.e.
+#
+# wSpdTrue:
+#   type: f4
+#   derived:
+#     function: trueWindSpeed
+#     speed: wSpd       # Relative wind speed
+#     direction: wDir   # Relative wind direction, from, degrees clockwise from the bow
+#     heading: gyro     # Degrees true, or a list, the first one in the batch is used
+#     cog: cog          # Course over ground, degrees true
+#     sog: sog          # Speed over ground
+#     sogScale: 1.9438  # Convert sog into the units of speed, m/s -> knots
+#     maxGap: 5         # Rows to fill navigation inputs across
+#
+# COG is not a substitute for heading, the ship can be crabbing or drifting, so
+# without a heading the true wind is NaN.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+import logging
+import numpy as np
+import pandas as pd
+
+def trueWind(spd:np.ndarray, direction:np.ndarray,
+             heading:np.ndarray, cog:np.ndarray, sog:np.ndarray) -> tuple:
+    """ True wind speed and the direction it is coming from, degrees true
+
+    spd/direction are the relative wind, direction is where the wind comes from
+    measured clockwise from the bow. sog must be in the same units as spd.
+    """
+    theta = np.radians(heading + direction)
+    # Velocity of the air relative to the ship, the direction it is moving towards
+    u = -spd * np.sin(theta)
+    v = -spd * np.cos(theta)
+    # Add the ship's velocity back in to get the velocity relative to the earth
+    cog = np.radians(cog)
+    u = u + sog * np.sin(cog)
+    v = v + sog * np.cos(cog)
+    return (np.hypot(u, v), np.degrees(np.arctan2(-u, -v)) % 360)
+
+def getColumn(df:pd.DataFrame, names, maxGap:int) -> np.ndarray:
+    if isinstance(names, str): names = [names]
+    for name in names:
+        if name in df and df[name].notna().any():
+            val = df[name]
+            if maxGap > 0: # Navigation is not necessarily in the same second as the wind
+                val = val.ffill(limit=maxGap).bfill(limit=maxGap)
+            return val.to_numpy(dtype=float)
+    return None
+
+def computeTrueWind(df:pd.DataFrame, opts:dict) -> tuple:
+    maxGap = opts.get("maxGap", 5)
+    spd = getColumn(df, opts["speed"], 0)
+    direction = getColumn(df, opts["direction"], 0)
+    if spd is None or direction is None: return None # No wind in this batch
+    (heading, cog, sog) = (getColumn(df, opts[key], maxGap) for key in ("heading", "cog", "sog"))
+    missing = np.full(len(df), np.nan)
+    if heading is None: heading = missing
+    if cog is None: cog = missing
+    if sog is None: sog = missing
+    return trueWind(spd, direction, heading, cog, sog * opts.get("sogScale", 1))
+
+def trueWindSpeed(df:pd.DataFrame, opts:dict) -> np.ndarray:
+    val = computeTrueWind(df, opts)
+    return None if val is None else val[0]
+
+def trueWindDirection(df:pd.DataFrame, opts:dict) -> np.ndarray:
+    val = computeTrueWind(df, opts)
+    return None if val is None else val[1]
+
+functions = {
+        "trueWindSpeed": trueWindSpeed,
+        "trueWindDirection": trueWindDirection,
+        }
+
+def derive(df:pd.DataFrame, varDefs:dict) -> pd.DataFrame:
+    """ Add the derived variables in varDefs to df, where their inputs are available """
+    for name in varDefs:
+        item = varDefs[name]
+        if not isinstance(item, dict) or "derived" not in item: continue
+        opts = item["derived"]
+        if opts.get("function") not in functions:
+            logging.warning("Unknown derived function for %s, %s", name, opts)
+            continue
+        try:
+            val = functions[opts["function"]](df, opts)
+            if val is not None: df[name] = val
+        except:
+            logging.exception("Deriving %s from %s", name, opts)
+    return df
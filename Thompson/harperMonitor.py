@@ -14,9 +14,9 @@ import socket
 import re
 import time
 import math
-import yaml
 from ncWriter import ncWriter
 from csvWriter import csvWriter
+from TimeDecoder import decodeDMY
 
 class Consumer:
     def __init__(self):
@@ -63,17 +63,6 @@ class ConsumerNav(Consumer, Thread):
         if tt > t: tt -= datetime.timedelta(days=1)
         return tt
 
-    @staticmethod
-    def __decodeFixDate(t:datetime.datetime, tt:str) -> datetime.datetime:
-        if not tt: return None
-        tt = float(tt)
-        d = int(math.floor(tt / 10000))
-        m = int(math.floor(tt / 100) % 100)
-        y = int(tt % 100)
-        tt = datetime.datetime.strptime(f"{y}-{m:02d}-{d:02d}", "%y-%m-%d")
-        tt = tt.replace(tzinfo=datetime.timezone.utc)
-        return tt
-
     def __ingga(self, t:datetime.datetime, sentence:bytes):
         fields = sentence.split(b",");
         if len(fields) != 15:
@@ -162,9 +151,7 @@ class ConsumerTSG(Consumer, Thread):
                 if len(fields) != 6:
                     logging.warning("Bad TSG line, %s", body)
                     continue
-                t = datetime.datetime.strptime(fields[0] + " " + fields[1], 
-                                               "%d-%m-%Y %H:%M:%S",
-                                               ).replace(tzinfo=datetime.timezone.utc)
+                t = decodeDMY(fields[0] + " " + fields[1])
                 record = dict(
                         # temperatureTSG = float(fields[2]),
                         # conductivity = float(fields[3]),
@@ -200,9 +187,7 @@ class ConsumerIntake(Consumer, Thread):
                     logging.warning("Bady intake line, %s", body)
                     q.task_done()
                     continue
-                t = datetime.datetime.strptime(fields[0] + " " + fields[1], 
-                                               "%d-%m-%Y %H:%M:%S",
-                                               ).replace(tzinfo=datetime.timezone.utc)
+                t = decodeDMY(fields[0] + " " + fields[1])
                 record = dict(
                         temperatureInlet = float(fields[2]),
                         )
@@ -245,6 +230,7 @@ Logger.mkLogger(args)
 
 logging.info("Args %s", args)
 
+import yaml # Only needed once the arguments have been parsed
 with open(args.config, "r") as fp: varDefs = yaml.safe_load(fp)
 logging.info("Variable Definitions %s", varDefs)
 
@@ -4,11 +4,11 @@
 #
 # April-2023, Pat Welch, pat@mousebrains.com
 
-from netCDF4 import Dataset
-import numpy as np
-import pandas as pd
+def createNetCDF(fn:str, tBase:"np.datetime64") -> None:
+    from netCDF4 import Dataset
+    import numpy as np
+    import pandas as pd
 
-def createNetCDF(fn:str, tBase:np.datetime64) -> None:
     tBase = pd.Timestamp(tBase).strftime("%Y-%m-%d %H:%M:%S")
     with Dataset(fn, "w", format="NETCDF4") as nc:
         nc.setncattr("Comment", "Generated for R/V Thompson as part of ARCTERX 2023 cruise")
@@ -126,5 +126,6 @@ if __name__ == "__main__":
     parser.add_argument("--tBase", type=str, default="2024-04-01 00:10:00", help="Base time for CF")
     args = parser.parse_args()
 
+    import numpy as np
     tBase = np.datetime64(args.tBase)
     createNetCDF(args.nc, tBase)
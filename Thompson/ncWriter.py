@@ -2,11 +2,11 @@
 # Write out a dictionary to a NetCDF file
 #
 # Jan-2025, Pat Welch, pat@mousebrains.com
+#
+# numpy, pandas, and netCDF4 are imported where they are used,
+# so merely importing this module is cheap.
 
 from argparse import ArgumentParser
-import numpy as np
-import pandas as pd
-from netCDF4 import Dataset
 from TPWUtils.Thread import Thread
 import logging
 import queue
@@ -58,6 +58,8 @@ class ncWriter(Thread):
 
     @staticmethod
     def getFillValue(a:str):
+        import numpy as np
+
         match a:
             case "i8":
                 return -9223372036854775808
@@ -76,7 +78,9 @@ class ncWriter(Thread):
             case _:
                 return np.nan if a[0] == "f" else None
 
-    def initializeNC(self, fn:str, t0:np.datetime64):
+    def initializeNC(self, fn:str, t0:"np.datetime64"):
+        from netCDF4 import Dataset
+
         varDefs = self.__varDefs
 
         globalOpts = dict(
@@ -88,6 +92,7 @@ class ncWriter(Thread):
         skipKeys = list(globalOpts.keys())
         skipKeys.append("type")
         skipKeys.append("timeName")
+        skipKeys.append("derived")
 
         if "global_opts" in varDefs and varDefs["global_opts"]:
             globalOpts.update(varDefs["global_opts"])
@@ -148,7 +153,10 @@ class ncWriter(Thread):
 
         logging.info("Took %s seconds to copy %s to %s", time.time()-stime, src, tgt)
 
-    def updateNetCDF(self, fn:str, df:pd.DataFrame, t0:np.datetime64, colNames:list) -> None:
+    def updateNetCDF(self, fn:str, df:"pd.DataFrame", t0:"np.datetime64", colNames:list) -> None:
+        import numpy as np
+        from netCDF4 import Dataset
+
         logging.info("Updating %s rows in %s", df.shape[0], fn)
         stime = time.time()
         with Dataset(fn, "a") as nc:
@@ -176,6 +184,10 @@ class ncWriter(Thread):
                      fn)
 
     def runIt(self):
+        import numpy as np
+        import pandas as pd
+        import derived
+
         args = self.args
         q = self.__queue
         delay = args.batchDelay
@@ -237,7 +249,8 @@ class ncWriter(Thread):
             df = pd.DataFrame(records)
             df.time = df.time.dt.round(freq="s")
             df  = df.groupby(by="time", as_index=False).agg("median")
-            df = df.sort_values("time")
+            df = df.sort_values("time", ignore_index=True)
+            df = derived.derive(df, self.__varDefs)
             t0 = df.time.iloc[0]
             df["tIndex"] = (df.time - t0).astype("timedelta64[s]").astype(int)
 
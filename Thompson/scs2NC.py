@@ -7,46 +7,63 @@
 from argparse import ArgumentParser
 import logging
 import os
-from tempfile import NamedTemporaryFile
 import glob
 import datetime
 import math
 import re
 import time
-import numpy as np
-import pandas as pd
 import psycopg
+import queue
 import sys
 from ncWriter import ncWriter
-import yaml
+from TailReader import TailReader
+from TimeDecoder import decodeSCS
+from TPWUtils.Thread import Thread
+# pandas and yaml are imported where they are used, so a run which finds nothing new is quick
+
+filePatterns = {
+        "MET": re.compile(r"^(SONIC-TWIND-RAW|PAR-RAW|BOW-MET-RAW|RAD|Campbell-RAD|BRIDGE-WIND-(STBD|PORT)-DRV-Data)_(\d+)-\d+.Raw$"),
+        "NAV": re.compile(r"^CNAV3050-(GGA|VTG)-RAW_(\d+)-\d+.Raw$"),
+        "SEAWATER": re.compile(r"^(FLUOROMETER|TSG|SBE38)-RAW_(\d+)-\d+.Raw$"),
+        "SOUNDERS": re.compile(r"^(KNUDSEN-PKEL99-RAW|MB-DEPTH)_(\d+)-\d+.Raw$"),
+    }
+
+def matchFilename(fn:str) -> tuple:
+    subdir = os.path.basename(os.path.dirname(fn))
+    if subdir not in filePatterns: return None
+    matches = filePatterns[subdir].match(os.path.basename(fn))
+    if not matches: return None
+    return (matches[matches.lastindex], matches[1]) # (date, codigo)
+
+def getPosition(cur, fn:str) -> int:
+    cur.execute("SELECT position FROM fileposition WHERE filename=%s;", (fn,))
+    for row in cur:
+        return row[0]
+    return None
 
 def mkFilenames(paths:tuple, cur) -> dict:
-    patterns = {
-            "MET": re.compile(r"^(SONIC-TWIND-RAW|PAR-RAW|BOW-MET-RAW|RAD|Campbell-RAD|BRIDGE-WIND-(STBD|PORT)-DRV-Data)_(\d+)-\d+.Raw$"),
-            "NAV": re.compile(r"^CNAV3050-(GGA|VTG)-RAW_(\d+)-\d+.Raw$"),
-            "SEAWATER": re.compile(r"^(FLUOROMETER|TSG|SBE38)-RAW_(\d+)-\d+.Raw$"),
-            "SOUNDERS": re.compile(r"^(KNUDSEN-PKEL99-RAW|MB-DEPTH)_(\d+)-\d+.Raw$"),
-        }
+    candidates = {}
+    for path in paths:
+        for subdir in filePatterns:
+            for fn in glob.glob(os.path.join(path, subdir, "*.Raw")):
+                info = matchFilename(fn)
+                if info: candidates[fn] = info
 
-    sql = "SELECT position FROM fileposition WHERE filename=%s;"
+    # One query for all the positions instead of one per file
+    positions = {}
+    if candidates:
+        cur.execute("SELECT filename,position FROM fileposition WHERE filename=ANY(%s);",
+                    (list(candidates),))
+        for (fn, pos) in cur:
+            positions[fn] = pos
 
     items = {}
-    for path in paths:
-        for subdir in patterns:
-            expr = patterns[subdir]
-            for fn in glob.glob(os.path.join(path, subdir, "*.Raw")):
-                matches = expr.match(os.path.basename(fn))
-                if not matches: continue
-                pos = None
-                cur.execute(sql, (fn,))
-                for row in cur:
-                    pos = row[0]
-                    break
-
-                if pos is not None and os.path.getsize(fn) == pos: continue
-                date = matches[matches.lastindex]
-                if date not in items: items[date] = {}
-                items[date][fn] = (pos, matches[1])
+    for fn in candidates:
+        pos = positions.get(fn)
+        if pos is not None and os.path.getsize(fn) == pos: continue
+        (date, codigo) = candidates[fn]
+        if date not in items: items[date] = {}
+        items[date][fn] = (pos, codigo)
     return items
 
 def decodeDegMin(degMin:str, direction:str) -> float:
@@ -174,8 +191,7 @@ def procLine(line:str, codigo:str=None) -> dict:
     fields = line.strip().split(",")
     if len(fields) < 3: return None
     try:
-        t = datetime.datetime.strptime(fields[0] + " " + fields[1], "%m/%d/%Y %H:%M:%S.%f") \
-                .replace(tzinfo=datetime.timezone.utc)
+        t = decodeSCS(fields[0] + " " + fields[1])
         dSeconds = round(t.microsecond/1000000)
         tt = t.replace(microsecond=0) + datetime.timedelta(seconds=dSeconds)
 
@@ -190,23 +206,32 @@ def procLine(line:str, codigo:str=None) -> dict:
     except:
         logging.exception("codigo %s Fields %s", codigo, fields)
 
-def loadFile(fn:str, pos:int, codigo:str, nc:ncWriter) -> tuple:
+def loadFile(rdr:TailReader, codigo:str) -> tuple:
+    import pandas as pd
+
+    pos = rdr.position
     try:
         items = []
-        with open(fn, "r") as fp:
-            if pos: fp.seek(pos)
-            for line in fp:
+        for lines in rdr.lines():
+            for line in lines:
                 val = procLine(line, codigo)
                 if val: items.append(val)
-            pos = fp.tell()
-        if not items: return (None, pos) # In case there is nothing
+        if not items: return (None, rdr.position) # In case there is nothing
         df = pd.DataFrame(items)
-        return (df, pos)
+        return (df, rdr.position)
     except:
-        logging.exception("Working on %s", fn)
+        logging.exception("Working on %s", rdr.filename)
+        rdr.position = pos
         return (None, pos)
 
-def loadIt(paths:list, args:ArgumentParser, nc:ncWriter) -> None:
+def putFrame(df:"pd.DataFrame", nc:ncWriter) -> None:
+    if df is None or df.empty: return
+    for row in df.to_dict(orient="records"):
+        t = row["t"].to_pydatetime()
+        del row["t"]
+        nc.put(t, row)
+
+def loadIt(paths:list, args:ArgumentParser, nc:ncWriter, filenames:dict=None) -> None:
     dbName = args.db
 
     sql = "INSERT INTO filePosition VALUES (%s, %s)"
@@ -214,7 +239,7 @@ def loadIt(paths:list, args:ArgumentParser, nc:ncWriter) -> None:
 
     with psycopg.connect(f"dbname={dbName}") as db:
         cur = db.cursor()
-        filenames = mkFilenames(paths, cur)
+        if filenames is None: filenames = mkFilenames(paths, cur)
         cur.execute("BEGIN TRANSACTION;")
 
         for date in sorted(filenames):
@@ -222,7 +247,8 @@ def loadIt(paths:list, args:ArgumentParser, nc:ncWriter) -> None:
             frames = None
             for fn in filenames[date]:
                 t0 = time.time()
-                (df, pos) = loadFile(fn, filenames[date][fn][0], filenames[date][fn][1], nc)
+                (pos, codigo) = filenames[date][fn]
+                (df, pos) = loadFile(TailReader(fn, pos), codigo)
                 if df is None:
                     logging.info("No data from %s", fn)
                     if pos is not None:
@@ -237,19 +263,117 @@ def loadIt(paths:list, args:ArgumentParser, nc:ncWriter) -> None:
                 logging.info("Loaded %s in %s secs, sz %s pos %s", 
                              os.path.basename(fn), round(t1-t0,1), len(df), pos)
                 cur.execute(sql, (fn, pos))
-            for row in frames.to_dict(orient="records"):
-                t = row["t"].to_pydatetime()
-                del row["t"]
-                nc.put(t, row)
+            putFrame(frames, nc)
         db.commit()
 
+class Tailer(Thread):
+    def __init__(self, paths:list, args:ArgumentParser, nc:ncWriter) -> None:
+        Thread.__init__(self, "TAIL", args)
+        self.__paths = paths
+        self.__nc = nc
+
+    @staticmethod
+    def addArgs(parser:ArgumentParser) -> None:
+        grp = parser.add_argument_group(description="Daemon mode related options")
+        grp.add_argument("--daemon", action="store_true",
+                         help="Stay resident and tail the SCS files using inotify")
+        grp.add_argument("--tailDelay", type=float, default=1,
+                         help="Seconds to gather inotify events before reading the files")
+        grp.add_argument("--checkpoint", type=float, default=60,
+                         help="Seconds between saving file positions into the database")
+
+    def runIt(self) -> None:
+        import pyinotify
+        from TPWUtils.INotify import INotify
+
+        args = self.args
+        paths = self.__paths
+        nc = self.__nc
+
+        sql = "INSERT INTO filePosition VALUES (%s, %s)"
+        sql+= " ON CONFLICT (filename) DO UPDATE SET position=EXCLUDED.position;"
+
+        # SCS keeps the Raw files open and appends to them, so IN_MODIFY is needed
+        i = INotify(args, pyinotify.IN_MODIFY | pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO)
+        i.start()
+        for path in paths:
+            for subdir in filePatterns:
+                dirname = os.path.join(path, subdir)
+                if os.path.isdir(dirname):
+                    i.addTree(dirname)
+                else:
+                    logging.warning("%s is not a directory", dirname)
+
+        # Catch up on everything that arrived while we were not running,
+        # events which arrive during this are queued up by inotify
+        loadIt(paths, args, nc)
+
+        q = i.queue
+        readers = {} # Where the next unread byte is for the newest file of each stream
+        newest = {} # (directory, codigo) -> (date, filename) of the stream's newest file
+        dirty = set() # Files whose position has not been saved to the database
+        tCheckpoint = time.time()
+
+        with psycopg.connect(f"dbname={args.db}", autocommit=True) as db:
+            cur = db.cursor()
+            while True:
+                files = set()
+                try:
+                    (t0, fn) = q.get(timeout=args.checkpoint if dirty else None)
+                    q.task_done()
+                    files.add(fn)
+                    tEnd = time.time() + args.tailDelay
+                    while True:
+                        dt = tEnd - time.time()
+                        if dt <= 0: break
+                        (t0, fn) = q.get(timeout=dt)
+                        q.task_done()
+                        files.add(fn)
+                except queue.Empty:
+                    pass
+
+                stale = set() # Files which are no longer the newest of their stream
+                for fn in sorted(files):
+                    info = matchFilename(fn)
+                    if not info: continue
+                    stream = (os.path.dirname(fn), info[1])
+                    if stream not in newest or newest[stream][0] < info[0]:
+                        if stream in newest: stale.add(newest[stream][1]) # Rolled over
+                        newest[stream] = (info[0], fn)
+                    elif newest[stream][1] != fn:
+                        stale.add(fn) # Something was appended to an older file
+                    if fn not in readers:
+                        readers[fn] = TailReader(fn, getPosition(cur, fn))
+                    prevPos = readers[fn].position
+                    (df, pos) = loadFile(readers[fn], info[1])
+                    if pos == prevPos: continue
+                    logging.debug("Loaded %s rows from %s pos %s -> %s",
+                                  0 if df is None else len(df), fn, prevPos, pos)
+                    dirty.add(fn)
+                    putFrame(df, nc)
+
+                for fn in stale: # Save their positions now, since their readers are dropped
+                    rdr = readers.pop(fn, None)
+                    if rdr is None: continue
+                    if fn in dirty:
+                        cur.execute(sql, (fn, rdr.position))
+                        dirty.discard(fn)
+                    logging.info("Stopped tailing %s at %s", fn, rdr.position)
+
+                if dirty and (time.time() - tCheckpoint) >= args.checkpoint:
+                    with db.transaction():
+                        cur.executemany(sql, [(fn, readers[fn].position) for fn in dirty])
+                    logging.info("Checkpointed %s file positions", len(dirty))
+                    dirty.clear()
+                    tCheckpoint = time.time()
+
 if __name__ == "__main__":
     from TPWUtils import Logger
-    from TPWUtils.Thread import Thread
 
     parser = ArgumentParser()
     Logger.addArgs(parser)
     ncWriter.addArgs(parser)
+    Tailer.addArgs(parser)
     parser.add_argument("directory", type=str, nargs="+", help="Directories to look in")
     parser.add_argument("--nc", type=str, action="append", required=True, help="Output NetCDF filenames")
     parser.add_argument("--db", type=str, default="arcterx", help="Database name")
@@ -259,20 +383,31 @@ if __name__ == "__main__":
 
     Logger.mkLogger(args)
 
+    directories = []
+    for directory in args.directory:
+        directories.append(os.path.abspath(os.path.expanduser(directory)))
+
+    filenames = None
+    if not args.daemon:
+        with psycopg.connect(f"dbname={args.db}") as db:
+            filenames = mkFilenames(directories, db.cursor())
+        if not filenames:
+            logging.info("Nothing new in %s", directories)
+            sys.exit(0)
+
     try:
+        import yaml
         with open(args.config, "r") as fp: varDefs = yaml.safe_load(fp)
         logging.info("varDefs %s", varDefs)
 
-        directories = []
-        for directory in args.directory:
-            directories.append(os.path.abspath(os.path.expanduser(directory)))
-
         nc = ncWriter(args, args.nc, varDefs)
         nc.start()
 
-        loadIt(directories, args, nc)
-
-        nc.put(None, None)
+        if args.daemon:
+            Tailer(directories, args, nc).start()
+        else:
+            loadIt(directories, args, nc, filenames)
+            nc.put(None, None)
 
         Thread.waitForException()
     except UserWarning:
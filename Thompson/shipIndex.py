@@ -0,0 +1,248 @@
+#! /usr/bin/env python3
+#
+# A sorted, memory mapped, array of ship fixes for "where was the ship at time t"
+#
+# The index file is a flat array of (t, lat, lon) float64 records, with t in
+# seconds since 1970, strictly increasing. It only ever grows by appending, so
+# readers can memory map it while the updater adds to it. Should fixes turn up
+# before the last one, it is rebuilt and renamed into place.
+#
+# As a library:
+#   from shipIndex import ShipIndex
+#   (lat, lon) = ShipIndex("~/probar/ship.idx").interp(times)
+#
+# As a service, keep the index up to date from udpProcess' ship table or from
+# the NetCDF files written by ncWriter:
+#   shipIndex.py --db=arcterx --ship=TGT ~/probar/ship.idx
+#   shipIndex.py --nc=~/probar/ship.nc ~/probar/ship.idx
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+from argparse import ArgumentParser
+import logging
+import numpy as np
+import os
+import time
+
+class ShipIndex:
+    dtype = np.dtype([("t", "<f8"), ("lat", "<f8"), ("lon", "<f8")])
+
+    def __init__(self, fn:str) -> None:
+        self.filename = os.path.abspath(os.path.expanduser(fn))
+        self.__fixes = np.empty(0, dtype=self.dtype)
+        self.__inode = None
+        self.refresh()
+
+    def __len__(self) -> int:
+        return self.__fixes.shape[0]
+
+    def __repr__(self) -> str:
+        return f"ShipIndex({self.filename}, n={len(self)})"
+
+    @property
+    def fixes(self) -> np.ndarray:
+        return self.__fixes
+
+    def tMax(self) -> float:
+        return self.__fixes["t"][-1] if len(self) else None
+
+    def refresh(self) -> bool:
+        """ Map any records appended since the last call, returns True if there are new ones """
+        try:
+            st = os.stat(self.filename)
+            (size, inode) = (st.st_size, st.st_ino)
+        except FileNotFoundError:
+            (size, inode) = (0, None)
+        n = size // self.dtype.itemsize
+        if n == len(self) and inode == self.__inode: return False
+        self.__inode = inode # Changes when rebuilt
+        if n == 0:
+            self.__fixes = np.empty(0, dtype=self.dtype)
+        else:
+            self.__fixes = np.memmap(self.filename, dtype=self.dtype, mode="r", shape=(n,))
+        return True
+
+    def __mkFixes(self, t:np.ndarray, lat:np.ndarray, lon:np.ndarray, tMin:float=None) -> np.ndarray:
+        """ Sorted fixes, with unique times after tMin, from the finite values """
+        t = np.asarray(t, dtype=float)
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        q = np.isfinite(t) & np.isfinite(lat) & np.isfinite(lon)
+        if tMin is not None: q &= t > tMin
+        fixes = np.empty(np.count_nonzero(q), dtype=self.dtype)
+        fixes["t"] = t[q]
+        fixes["lat"] = lat[q]
+        fixes["lon"] = lon[q]
+        if not fixes.shape[0]: return fixes
+        fixes.sort(order="t", kind="stable")
+        qUnique = np.empty(fixes.shape[0], dtype=bool) # Keep the last of duplicate times
+        qUnique[:-1] = fixes["t"][1:] != fixes["t"][:-1]
+        qUnique[-1] = True
+        return fixes[qUnique]
+
+    def __mkDir(self) -> None:
+        dirname = os.path.dirname(self.filename)
+        if not os.path.isdir(dirname):
+            logging.info("Creating %s", dirname)
+            os.makedirs(dirname, 0o755, exist_ok=True)
+
+    def append(self, t:np.ndarray, lat:np.ndarray, lon:np.ndarray) -> int:
+        """ Append fixes newer than the last one stored, returns how many were added """
+        fixes = self.__mkFixes(t, lat, lon, self.tMax())
+        if not fixes.shape[0]: return 0
+        self.__mkDir()
+        with open(self.filename, "ab") as fp:
+            size = fp.seek(0, os.SEEK_END)
+            extra = size % self.dtype.itemsize
+            if extra: # A partial record from an interrupted append would misalign the rest
+                logging.warning("Dropping %s bytes of a partial record from %s",
+                                extra, self.filename)
+                fp.truncate(size - extra)
+            fp.write(fixes.tobytes())
+        self.refresh()
+        return fixes.shape[0]
+
+    def rebuild(self, t:np.ndarray, lat:np.ndarray, lon:np.ndarray) -> int:
+        """ Replace all the fixes, returns how many there are
+
+        The new file is renamed into place, so readers mapping the old one are undisturbed.
+        """
+        fixes = self.__mkFixes(t, lat, lon)
+        self.__mkDir()
+        tmp = os.path.join(os.path.dirname(self.filename),
+                           "." + os.path.basename(self.filename) + ".tmp")
+        with open(tmp, "wb") as fp:
+            fp.write(fixes.tobytes())
+        os.replace(tmp, self.filename)
+        self.refresh()
+        return fixes.shape[0]
+
+    def qHas(self, t:np.ndarray) -> np.ndarray:
+        """ Which of t are already fixes """
+        tFix = self.__fixes["t"]
+        if not len(tFix): return np.zeros(np.shape(t), dtype=bool)
+        index = np.clip(np.searchsorted(tFix, t), 0, len(tFix) - 1)
+        return tFix[index] == t
+
+    def interp(self, t, maxGap:float=None) -> tuple:
+        """ Linearly interpolate the ship's position at times t
+
+        t is datetime64 or seconds since 1970, scalar or array.
+        Times outside the fixes, or in a gap longer than maxGap seconds, are NaN.
+        """
+        t = np.asarray(t)
+        if np.issubdtype(t.dtype, np.datetime64):
+            t = (t - np.datetime64("1970-01-01")) / np.timedelta64(1, "s")
+        t = np.atleast_1d(t).astype(float)
+
+        fixes = self.__fixes
+        lat = np.full(t.shape, np.nan)
+        lon = np.full(t.shape, np.nan)
+        if len(fixes) < 2: return (lat, lon)
+
+        tFix = fixes["t"]
+        if t.shape[0] > 1 and np.any(t[1:] < t[:-1]):
+            # searchsorted is much faster with sorted keys, so sort then scatter back
+            order = np.argsort(t, kind="stable")
+            index = np.empty(t.shape, dtype=np.intp)
+            index[order] = np.searchsorted(tFix, t[order], side="right")
+        else:
+            index = np.searchsorted(tFix, t, side="right")
+        q = (index > 0) & (index < len(fixes))
+        q |= t == tFix[-1]
+        i1 = np.clip(index, 1, len(fixes) - 1)
+        i0 = i1 - 1
+        dt = tFix[i1] - tFix[i0]
+        if maxGap is not None: q &= dt <= maxGap
+
+        w = (t[q] - tFix[i0[q]]) / dt[q]
+        lat0 = fixes["lat"][i0[q]]
+        lon0 = fixes["lon"][i0[q]]
+        lat[q] = lat0 + w * (fixes["lat"][i1[q]] - lat0)
+        dLon = (fixes["lon"][i1[q]] - lon0 + 180) % 360 - 180 # Across the dateline
+        lon[q] = (lon0 + w * dLon + 180) % 360 - 180
+        return (lat, lon)
+
+def fromDB(index:ShipIndex, db, ship:str) -> int:
+    sql = "SELECT EXTRACT(EPOCH FROM t)::DOUBLE PRECISION,lat,lon FROM ship"
+    sql+= " WHERE id=%s AND t>to_timestamp(%s) AND lat IS NOT NULL AND lon IS NOT NULL"
+    sql+= " ORDER BY t;"
+    tMax = index.tMax()
+    cur = db.cursor()
+    cur.execute(sql, (ship, -1e12 if tMax is None else tMax))
+    rows = np.array(cur.fetchall(), dtype=float).reshape(-1, 3)
+    db.commit()
+    return index.append(rows[:,0], rows[:,1], rows[:,2])
+
+def fromNetCDF(index:ShipIndex, fn:str) -> int:
+    from netCDF4 import Dataset
+
+    if not os.path.isfile(fn): return 0
+    with Dataset(fn, "r") as nc:
+        tVar = nc["time"]
+        tRef = np.datetime64(tVar.units.removeprefix("seconds since "))
+        tRef = (tRef - np.datetime64("1970-01-01")) / np.timedelta64(1, "s")
+        t = tVar[:].filled(np.nan).astype(float) + tRef
+        tMax = index.tMax()
+        if tMax is not None: # Fixes backfilled before tMax would be dropped by append
+            qOld = np.isfinite(t) & (t <= tMax)
+            qOld[qOld] = ~index.qHas(t[qOld])
+            if qOld.any():
+                ii = np.flatnonzero(qOld)
+                (i0, i1) = (ii[0], ii[-1] + 1)
+                lat = nc["lat"][i0:i1].filled(np.nan).astype(float)
+                lon = nc["lon"][i0:i1].filled(np.nan).astype(float)
+                n = np.count_nonzero(qOld[i0:i1] & np.isfinite(lat) & np.isfinite(lon))
+                if n:
+                    logging.warning("%s fixes at or before %s in %s, rebuilding %s",
+                                    n, tMax, fn, index)
+                    lat = nc["lat"][:].filled(np.nan).astype(float)
+                    lon = nc["lon"][:].filled(np.nan).astype(float)
+                    return index.rebuild(t, lat, lon)
+        q = np.isfinite(t) if tMax is None else t > tMax
+        if not q.any(): return 0
+        ii = np.flatnonzero(q) # Only read the new part of lat/lon
+        (i0, i1) = (ii[0], ii[-1] + 1)
+        lat = nc["lat"][i0:i1].filled(np.nan).astype(float)
+        lon = nc["lon"][i0:i1].filled(np.nan).astype(float)
+        return index.append(t[i0:i1], lat, lon)
+
+if __name__ == "__main__":
+    from TPWUtils import Logger
+
+    parser = ArgumentParser()
+    Logger.addArgs(parser)
+    parser.add_argument("index", type=str, help="Index filename to maintain")
+    grp = parser.add_mutually_exclusive_group(required=True)
+    grp.add_argument("--db", type=str, help="Database with udpProcess' ship table")
+    grp.add_argument("--nc", type=str, help="NetCDF file written by ncWriter")
+    parser.add_argument("--ship", type=str, default="TGT", help="Vessel name in the ship table")
+    parser.add_argument("--dt", type=float, default=10, help="Seconds between updates")
+    parser.add_argument("--once", action="store_true", help="Update once and exit")
+    args = parser.parse_args()
+
+    Logger.mkLogger(args)
+
+    index = ShipIndex(args.index)
+    logging.info("Starting %s", index)
+
+    if args.db:
+        import psycopg
+        db = psycopg.connect(f"dbname={args.db}")
+    else:
+        args.nc = os.path.abspath(os.path.expanduser(args.nc))
+
+    while True:
+        try:
+            n = fromDB(index, db, args.ship) if args.db else fromNetCDF(index, args.nc)
+            if n: logging.info("Added %s fixes, %s", n, index)
+        except:
+            logging.exception("Updating %s", index)
+            if args.once: raise
+            if args.db:
+                if db.closed:
+                    db = psycopg.connect(f"dbname={args.db}")
+                else:
+                    db.rollback()
+        if args.once: break
+        time.sleep(args.dt)
@@ -15,6 +15,7 @@ import queue
 import re
 import psycopg
 import socket
+from TimeDecoder import decodeYMD, decodeNMEADate
 
 class Consumer(Thread):
     def __init__(self, args:ArgumentParser):
@@ -65,13 +66,7 @@ class Consumer(Thread):
     @staticmethod
     def __decodeFixDate(t:datetime.datetime, tt:str) -> datetime.datetime:
         if not tt: return None
-        tt = float(tt)
-        d = int(math.floor(tt / 10000))
-        m = int(math.floor(tt / 100) % 100)
-        y = int(tt % 100)
-        tt = datetime.datetime.strptime(f"{y}-{m:02d}-{d:02d}", "%y-%m-%d")
-        tt = tt.replace(tzinfo=datetime.timezone.utc)
-        return tt
+        return decodeNMEADate(tt)
 
     def __dbUpdate(self, db, tFix:datetime.datetime, info:dict) -> None:
         names = ["id", "t"]
@@ -212,9 +207,8 @@ class Replay(Thread):
                 if not matches:
                     logging.info("Bad line %s", line)
                     continue
-                t = datetime.datetime.strptime(str(matches[1], "utf-8"), "%Y-%m-%d %H:%M:%S")
+                t = decodeYMD(str(matches[1], "utf-8"))
                 t += datetime.timedelta(milliseconds=float(str(matches[2], "utf-8")))
-                t = t.replace(tzinfo=datetime.timezone.utc)
                 port = int(str(matches[3], "utf-8"))
                 ipv4 = str(matches[4], "utf-8")
                 sport = int(str(matches[5], "utf-8"))
@@ -0,0 +1,231 @@
+#
+# Fast decoding of fixed layout timestamps
+#
+# The layout is given as a strptime format, from which the character positions
+# of each field are worked out once. Decoding is then slicing and int(),
+# with the date part cached per calendar day. Anything which does not fit the
+# layout falls back to datetime.strptime. All results are in UTC.
+#
+# Oct-2026, Pat Welch, pat@mousebrains.com
+
+import datetime
+import re
+
+class Decoder:
+    __widths = {"Y": 4, "y": 2, "m": 2, "d": 2, "H": 2, "M": 2, "S": 2}
+
+    def __init__(self, fmt:str, maxCache:int=64) -> None:
+        self.format = fmt
+        self.__maxCache = maxCache
+        self.__cache = {} # Date characters -> midnight UTC
+        self.__fields = {}
+        self.__literals = [] # (position, character) of the separators
+        self.__fraction = None # Start of %f, which must be at the end
+
+        pos = 0
+        for item in re.findall(r"%.|[^%]", fmt):
+            if item == "%f":
+                self.__fraction = pos
+                break
+            if item[0] == "%":
+                key = item[1]
+                if key not in self.__widths:
+                    raise ValueError(f"Unsupported directive {item} in {fmt}")
+                self.__fields[key] = (pos, pos + self.__widths[key])
+                pos += self.__widths[key]
+            else:
+                self.__literals.append((pos, item))
+                pos += 1
+
+        if self.__fraction is not None and not fmt.endswith("%f"):
+            raise ValueError(f"%f must be at the end of {fmt}")
+
+        self.width = pos
+        fields = self.__fields
+        # (start, end, seconds per unit, limit) of the time of day fields
+        self.__clock = [(*fields[key], scale, limit)
+                        for (key, scale, limit) in (("H", 3600, 24), ("M", 60, 60), ("S", 1, 60))
+                        if key in fields]
+        dates = [fields[key] for key in ("Y", "y", "m", "d") if key in fields]
+        self.__date = (min(x[0] for x in dates), max(x[1] for x in dates)) if dates else (0, 0)
+
+    def __repr__(self) -> str:
+        return f"Decoder({self.format})"
+
+    def __fallback(self, val:str) -> datetime.datetime:
+        t = datetime.datetime.strptime(val, self.format)
+        return t.replace(tzinfo=datetime.timezone.utc)
+
+    def __midnight(self, val:str) -> datetime.datetime:
+        """ Midnight of val's date, raises ValueError if it is not a valid date """
+        fields = self.__fields
+        for key in ("Y", "y", "m", "d"):
+            if key in fields and not val[fields[key][0]:fields[key][1]].isdigit():
+                raise ValueError(f"Invalid date in {val}")
+        if "Y" in fields:
+            year = int(val[fields["Y"][0]:fields["Y"][1]])
+        elif "y" in fields: # Same pivot as strptime
+            year = int(val[fields["y"][0]:fields["y"][1]])
+            year += 1900 if year >= 69 else 2000
+        else:
+            year = 1900
+        month = int(val[fields["m"][0]:fields["m"][1]]) if "m" in fields else 1
+        day = int(val[fields["d"][0]:fields["d"][1]]) if "d" in fields else 1
+        if len(self.__cache) >= self.__maxCache: self.__cache.clear()
+        t = datetime.datetime(year, month, day, tzinfo=datetime.timezone.utc)
+        self.__cache[val[self.__date[0]:self.__date[1]]] = t
+        return t
+
+    def __call__(self, val:str) -> datetime.datetime:
+        n = len(val)
+        if n != self.width and (self.__fraction is None or n <= self.width + 1):
+            return self.__fallback(val)
+        try:
+            for (pos, c) in self.__literals:
+                if val[pos] != c: return self.__fallback(val)
+            t = self.__cache.get(val[self.__date[0]:self.__date[1]])
+            if t is None: t = self.__midnight(val)
+            seconds = 0
+            for (i0, i1, scale, limit) in self.__clock: # Out of range is an error, as strptime
+                x = val[i0:i1]
+                x = int(x) if x.isdigit() else limit
+                if x >= limit: return self.__fallback(val)
+                seconds += scale * x
+            if self.__fraction is None:
+                return t + datetime.timedelta(seconds=seconds)
+            frac = val[self.__fraction:]
+            if len(frac) > 6 or not frac.isdigit(): return self.__fallback(val)
+            usec = int(frac.ljust(6, "0"))
+            return t + datetime.timedelta(seconds=seconds, microseconds=usec)
+        except ValueError:
+            return self.__fallback(val)
+
+    def bulk(self, values) -> "np.ndarray":
+        """ Decode a sequence of str or bytes into a numpy datetime64 array
+
+        Entries which do not match the layout are decoded one at a time,
+        so a bad entry raises ValueError just like strptime.
+        """
+        import numpy as np
+
+        a = np.asarray(values)
+        if a.dtype.kind not in "SU": a = a.astype(str)
+        n = a.shape[0]
+        unit = "us" if self.__fraction is not None else "s"
+        if n == 0: return np.empty(0, dtype=f"datetime64[{unit}]")
+
+        nChars = a.dtype.itemsize // (4 if a.dtype.kind == "U" else 1)
+        if nChars < self.width: return self.__bulkFallback(a, unit)
+        codes = a.view(np.uint32 if a.dtype.kind == "U" else np.uint8).reshape(n, nChars)
+        codes = codes.astype(np.int64)
+
+        qOkay = np.ones(n, dtype=bool)
+        for (pos, c) in self.__literals:
+            qOkay &= codes[:,pos] == ord(c)
+        digits = codes - ord("0")
+
+        fields = self.__fields
+        def field(key:str, default:int) -> np.ndarray:
+            nonlocal qOkay
+            if key not in fields: return np.full(n, default, dtype=np.int64)
+            (i0, i1) = fields[key]
+            qOkay &= np.all((digits[:,i0:i1] >= 0) & (digits[:,i0:i1] <= 9), axis=1)
+            return digits[:,i0:i1] @ (10 ** np.arange(i1 - i0 - 1, -1, -1))
+
+        if "Y" in fields:
+            year = field("Y", 1900)
+        else:
+            year = field("y", 0)
+            year = np.where(year >= 69, 1900, 2000) + year if "y" in fields else year + 1900
+        month = field("m", 1)
+        day = field("d", 1)
+        hour = field("H", 0)
+        minute = field("M", 0)
+        second = field("S", 0)
+        qOkay &= (month >= 1) & (month <= 12) & (day >= 1)
+        qOkay &= (hour <= 23) & (minute <= 59) & (second <= 59)
+
+        if self.__fraction is None:
+            if nChars > self.width: qOkay &= codes[:,self.width:].sum(axis=1) == 0
+            usec = None
+        else:
+            frac = digits[:,self.__fraction:self.__fraction+6]
+            frac = np.where(codes[:,self.__fraction:self.__fraction+6] == 0, 0, frac)
+            qOkay &= np.all((frac >= 0) & (frac <= 9), axis=1)
+            qOkay &= codes[:,self.__fraction] != 0 # At least one digit
+            if nChars > self.__fraction + 6: # No more than six digits
+                qOkay &= codes[:,self.__fraction+6:].sum(axis=1) == 0
+            usec = frac @ (10 ** np.arange(5, 5 - frac.shape[1], -1))
+
+        month = np.where(qOkay, month, 1)
+        tMonth = (year - 1970).astype("datetime64[Y]") + (month - 1).astype("timedelta64[M]")
+        t = tMonth.astype("datetime64[D]") + (day - 1).astype("timedelta64[D]")
+        qOkay &= t.astype("datetime64[M]") == tMonth # Day past the end of the month
+        t = t.astype(f"datetime64[{unit}]")
+        t += (3600 * hour + 60 * minute + second).astype("timedelta64[s]")
+        if usec is not None: t += usec.astype("timedelta64[us]")
+
+        if not qOkay.all():
+            for index in np.flatnonzero(~qOkay):
+                val = a[index]
+                val = str(val, "utf-8") if isinstance(val, bytes) else str(val)
+                t[index] = np.datetime64(self(val).replace(tzinfo=None), unit)
+        return t
+
+    def __bulkFallback(self, a:"np.ndarray", unit:str) -> "np.ndarray":
+        import numpy as np
+
+        t = np.empty(a.shape[0], dtype=f"datetime64[{unit}]")
+        for index in range(a.shape[0]):
+            val = a[index]
+            val = str(val, "utf-8") if isinstance(val, bytes) else str(val)
+            t[index] = np.datetime64(self(val).replace(tzinfo=None), unit)
+        return t
+
+# The layouts used by the ingesters
+decodeYMD = Decoder("%Y-%m-%d %H:%M:%S") # Drifter feed and log files
+decodeDMY = Decoder("%d-%m-%Y %H:%M:%S") # Thompson TSG and intake datagrams
+decodeSCS = Decoder("%m/%d/%Y %H:%M:%S.%f") # Thompson SCS Raw files
+decodeNMEADate = Decoder("%d%m%y") # NMEA RMC date field
+
+if __name__ == "__main__":
+    # Benchmark against strptime
+    from argparse import ArgumentParser
+    import numpy as np
+    import time
+
+    parser = ArgumentParser()
+    parser.add_argument("--n", type=int, default=200000, help="Number of timestamps")
+    args = parser.parse_args()
+
+    t0 = np.datetime64("2025-03-01T00:00:00")
+    times = t0 + np.arange(args.n).astype("timedelta64[s]")
+    times = [t.item() for t in times]
+
+    for (decoder, fmt) in ((decodeYMD, "%Y-%m-%d %H:%M:%S"),
+                           (decodeDMY, "%d-%m-%Y %H:%M:%S"),
+                           (decodeSCS, "%m/%d/%Y %H:%M:%S.%f"),
+                           ):
+        strings = [t.strftime(fmt)[:decoder.width + 4] for t in times]
+
+        stime = time.time()
+        a = [datetime.datetime.strptime(x, fmt).replace(tzinfo=datetime.timezone.utc)
+             for x in strings]
+        dtStrptime = time.time() - stime
+
+        stime = time.time()
+        b = [decoder(x) for x in strings]
+        dtDecoder = time.time() - stime
+
+        stime = time.time()
+        c = decoder.bulk(strings)
+        dtBulk = time.time() - stime
+
+        assert a == b, f"{decoder} mismatch"
+        assert np.array_equal(c, np.array([x.replace(tzinfo=None) for x in a],
+                                          dtype=c.dtype)), f"{decoder} bulk mismatch"
+
+        print(f"{fmt:22s} n={args.n}",
+              f"strptime {args.n/dtStrptime:.0f}/s",
+              f"decoder {args.n/dtDecoder:.0f}/s ({dtStrptime/dtDecoder:.1f}x)",
+              f"bulk {args.n/dtBulk:.0f}/s ({dtStrptime/dtBulk:.1f}x)")
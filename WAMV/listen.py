@@ -2,17 +2,23 @@
 #
 # Listen for WAMV positions
 #
+# A receiver thread decodes and forwards each datagram, while a writer thread saves
+# the fixes to the database and the CSV file in batches.
+#
 # Nov-2024, Pat Welch, pat@mousebrains.com
 
 from argparse import ArgumentParser
 import socket
 from datetime import datetime, timezone
 from TPWUtils import Logger
+from TPWUtils.Thread import Thread
 import logging
 import json
 import math
 import psycopg
 import os
+import queue
+import time
 import MakeTables as mt
 
 def mkDMS(val:bytes, direction:tuple[str]) -> str:
@@ -29,6 +35,175 @@ def mkDMS(val:bytes, direction:tuple[str]) -> str:
     except:
         return None
 
+class Receiver(Thread):
+    def __init__(self, args:ArgumentParser, q:queue.Queue) -> None:
+        Thread.__init__(self, "RCV", args)
+        self.__queue = q
+
+    def runIt(self) -> None:
+        args = self.args
+        q = self.__queue
+
+        src = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        src.bind(("", args.port))
+
+        tgt = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        tgt.settimeout(1)
+        tgtAddr = (args.tgtHost, args.tgtPort)
+
+        while True:
+            (data, addr) = src.recvfrom(1024) # Buffer size
+            logging.debug("data %s addr %s", data, addr)
+            if not data: continue
+            fields = data.split(b",")
+            if len(fields) != 5:
+                logging.warning("bad record, %s", data)
+                continue
+            (t, lat, lon, cog, sog) = [field.strip() for field in fields]
+
+            if not len(t) or not len(lat) or not len(lon): continue
+
+            try:
+                t = str(t, "utf-8")
+            except:
+                logging.warning("Unable to convert %s to a string", t)
+                continue
+
+            try:
+                payload = dict(
+                    name = "WAM-V",
+                    time = t,
+                    lat = mkDMS(lat, ("N", "S")),
+                    lon = mkDMS(lon, ("E", "W")),
+                    sog = float(sog),
+                    cog = float(cog),
+                    )
+                logging.debug("Payload %s", payload)
+                if payload["lat"] is not None and payload["lon"] is not None: 
+                    tgt.sendto(bytes(json.dumps(payload) + "\n", "utf-8"), tgtAddr)
+            except:
+                logging.exception("Failed in payload and send")
+
+            try:
+                t = datetime.fromisoformat(t).replace(tzinfo=timezone.utc)
+                lat = float(lat)
+                lon = float(lon)
+            except:
+                logging.exception("Failed in conversion")
+                continue
+
+            q.put((t, lat, lon))
+
+class Writer(Thread):
+    """ Save fixes to the database and CSV file every --batchDelay seconds
+
+    One connection is kept open. If the database is unavailable, the fixes are
+    kept and tried again with the next batch. A batch which fails for any other
+    reason is saved one fix at a time, and only the fixes which fail are dropped.
+    The CSV file is kept open and flushed every --csvFlush seconds, so the SD card
+    is not written for every fix.
+    """
+    def __init__(self, args:ArgumentParser, q:queue.Queue) -> None:
+        Thread.__init__(self, "WRT", args)
+        self.__queue = q
+
+    @staticmethod
+    def addArgs(parser:ArgumentParser) -> None:
+        grp = parser.add_argument_group(description="Writer options")
+        grp.add_argument("--batchDelay", type=float, default=1,
+                         help="Seconds to gather fixes before saving them")
+        grp.add_argument("--csvFlush", type=float, default=10,
+                         help="Seconds between flushing the CSV file, 0 for every batch")
+        grp.add_argument("--maxPending", type=int, default=100000,
+                         help="Maximum fixes to hold while the database is unavailable")
+
+    def __gather(self, timeout:float=None) -> list:
+        """ Wait up to timeout for a fix, then gather fixes for batchDelay seconds """
+        q = self.__queue
+        rows = []
+        tEnd = None
+        while True:
+            try:
+                dt = timeout if tEnd is None else tEnd - time.time()
+                if dt is not None and dt <= 0: break
+                rows.append(q.get(timeout=dt))
+                q.task_done()
+                if tEnd is None: tEnd = time.time() + self.args.batchDelay
+            except queue.Empty:
+                break
+        return rows
+
+    @staticmethod
+    def __save(cur, rows:list) -> int:
+        """ Save rows, one at a time if the batch fails, returns how many were dropped """
+        sql = "INSERT INTO position (name,class,time,latitude,longitude) VALUES (%s,%s,%s,%s,%s)"
+        sql+= " ON CONFLICT DO NOTHING;"
+        db = cur.connection
+        mt.beginTransaction(cur)
+        mt.lockShared(cur, "position") # For exporters
+        nDropped = 0
+        try:
+            with db.transaction(): # Savepoint, so a bad fix only costs the batch insert
+                mt.ensurePartitions(cur, "position", min(row[0] for row in rows),
+                                    max(row[0] for row in rows))
+                cur.executemany(sql, [("wamv", "usv", t, lat, lon) for (t, lat, lon) in rows])
+        except psycopg.OperationalError:
+            raise
+        except Exception:
+            logging.exception("Saving %s fixes, falling back to one at a time", len(rows))
+            for (t, lat, lon) in rows:
+                try:
+                    with db.transaction():
+                        mt.ensurePartitions(cur, "position", t, t)
+                        cur.execute(sql, ("wamv", "usv", t, lat, lon))
+                except psycopg.OperationalError:
+                    raise
+                except Exception as e:
+                    logging.warning("Dropping fix %s %s %s, %s", t, lat, lon, e)
+                    nDropped += 1
+        db.commit()
+        return nDropped
+
+    def runIt(self) -> None:
+        args = self.args
+        dbArg = f"dbname={args.db} user={args.username}"
+
+        fp = open(args.csv, "a", buffering=1024*1024)
+        tFlush = None # When the oldest unflushed fix was written
+        pending = [] # Fixes not in the database yet
+        db = None
+        while True:
+            rows = self.__gather(None if tFlush is None
+                                 else max(tFlush + args.csvFlush - time.time(), 0))
+            if rows or pending:
+                pending.extend(rows)
+                stime = time.time()
+                try:
+                    if db is None: db = psycopg.connect(dbArg)
+                    nDropped = self.__save(db.cursor(), pending)
+                    logging.info("Saved %s fixes in %.3f seconds",
+                                 len(pending) - nDropped, time.time() - stime)
+                    pending = []
+                except psycopg.OperationalError:
+                    logging.exception("Failed in DB update, holding %s fixes", len(pending))
+                    if db is not None: db.close()
+                    db = None
+                    pending = pending[-args.maxPending:]
+                except:
+                    logging.exception("Failed in DB update, dropping %s fixes", len(pending))
+                    if db is not None: db.rollback()
+                    pending = []
+
+            try:
+                for (t, lat, lon) in rows:
+                    fp.write(f"{t.timestamp():.0f},{lat:.6f},{lon:.6f}\n")
+                if rows and tFlush is None: tFlush = time.time()
+                if tFlush is not None and (time.time() - tFlush) >= args.csvFlush:
+                    fp.flush()
+                    tFlush = None
+            except:
+                logging.exception("Failed in writing CSV")
+
 parser = ArgumentParser()
 Logger.addArgs(parser)
 parser.add_argument("--csv", type=str, default="~/Sync/Ship/WAMV/wamv.csv", 
@@ -40,6 +215,7 @@ parser.add_argument("--tgtHost", type=str, default="10.1.100.21",
                     help="Where to forward datagrams to");
 parser.add_argument("--tgtPort", type=int, default="31337",
                     help="Where to forward datagrams to");
+Writer.addArgs(parser)
 args = parser.parse_args()
 
 Logger.mkLogger(args, fmt="%(asctime)s %(levelname)s: %(message)s")
@@ -54,82 +230,21 @@ if not os.path.isfile(args.csv):
     with open(args.csv, "w") as fp:
         fp.write("time,lat,lon\n")
 
-src = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-src.bind(("", args.port))
-
-tgt = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-tgt.settimeout(1)
-tgtAddr = (args.tgtHost, args.tgtPort)
-
-dbArg = f"dbname={args.db} user={args.username}"
-sql = "INSERT INTO position (name, time, latitude, longitude) VALUES (%s,%s,%s,%s)"
-sql+= " ON CONFLICT DO NOTHING;"
-
 logging.info("Starting");
 
-with psycopg.connect(dbArg, autocommit=True) as conn, conn.cursor() as cur:
+with psycopg.connect(f"dbname={args.db} user={args.username}", autocommit=True) as conn, \
+        conn.cursor() as cur:
+    mt.mkWeekPartitions(cur)
+    mt.mkLatestPosition(cur)
     mt.mkPosition(cur)
 
-while True:
-    (data, addr) = src.recvfrom(1024) # Buffer size
-    logging.info("data %s addr %s", data, addr)
-    if not data: continue
-    fields = data.split(b",")
-    if len(fields) != 5:
-        logging.warning("bad record, %s", data)
-        continue
-    (time, lat, lon, cog, sog) = fields;
-    time = time.strip()
-    lat = lat.strip()
-    lon = lon.strip()
-    cog = cog.strip()
-    sog = sog.strip()
-
-    logging.info("time %s lat %s lon %s cog %s sog %s", time, lat, lon, cog, sog)
-
-    if not len(time) or not len(lat) or not len(lon): continue
-
-    try:
-        time = str(time, "utf-8")
-    except:
-        logging.warning("Unable to convert %s to a string", time)
-        continue
-
-    try:
-        payload = dict(
-            name = "WAM-V",
-            time = time,
-            lat = mkDMS(lat, ("N", "S")),
-            lon = mkDMS(lon, ("E", "W")),
-            sog = float(sog),
-            cog = float(cog),
-            )
-        logging.info("Payload %s", payload)
-        if payload["lat"] is not None and payload["lon"] is not None: 
-            tgt.sendto(bytes(json.dumps(payload) + "\n", "utf-8"), tgtAddr)
-    except:
-        logging.exception("Failed in payload and send")
-
-    try:
-        time = datetime.fromisoformat(time).replace(tzinfo=timezone.utc)
-        lat = float(lat)
-        lon = float(lon)
-    except:
-        logging.exception("Failed in conversion")
-        continue
-
-    try:
-        with psycopg.connect(dbArg, autocommit=True) as conn, conn.cursor() as cur:
-            cur.execute(sql, ("wamv", time, lat, lon))
-    except:
-        logging.exception("Failed in DB update")
-
-    try:
-        with open(args.csv, "a") as fp:
-            t = time.timestamp()
-            fp.write(f"{t:.0f},{lat:.6f},{lon:.6f}\n")
-    except:
-        logging.exception("Failed in writing CSV")
-
-
+q = queue.Queue()
+writer = Writer(args, q)
+receiver = Receiver(args, q)
+writer.start()
+receiver.start()
 
+try:
+    Thread.waitForException()
+except:
+    logging.exception("Unexpected exception")